@@ -0,0 +1,6 @@
+"""
+Throughput and latency benchmarks of `StorageService` and `StorageController`.
+
+Run with `python -m benchmarks --help`, results are written as JSON and
+compared between runs with `python -m benchmarks compare old.json new.json`.
+"""
@@ -0,0 +1,251 @@
+import argparse
+import dataclasses
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import typing as t
+
+import libcloud
+
+import ellar_storage
+
+from .backends import (
+    BackendFactory,
+    fake_s3_backend,
+    is_moto_available,
+    local_backend,
+    moto_backend,
+    s3_backend,
+)
+from .runner import Api, BenchmarkCase, BenchmarkResult, run_case
+
+_UNITS = {"B": 1, "KB": 1024, "MB": 1024**2, "GB": 1024**3}
+
+DEFAULT_SIZES = "1KB,64KB,1MB,16MB,128MB,1GB"
+QUICK_SIZES = "1KB,64KB,1MB"
+
+
+def parse_size(value: str) -> int:
+    """Parses sizes such as `64KB` or `1GB`, in binary units"""
+    value = value.strip().upper()
+    for unit in ("GB", "MB", "KB", "B"):
+        if value.endswith(unit):
+            return int(float(value[: -len(unit)]) * _UNITS[unit])
+    return int(value)
+
+
+def _parse_list(value: str) -> t.List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _get_backends(args: argparse.Namespace) -> t.Dict[str, BackendFactory]:
+    backends: t.Dict[str, BackendFactory] = {}
+    for name in _parse_list(args.backends):
+        if name == "local":
+            backends[name] = local_backend
+        elif name == "fake-s3":
+            backends[name] = fake_s3_backend(args.fake_s3_latency)
+        elif name == "moto":
+            if not is_moto_available():
+                print(
+                    "moto is not installed, skipping the moto backend", file=sys.stderr
+                )
+                continue
+            backends[name] = moto_backend
+        elif name == "s3":
+            if not args.s3_endpoint:
+                print(
+                    "--s3-endpoint is not set, skipping the s3 backend", file=sys.stderr
+                )
+                continue
+            backends[name] = s3_backend(args.s3_endpoint, args.s3_key, args.s3_secret)
+        else:
+            raise SystemExit(f"Unknown backend: {name}")
+    return backends
+
+
+def _get_revision() -> t.Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args: argparse.Namespace) -> int:
+    sizes = [parse_size(size) for size in _parse_list(args.sizes)]
+    concurrency_levels = [int(level) for level in _parse_list(args.concurrency)]
+    apis = t.cast(t.List[Api], _parse_list(args.apis))
+    backends = _get_backends(args)
+
+    results: t.List[BenchmarkResult] = []
+    skipped = []
+    for backend, factory in backends.items():
+        for size in sizes:
+            for concurrency in concurrency_levels:
+                operations = max(concurrency, min(args.repeat, args.max_bytes // size))
+                if size * operations > args.max_bytes:
+                    skipped.append(
+                        {"backend": backend, "size": size, "concurrency": concurrency}
+                    )
+                    continue
+                results.extend(
+                    run_case(
+                        BenchmarkCase(backend, factory, size, concurrency, operations),
+                        apis,
+                    )
+                )
+
+    report = {
+        "environment": {
+            "ellar_storage": ellar_storage.__version__,
+            "libcloud": libcloud.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "revision": _get_revision(),
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        },
+        "parameters": {
+            "backends": list(backends),
+            "apis": apis,
+            "sizes": sizes,
+            "concurrency": concurrency_levels,
+            "repeat": args.repeat,
+            "max_bytes": args.max_bytes,
+            "fake_s3_latency": args.fake_s3_latency,
+        },
+        "skipped": skipped,
+        "results": [dataclasses.asdict(result) for result in results],
+    }
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"{len(results)} results written to {args.output}", file=sys.stderr)
+    return 0
+
+
+def _load_results(path: str) -> t.Dict[t.Tuple[t.Any, ...], t.Dict[str, t.Any]]:
+    with open(path) as file:
+        report = json.load(file)
+    return {
+        (
+            result["backend"],
+            result["api"],
+            result["operation"],
+            result["size"],
+            result["concurrency"],
+        ): result
+        for result in report["results"]
+    }
+
+
+def compare(args: argparse.Namespace) -> int:
+    """Prints the change of the operations per second between two result files"""
+    baseline = _load_results(args.baseline)
+    current = _load_results(args.current)
+
+    regressions = 0
+    print(
+        f"{'backend':>8} {'api':>10} {'operation':>14} {'size':>11} {'conc':>4}"
+        f" {'baseline':>12} {'current':>12} {'change':>8}"
+    )
+    for key in sorted(baseline.keys() & current.keys()):
+        before = baseline[key]["ops_per_second"]
+        after = current[key]["ops_per_second"]
+        change = (after - before) / before
+        regressed = change < -args.threshold
+        regressions += regressed
+        backend, api, operation, size, concurrency = key
+        print(
+            f"{backend:>8} {api:>10} {operation:>14} {size:>11} {concurrency:>4}"
+            f" {before:>12.1f} {after:>12.1f} {change:>+8.1%}"
+            + (" REGRESSION" if regressed else "")
+        )
+    for key in sorted(baseline.keys() ^ current.keys()):
+        print(f"only in {'baseline' if key in baseline else 'current'}: {key}")
+    return 1 if regressions else 0
+
+
+def main(argv: t.Optional[t.Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Benchmarks StorageService and StorageController operations.",
+    )
+    commands = parser.add_subparsers(dest="command")
+
+    run_parser = commands.add_parser("run", help="run the benchmarks (default)")
+    run_parser.add_argument(
+        "--backends",
+        default="local,fake-s3,moto",
+        help="comma separated: local, fake-s3 (in-process remote stand-in), "
+        "moto (requires moto[server]), s3 (requires --s3-endpoint)",
+    )
+    run_parser.add_argument(
+        "--apis", default="sync,async,controller", help="comma separated"
+    )
+    run_parser.add_argument(
+        "--sizes",
+        default=DEFAULT_SIZES,
+        help=f"comma separated, default {DEFAULT_SIZES}",
+    )
+    run_parser.add_argument(
+        "--quick", action="store_true", help=f"same as --sizes {QUICK_SIZES}"
+    )
+    run_parser.add_argument("--concurrency", default="1,8", help="comma separated")
+    run_parser.add_argument(
+        "--repeat", type=int, default=20, help="operations per benchmark"
+    )
+    run_parser.add_argument(
+        "--max-bytes",
+        type=parse_size,
+        default=parse_size("2GB"),
+        help="bytes written per benchmark, fewer operations are run on large files",
+    )
+    run_parser.add_argument(
+        "--fake-s3-latency",
+        type=float,
+        default=0.0,
+        help="seconds of round trip added to each fake-s3 request",
+    )
+    run_parser.add_argument("--s3-endpoint", help="eg http://127.0.0.1:9000")
+    run_parser.add_argument("--s3-key", default=os.environ.get("S3_ACCESS_KEY", ""))
+    run_parser.add_argument("--s3-secret", default=os.environ.get("S3_SECRET_KEY", ""))
+    run_parser.add_argument(
+        "-o", "--output", default="benchmark-results.json", help="`-` for stdout"
+    )
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="slowdown ratio reported as a regression, default 0.1",
+    )
+
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] not in ("run", "compare", "-h", "--help"):
+        argv.insert(0, "run")
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        return compare(args)
+    if args.quick:
+        args.sizes = QUICK_SIZES
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
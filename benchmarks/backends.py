@@ -0,0 +1,177 @@
+import contextlib
+import os
+import shutil
+import socket
+import tempfile
+import time
+import typing as t
+
+from libcloud.storage.drivers.local import LocalStorageDriver
+from libcloud.storage.drivers.minio import MinIOStorageDriver
+from libcloud.utils.files import read_in_chunks
+
+from ellar_storage import Provider, get_driver
+from ellar_storage.storage import CHUNK_SIZE
+
+# storage name of the benchmarks, also the name of its container or bucket
+STORAGE_NAME = "bench"
+
+BackendFactory = t.Callable[[], t.ContextManager[t.Dict[str, t.Any]]]
+
+
+class FakeS3StorageDriver(LocalStorageDriver):
+    """
+    In-process stand-in for a remote object store: files are kept on the local disk,
+    but the driver isn't recognised as local, so `StorageService` and `StoredFile`
+    go through their remote code paths (streamed downloads, ranged fetches,
+    no sendfile), each request paying `latency` seconds of round trip.
+    """
+
+    name = "Fake S3"
+
+    def __init__(self, key: str, latency: float = 0.0, **kwargs: t.Any) -> None:
+        super().__init__(key, **kwargs)  # type:ignore[no-untyped-call]
+        self.latency = latency
+
+    def _round_trip(self) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_object(self, container_name: str, object_name: str) -> t.Any:
+        self._round_trip()
+        return super().get_object(  # type:ignore[no-untyped-call]
+            container_name, object_name
+        )
+
+    def upload_object_via_stream(self, *args: t.Any, **kwargs: t.Any) -> t.Any:
+        self._round_trip()
+        return super().upload_object_via_stream(  # type:ignore[no-untyped-call]
+            *args, **kwargs
+        )
+
+    def download_object_as_stream(
+        self, obj: t.Any, chunk_size: t.Optional[int] = None
+    ) -> t.Iterator[bytes]:
+        self._round_trip()
+        with open(self._get_object_path(obj), "rb") as file:
+            yield from read_in_chunks(  # type:ignore[no-untyped-call]
+                file, chunk_size=chunk_size or CHUNK_SIZE
+            )
+
+    def download_object_range_as_stream(
+        self,
+        obj: t.Any,
+        start_bytes: int,
+        end_bytes: t.Optional[int] = None,
+        chunk_size: t.Optional[int] = None,
+    ) -> t.Iterator[bytes]:
+        self._round_trip()
+        chunk_size = chunk_size or CHUNK_SIZE
+        with open(self._get_object_path(obj), "rb") as file:
+            file.seek(start_bytes)
+            remaining = -1 if end_bytes is None else end_bytes - start_bytes
+            while remaining:
+                chunk = file.read(
+                    chunk_size if remaining < 0 else min(chunk_size, remaining)
+                )
+                if not chunk:
+                    break
+                remaining -= 0 if remaining < 0 else len(chunk)
+                yield chunk
+
+    def delete_object(self, obj: t.Any) -> bool:
+        self._round_trip()
+        try:
+            os.unlink(self._get_object_path(obj))
+        except OSError:
+            return False
+        return True
+
+    def get_object_cdn_url(self, obj: t.Any) -> str:
+        # no CDN, `StorageController` streams the content instead of redirecting
+        raise NotImplementedError()
+
+    def _get_object_path(self, obj: t.Any) -> str:
+        return os.path.join(str(self.base_path), obj.container.name, obj.name)
+
+
+@contextlib.contextmanager
+def local_backend() -> t.Iterator[t.Dict[str, t.Any]]:
+    directory = tempfile.mkdtemp(prefix="ellar-storage-bench-")
+    try:
+        yield {
+            "driver": get_driver(Provider.LOCAL),
+            "options": {"key": directory},
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def fake_s3_backend(latency: float) -> BackendFactory:
+    @contextlib.contextmanager
+    def _backend() -> t.Iterator[t.Dict[str, t.Any]]:
+        directory = tempfile.mkdtemp(prefix="ellar-storage-bench-")
+        try:
+            yield {
+                "driver": FakeS3StorageDriver,
+                "options": {"key": directory, "latency": latency},
+            }
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    return _backend
+
+
+@contextlib.contextmanager
+def moto_backend() -> t.Iterator[t.Dict[str, t.Any]]:
+    """S3 API served by a moto server running in a thread, requires `moto[server]`"""
+    from moto.server import ThreadedMotoServer
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port)
+    server.start()
+    try:
+        yield {
+            "driver": MinIOStorageDriver,
+            "options": {
+                "key": "testing",
+                "secret": "testing",
+                "secure": False,
+                "host": "127.0.0.1",
+                "port": port,
+            },
+        }
+    finally:
+        server.stop()
+
+
+def s3_backend(endpoint: str, key: str, secret: str) -> BackendFactory:
+    """An S3 compatible server already running, eg MinIO at `http://127.0.0.1:9000`"""
+    scheme, _, address = endpoint.rpartition("://")
+    host, _, port = address.rstrip("/").partition(":")
+
+    @contextlib.contextmanager
+    def _backend() -> t.Iterator[t.Dict[str, t.Any]]:
+        yield {
+            "driver": MinIOStorageDriver,
+            "options": {
+                "key": key,
+                "secret": secret,
+                "secure": scheme == "https",
+                "host": host,
+                "port": int(port) if port else None,
+            },
+        }
+
+    return _backend
+
+
+def is_moto_available() -> bool:
+    try:
+        import moto.server  # noqa: F401
+    except ImportError:
+        return False
+    return True
@@ -0,0 +1,317 @@
+import asyncio
+import dataclasses
+import os
+import statistics
+import sys
+import time
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+
+from ellar_storage import StorageModule, StorageService, StorageSetup
+
+from .backends import STORAGE_NAME, BackendFactory
+
+Api = t.Literal["sync", "async", "controller"]
+
+# content of the benchmark files, repeated up to their size
+_BLOCK = os.urandom(1024 * 1024)
+# size of the ranges requested by the ranged download benchmark
+RANGE_SIZE = 1024 * 1024
+
+
+@dataclasses.dataclass
+class BenchmarkResult:
+    backend: str
+    api: Api
+    operation: str
+    size: int
+    concurrency: int
+    operations: int
+    seconds: float
+    ops_per_second: float
+    # bytes per second, for operations transferring the file content
+    throughput: t.Optional[float]
+    # seconds of each operation, by percentile
+    latency: t.Dict[str, float]
+
+    @property
+    def key(self) -> t.Tuple[str, str, str, int, int]:
+        return self.backend, self.api, self.operation, self.size, self.concurrency
+
+
+@dataclasses.dataclass
+class BenchmarkCase:
+    backend: str
+    factory: BackendFactory
+    size: int
+    concurrency: int
+    operations: int
+
+
+def iter_content(size: int) -> t.Iterator[bytes]:
+    while size > 0:
+        chunk = _BLOCK[:size]
+        size -= len(chunk)
+        yield chunk
+
+
+def make_result(
+    case: BenchmarkCase,
+    api: Api,
+    operation: str,
+    seconds: float,
+    latencies: t.List[float],
+    transferred: t.Optional[int] = None,
+) -> BenchmarkResult:
+    latencies = sorted(latencies)
+    return BenchmarkResult(
+        backend=case.backend,
+        api=api,
+        operation=operation,
+        size=case.size,
+        concurrency=case.concurrency,
+        operations=len(latencies),
+        seconds=seconds,
+        ops_per_second=len(latencies) / seconds,
+        throughput=None if transferred is None else transferred / seconds,
+        latency={
+            "min": latencies[0],
+            "mean": statistics.fmean(latencies),
+            "p50": _percentile(latencies, 50),
+            "p95": _percentile(latencies, 95),
+            "p99": _percentile(latencies, 99),
+            "max": latencies[-1],
+        },
+    )
+
+
+def _percentile(ordered: t.List[float], percent: int) -> float:
+    return ordered[min(len(ordered) - 1, (len(ordered) * percent) // 100)]
+
+
+def _file_names(case: BenchmarkCase) -> t.List[str]:
+    return [f"{case.size}-{index}.bin" for index in range(case.operations)]
+
+
+def _paths(names: t.List[str]) -> t.List[str]:
+    return [f"{STORAGE_NAME}/{name}" for name in names]
+
+
+def _drain(stored_file: t.Any) -> int:
+    return sum(len(chunk) for chunk in stored_file.as_stream())
+
+
+def _run_threads(
+    call: t.Callable[[str], t.Any], items: t.List[str], concurrency: int
+) -> t.Tuple[float, t.List[float]]:
+    def _timed(item: str) -> float:
+        started = time.perf_counter()
+        call(item)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(_timed, items))
+    return time.perf_counter() - started, latencies
+
+
+async def _run_tasks(
+    call: t.Callable[[str], t.Awaitable[t.Any]], items: t.List[str], concurrency: int
+) -> t.Tuple[float, t.List[float]]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _timed(item: str) -> float:
+        async with semaphore:
+            started = time.perf_counter()
+            await call(item)
+            return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(_timed(item) for item in items))
+    return time.perf_counter() - started, list(latencies)
+
+
+def run_sync_case(case: BenchmarkCase) -> t.List[BenchmarkResult]:
+    """Saves, gets, streams and deletes the files of `case` with the sync API"""
+    with case.factory() as storage:
+        service = StorageService(
+            StorageSetup(storages={STORAGE_NAME: storage})  # type:ignore[dict-item]
+        )
+        names = _file_names(case)
+        paths = _paths(names)
+        transferred = case.size * case.operations
+
+        def _save(name: str) -> None:
+            service.save_content(
+                name,
+                content=iter_content(case.size),
+                metadata={"content_type": "application/octet-stream"},
+            )
+
+        results = [
+            make_result(
+                case,
+                "sync",
+                "save",
+                *_run_threads(_save, names, case.concurrency),
+                transferred=transferred,
+            ),
+            make_result(
+                case, "sync", "get", *_run_threads(service.get, paths, case.concurrency)
+            ),
+            make_result(
+                case,
+                "sync",
+                "stream",
+                *_run_threads(
+                    lambda path: _drain(service.get(path)), paths, case.concurrency
+                ),
+                transferred=transferred,
+            ),
+            make_result(
+                case,
+                "sync",
+                "delete",
+                *_run_threads(service.delete, paths, case.concurrency),
+            ),
+        ]
+    return results
+
+
+async def run_async_case(case: BenchmarkCase) -> t.List[BenchmarkResult]:
+    """Saves, gets, streams and deletes the files of `case` with the `*_async` API"""
+    with case.factory() as storage:
+        service = StorageService(
+            StorageSetup(storages={STORAGE_NAME: storage})  # type:ignore[dict-item]
+        )
+        names = _file_names(case)
+        paths = _paths(names)
+        transferred = case.size * case.operations
+
+        async def _save(name: str) -> None:
+            await service.save_content_async(
+                name,
+                content=iter_content(case.size),
+                metadata={"content_type": "application/octet-stream"},
+            )
+
+        async def _stream(path: str) -> None:
+            stored_file = await service.get_async(path)
+            async for _ in stored_file.aiter_stream():
+                pass
+
+        results = [
+            make_result(
+                case,
+                "async",
+                "save",
+                *await _run_tasks(_save, names, case.concurrency),
+                transferred=transferred,
+            ),
+            make_result(
+                case,
+                "async",
+                "get",
+                *await _run_tasks(service.get_async, paths, case.concurrency),
+            ),
+            make_result(
+                case,
+                "async",
+                "stream",
+                *await _run_tasks(_stream, paths, case.concurrency),
+                transferred=transferred,
+            ),
+            make_result(
+                case,
+                "async",
+                "delete",
+                *await _run_tasks(service.delete_async, paths, case.concurrency),
+            ),
+        ]
+    return results
+
+
+async def run_controller_case(case: BenchmarkCase) -> t.List[BenchmarkResult]:
+    """Downloads the files of `case` through `StorageController` with an in-process ASGI client"""
+    import httpx
+    from ellar.testing import Test
+
+    with case.factory() as storage:
+        tm = Test.create_test_module(
+            modules=[StorageModule.setup(**{STORAGE_NAME: storage})]  # type:ignore[arg-type]
+        )
+        service: StorageService = tm.get(StorageService)
+        app = tm.create_application()
+        names = _file_names(case)
+        for name in names:
+            service.save_content(
+                name,
+                content=iter_content(case.size),
+                metadata={"content_type": "application/octet-stream"},
+            )
+        urls = [
+            app.url_path_for("storage:download", path=path) for path in _paths(names)
+        ]
+        range_size = min(case.size, RANGE_SIZE)
+        range_start = (case.size - range_size) // 2
+
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://bench"
+        ) as client:
+
+            async def _receive(url: str, size: int, **headers: str) -> None:
+                async with client.stream("GET", url, headers=headers) as res:
+                    res.raise_for_status()
+                    received = 0
+                    async for chunk in res.aiter_raw():
+                        received += len(chunk)
+                if received != size:
+                    raise RuntimeError(f"{url}: received {received} of {size} bytes")
+
+            async def _download(url: str) -> None:
+                await _receive(url, case.size)
+
+            async def _download_range(url: str) -> None:
+                await _receive(
+                    url,
+                    range_size,
+                    Range=f"bytes={range_start}-{range_start + range_size - 1}",
+                )
+
+            results = [
+                make_result(
+                    case,
+                    "controller",
+                    "download",
+                    *await _run_tasks(_download, urls, case.concurrency),
+                    transferred=case.size * case.operations,
+                ),
+                make_result(
+                    case,
+                    "controller",
+                    "download_range",
+                    *await _run_tasks(_download_range, urls, case.concurrency),
+                    transferred=range_size * case.operations,
+                ),
+            ]
+
+        for name in names:
+            service.delete(f"{STORAGE_NAME}/{name}")
+    return results
+
+
+def run_case(case: BenchmarkCase, apis: t.Iterable[Api]) -> t.List[BenchmarkResult]:
+    results: t.List[BenchmarkResult] = []
+    for api in apis:
+        print(
+            f"{case.backend:>8} {api:>10} size={case.size} "
+            f"concurrency={case.concurrency} operations={case.operations}",
+            file=sys.stderr,
+        )
+        if api == "sync":
+            results.extend(run_sync_case(case))
+        elif api == "async":
+            results.extend(asyncio.run(run_async_case(case)))
+        else:
+            results.extend(asyncio.run(run_controller_case(case)))
+    return results
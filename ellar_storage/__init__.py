@@ -6,6 +6,7 @@ from .module import StorageModule
 from .providers import Provider, get_driver
 from .schemas import StorageSetup
 from .services import StorageService
+from .sharding import ShardedLocalStorageDriver
 from .storage import Container, Object, StorageDriver
 from .stored_file import StoredFile
 
@@ -19,4 +20,5 @@ __all__ = [
     "Object",
     "Container",
     "StorageDriver",
+    "ShardedLocalStorageDriver",
 ]
@@ -0,0 +1,332 @@
+import asyncio
+import contextlib
+import os
+import tempfile
+import typing as t
+from abc import ABC, abstractmethod
+
+from starlette.concurrency import run_in_threadpool
+
+from ellar_storage.constants import LOCAL_STORAGE_DRIVER_NAME
+from ellar_storage.exceptions import StorageExecutorFullError
+from ellar_storage.metadata_store import MetadataStore, SidecarMetadataStore
+from ellar_storage.sharding import ShardedLocalStorageDriver, discard_flat_copy
+from ellar_storage.storage import CHUNK_SIZE, Container, Object
+
+T = t.TypeVar("T")
+
+# Content accepted by async uploads: a binary file object,
+# a sync iterator of bytes or an async iterator of bytes
+UploadContent = t.Union[t.IO[bytes], t.Iterator[bytes], t.AsyncIterator[bytes]]
+RunSyncType = t.Callable[..., t.Awaitable[t.Any]]
+
+# chunks read ahead of the consumer by `aiter_prefetched`
+PREFETCH_CHUNKS = 4
+
+
+async def aiter_content(
+    content: UploadContent,
+    run_sync: RunSyncType = run_in_threadpool,
+    chunk_size: int = CHUNK_SIZE,
+) -> t.AsyncIterator[bytes]:
+    """
+    Iterates over `content` asynchronously, one chunk per awaitable step.
+
+    Blocking reads from files and sync iterators are pushed to `run_sync`
+    one chunk at a time, so a worker thread is never held for the whole transfer.
+    """
+    if hasattr(content, "__aiter__"):
+        async for chunk in t.cast(t.AsyncIterator[bytes], content):
+            yield chunk
+        return
+
+    if hasattr(content, "read"):
+        file_obj = t.cast(t.IO[bytes], content)
+        while True:
+            chunk = await run_sync(file_obj.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+        return
+
+    iterator = iter(content)
+    sentinel = object()
+    while True:
+        chunk = await run_sync(next, iterator, sentinel)
+        if chunk is sentinel:
+            break
+        yield chunk
+
+
+async def aiter_prefetched(
+    open_stream: t.Callable[[], t.Iterable[bytes]],
+    run_sync: RunSyncType = run_in_threadpool,
+    max_prefetch: int = PREFETCH_CHUNKS,
+) -> t.AsyncIterator[bytes]:
+    """
+    Iterates over the stream returned by `open_stream` asynchronously.
+
+    Each `run_sync` call reads up to `max_prefetch` chunks and returns, the next ones are read
+    while the previous ones are consumed. A worker thread is only held while chunks are read,
+    never while waiting for a slow consumer.
+
+    Once the first chunks are sent, reads rejected by a full storage executor are retried,
+    since the response can't fail cleanly anymore.
+    """
+    max_prefetch = max(max_prefetch, 1)
+    streams: t.List[t.Iterator[bytes]] = []
+
+    def _read() -> t.Tuple[t.List[bytes], bool]:
+        if not streams:
+            streams.append(iter(open_stream()))
+        stream = streams[0]
+        chunks: t.List[bytes] = []
+        for chunk in stream:
+            chunks.append(chunk)
+            if len(chunks) == max_prefetch:
+                return chunks, False
+        return chunks, True
+
+    def _close(*_: t.Any) -> None:
+        close = getattr(streams[0], "close", None) if streams else None
+        if close is not None:
+            close()
+
+    async def _read_retrying() -> t.Tuple[t.List[bytes], bool]:
+        delay = 0.005
+        while True:
+            try:
+                return t.cast(t.Tuple[t.List[bytes], bool], await run_sync(_read))
+            except StorageExecutorFullError:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.1)
+
+    pending: t.Optional["asyncio.Future[t.Tuple[t.List[bytes], bool]]"] = None
+    try:
+        chunks, done = await run_sync(_read)
+        while True:
+            if not done:
+                pending = asyncio.ensure_future(_read_retrying())
+            for chunk in chunks:
+                yield chunk
+            if pending is None:
+                break
+            chunks, done = await pending
+            pending = None
+    finally:
+        if pending is None:
+            _close()
+        else:
+            # the stream is closed once the running read returns
+            pending.add_done_callback(_discard_result)
+            pending.add_done_callback(_close)
+
+
+def _discard_result(future: "asyncio.Future[t.Any]") -> None:
+    if not future.cancelled():
+        future.exception()
+
+
+def iter_content_from_thread(
+    content: t.AsyncIterator[bytes], loop: asyncio.AbstractEventLoop
+) -> t.Iterator[bytes]:
+    """
+    Iterates over an async `content` from a worker thread,
+    fetching each chunk from the event `loop`.
+    """
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(_anext(content), loop).result()
+        except StopAsyncIteration:
+            break
+
+
+async def _anext(content: t.AsyncIterator[bytes]) -> bytes:
+    return await content.__anext__()
+
+
+def open_binary_file(path: str) -> t.BinaryIO:
+    return open(path, "rb")
+
+
+class AsyncStorageBackend(ABC):
+    """
+    Async I/O interface for a storage container.
+
+    Implementations perform every read or write chunk as its own awaitable step
+    instead of running a complete libcloud call in a worker thread.
+    """
+
+    __slots__ = ("container", "metadata_store", "_run_sync")
+
+    def __init__(
+        self,
+        container: Container,
+        run_sync: t.Optional[RunSyncType] = None,
+        metadata_store: t.Optional[MetadataStore] = None,
+    ) -> None:
+        self.container = container
+        # store of the object metadata of local storages, None for other drivers
+        self.metadata_store = metadata_store
+        self._run_sync = run_sync or run_in_threadpool
+
+    async def run_sync(self, func: t.Callable[..., T], *args: t.Any) -> T:
+        """Runs a short blocking call outside the event loop"""
+        return t.cast(T, await self._run_sync(func, *args))
+
+    @abstractmethod
+    async def upload_object(
+        self,
+        content: UploadContent,
+        object_name: str,
+        extra: t.Optional[t.Dict[str, t.Any]] = None,
+        headers: t.Optional[t.Dict[str, str]] = None,
+    ) -> Object:
+        """Uploads `content` as `object_name` into the container"""
+
+    @abstractmethod
+    async def get_object(self, object_name: str) -> Object:
+        """Retrieves `object_name` from the container"""
+
+    @abstractmethod
+    async def delete_object(self, obj: Object) -> bool:
+        """Deletes `obj` from the container"""
+
+    @abstractmethod
+    def iter_object(
+        self, obj: Object, chunk_size: t.Optional[int] = None
+    ) -> t.AsyncIterator[bytes]:
+        """Iterates over the content of `obj`"""
+
+    async def get_metadata(self, obj: Object) -> t.Dict[str, t.Any]:
+        """Retrieves the metadata saved alongside `obj`"""
+        return obj.meta_data
+
+
+class LocalAsyncStorageBackend(AsyncStorageBackend):
+    """
+    Async backend for libcloud local storage driver.
+
+    Uploads are written to a temporary file in the destination folder
+    and atomically moved into place once the last chunk is written.
+    """
+
+    __slots__ = ()
+
+    metadata_store: MetadataStore
+
+    def __init__(
+        self,
+        container: Container,
+        run_sync: t.Optional[RunSyncType] = None,
+        metadata_store: t.Optional[MetadataStore] = None,
+    ) -> None:
+        super().__init__(
+            container,
+            run_sync=run_sync,
+            metadata_store=metadata_store or SidecarMetadataStore(),
+        )
+
+    async def upload_object(
+        self,
+        content: UploadContent,
+        object_name: str,
+        extra: t.Optional[t.Dict[str, t.Any]] = None,
+        headers: t.Optional[t.Dict[str, str]] = None,
+    ) -> Object:
+        await self._write(content, object_name)
+        obj = await self.get_object(object_name)
+
+        # written once the content is, so failed uploads leave no metadata behind
+        meta_data = (extra or {}).get("meta_data")
+        await self.run_sync(self.metadata_store.set, obj, meta_data or {})
+        if meta_data is not None:
+            obj.meta_data = meta_data
+        return obj
+
+    async def _write(self, content: UploadContent, object_name: str) -> None:
+        driver = self.container.driver
+        sharded = isinstance(driver, ShardedLocalStorageDriver)
+        if sharded:
+            obj_path = driver.get_object_path(self.container, object_name)
+        else:
+            obj_path = os.path.join(self.container.get_cdn_url(), object_name)
+        base_path = os.path.dirname(obj_path)
+
+        await self.run_sync(_make_dirs, base_path)
+        fd, tmp_path = await self.run_sync(_make_temp_file, base_path)
+        obj_file = os.fdopen(fd, "wb")
+
+        try:
+            async for chunk in aiter_content(content, self._run_sync):
+                await self.run_sync(obj_file.write, chunk)
+            await self.run_sync(obj_file.close)
+            await self.run_sync(os.chmod, tmp_path, 0o664)
+            await self.run_sync(os.replace, tmp_path, obj_path)
+        except BaseException:
+            obj_file.close()
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+
+        if sharded:
+            await self.run_sync(discard_flat_copy, self.container, object_name)
+
+    async def get_object(self, object_name: str) -> Object:
+        return await self.run_sync(self.container.get_object, object_name)
+
+    async def get_metadata(self, obj: Object) -> t.Dict[str, t.Any]:
+        return await self.run_sync(self.metadata_store.get, obj)
+
+    async def delete_object(self, obj: Object) -> bool:
+        deleted = await self.run_sync(obj.delete)
+        if deleted:
+            await self.run_sync(self.metadata_store.delete, obj)
+        return deleted
+
+    async def iter_object(
+        self, obj: Object, chunk_size: t.Optional[int] = None
+    ) -> t.AsyncIterator[bytes]:
+        obj_file = await self.run_sync(open_binary_file, obj.get_cdn_url())
+        try:
+            async for chunk in aiter_content(
+                obj_file, self._run_sync, chunk_size or CHUNK_SIZE
+            ):
+                yield chunk
+        finally:
+            await self.run_sync(obj_file.close)
+
+
+def _make_dirs(path: str) -> None:
+    os.makedirs(path, exist_ok=True)
+
+
+def _make_temp_file(directory: str) -> t.Tuple[int, str]:
+    return tempfile.mkstemp(dir=directory, prefix=".", suffix=".part")
+
+
+_ASYNC_BACKENDS: t.Dict[str, t.Type[AsyncStorageBackend]] = {
+    LOCAL_STORAGE_DRIVER_NAME: LocalAsyncStorageBackend,
+}
+
+
+def register_async_backend(
+    driver_name: str, backend: t.Type[AsyncStorageBackend]
+) -> None:
+    """Registers an async backend for storages using a driver named `driver_name`"""
+    _ASYNC_BACKENDS[driver_name] = backend
+
+
+def get_async_backend(
+    container: Container,
+    run_sync: t.Optional[RunSyncType] = None,
+    metadata_store: t.Optional[MetadataStore] = None,
+) -> t.Optional[AsyncStorageBackend]:
+    """
+    Returns async backend for `container` if one is registered for its driver,
+    `metadata_store` is the store of local storages.
+    """
+    backend = _ASYNC_BACKENDS.get(container.driver.name)
+    if backend is None:
+        return None
+    return backend(container, run_sync=run_sync, metadata_store=metadata_store)
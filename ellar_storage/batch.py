@@ -0,0 +1,73 @@
+import asyncio
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+
+T = t.TypeVar("T")
+I = t.TypeVar("I")  # noqa: E741
+
+
+class BatchResult(t.Generic[T]):
+    """Outcome of a single item of a batch operation"""
+
+    __slots__ = ("key", "value", "error")
+
+    def __init__(
+        self,
+        key: str,
+        value: t.Optional[T] = None,
+        error: t.Optional[BaseException] = None,
+    ) -> None:
+        self.key = key
+        self.value = value
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self) -> str:
+        outcome = f"error={self.error!r}" if self.error else f"value={self.value!r}"
+        return f"<BatchResult key={self.key!r} {outcome}>"
+
+
+def run_batch(
+    func: t.Callable[[I], T],
+    items: t.Sequence[I],
+    keys: t.Sequence[str],
+    max_concurrency: int,
+) -> t.List[BatchResult[T]]:
+    """Runs `func` over `items` in up to `max_concurrency` threads, results keep `items` order"""
+
+    def _run(key: str, item: I) -> BatchResult[T]:
+        try:
+            return BatchResult(key, value=func(item))
+        except Exception as ex:
+            return BatchResult(key, error=ex)
+
+    if not items:
+        return []
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(max_concurrency, len(items))),
+        thread_name_prefix="ellar-storage-batch",
+    ) as executor:
+        return list(executor.map(_run, keys, items))
+
+
+async def run_batch_async(
+    func: t.Callable[[I], t.Awaitable[T]],
+    items: t.Sequence[I],
+    keys: t.Sequence[str],
+    max_concurrency: int,
+) -> t.List[BatchResult[T]]:
+    """Awaits `func` over `items` with up to `max_concurrency` pending calls, results keep `items` order"""
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def _run(key: str, item: I) -> BatchResult[T]:
+        async with semaphore:
+            try:
+                return BatchResult(key, value=await func(item))
+            except Exception as ex:
+                return BatchResult(key, error=ex)
+
+    return list(await asyncio.gather(*(_run(k, i) for k, i in zip(keys, items))))
@@ -0,0 +1,79 @@
+import collections
+import threading
+import time
+import typing as t
+
+
+class _CacheEntry(t.NamedTuple):
+    version: t.Optional[str]
+    metadata: t.Dict[str, t.Any]
+    expires_at: t.Optional[float]
+
+
+class MetadataCache:
+    """
+    In-process LRU cache of object metadata.
+
+    Entries are keyed by storage and object name and carry the object version
+    (libcloud `Object.hash`, an mtime digest on the local driver).
+    A lookup with another version is a miss, so overwritten objects are never served stale metadata.
+    """
+
+    __slots__ = ("max_size", "ttl", "hits", "misses", "_entries", "_lock")
+
+    def __init__(self, max_size: int = 1024, ttl: t.Optional[float] = None) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: t.OrderedDict[t.Tuple[str, str], _CacheEntry] = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(
+        self, storage: str, name: str, version: t.Optional[str]
+    ) -> t.Optional[t.Dict[str, t.Any]]:
+        key = (storage, name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if entry.version != version or (
+                entry.expires_at is not None and entry.expires_at < time.monotonic()
+            ):
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry.metadata)
+
+    def set(
+        self,
+        storage: str,
+        name: str,
+        version: t.Optional[str],
+        metadata: t.Dict[str, t.Any],
+    ) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        key = (storage, name)
+        with self._lock:
+            self._entries[key] = _CacheEntry(version, dict(metadata), expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, storage: str, name: str) -> None:
+        with self._lock:
+            self._entries.pop((storage, name), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
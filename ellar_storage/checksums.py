@@ -0,0 +1,96 @@
+import hashlib
+import typing as t
+
+from libcloud.utils.files import read_in_chunks
+
+from ellar_storage.exceptions import ObjectHashMismatchError
+from ellar_storage.storage import CHUNK_SIZE, Object
+
+ChecksumAlgorithm = t.Literal["md5", "sha1", "sha256", "crc32c"]
+
+# algorithms tried first when verifying, cheapest first
+VERIFY_ORDER: t.Tuple[ChecksumAlgorithm, ...] = ("crc32c", "md5", "sha1", "sha256")
+
+
+def is_crc32c_available() -> bool:
+    try:
+        import crc32c  # noqa: F401
+    except ImportError:  # pragma: no cover
+        return False
+    return True
+
+
+class _Crc32c:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def update(self, chunk: bytes) -> None:
+        import crc32c
+
+        self.value = crc32c.crc32c(chunk, self.value)
+
+    def hexdigest(self) -> str:
+        return f"{self.value:08x}"
+
+
+class ChecksumHasher:
+    """Computes several digests of content in a single pass"""
+
+    __slots__ = ("_hashes",)
+
+    def __init__(self, algorithms: t.Iterable[ChecksumAlgorithm]) -> None:
+        self._hashes: t.Dict[str, t.Any] = {
+            algorithm: _Crc32c() if algorithm == "crc32c" else hashlib.new(algorithm)
+            for algorithm in algorithms
+        }
+
+    def update(self, chunk: bytes) -> None:
+        for hash_ in self._hashes.values():
+            hash_.update(chunk)
+
+    def hexdigests(self) -> t.Dict[str, str]:
+        return {
+            algorithm: hash_.hexdigest() for algorithm, hash_ in self._hashes.items()
+        }
+
+    def wrap(
+        self, content: t.Union[t.IO[bytes], t.Iterable[bytes]]
+    ) -> t.Iterator[bytes]:
+        """Yields `content` chunks, hashing them as they're consumed"""
+        chunks: t.Iterator[bytes] = read_in_chunks(  # type:ignore[no-untyped-call]
+            content, chunk_size=CHUNK_SIZE
+        )
+        for chunk in chunks:
+            self.update(chunk)
+            yield chunk
+
+
+def verify_stream(
+    stream: t.Iterator[bytes], obj: Object, checksums: t.Dict[str, str]
+) -> t.Iterator[bytes]:
+    """
+    Yields `stream` chunks, raising `ObjectHashMismatchError` once the stream is exhausted
+    if its digest differs from `checksums`.
+
+    Only the cheapest of the stored algorithms is computed.
+    """
+    algorithm = next(
+        (algorithm for algorithm in VERIFY_ORDER if algorithm in checksums), None
+    )
+    if algorithm is None:
+        yield from stream
+        return
+
+    hasher = ChecksumHasher([algorithm])
+    for chunk in stream:
+        hasher.update(chunk)
+        yield chunk
+
+    if hasher.hexdigests()[algorithm] != checksums[algorithm]:
+        raise ObjectHashMismatchError(  # type:ignore[no-untyped-call]
+            value=f"{algorithm} checksum mismatch",
+            driver=obj.driver,
+            object_name=obj.name,
+        )
@@ -0,0 +1,100 @@
+import fnmatch
+import typing as t
+import zlib
+
+from libcloud.utils.files import read_in_chunks
+
+from ellar_storage.storage import CHUNK_SIZE
+
+ContentEncoding = t.Literal["gzip", "zstd"]
+
+# content types compressed by default, text formats that compress well
+COMPRESSIBLE_CONTENT_TYPES = (
+    "text/*",
+    "application/json",
+    "application/*+json",
+    "application/x-ndjson",
+    "application/xml",
+    "application/*+xml",
+    "application/javascript",
+    "application/yaml",
+    "image/svg+xml",
+)
+
+# gzip container instead of a raw zlib stream
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def is_zstd_available() -> bool:
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:  # pragma: no cover
+        return False
+    return True
+
+
+def is_compressible(
+    content_type: t.Optional[str], content_types: t.Iterable[str]
+) -> bool:
+    """Whether `content_type` matches one of the `content_types` patterns, eg `text/*`"""
+    if not content_type:
+        return False
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return any(
+        fnmatch.fnmatchcase(media_type, pattern.lower()) for pattern in content_types
+    )
+
+
+def compress_stream(
+    content: t.Union[t.IO[bytes], t.Iterable[bytes]],
+    encoding: ContentEncoding,
+    level: t.Optional[int] = None,
+) -> t.Iterator[bytes]:
+    """Yields the chunks of `content` compressed with `encoding` as they're consumed"""
+    compressor = _get_compressor(encoding, level)
+    chunks: t.Iterator[bytes] = read_in_chunks(  # type:ignore[no-untyped-call]
+        content, chunk_size=CHUNK_SIZE
+    )
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def decompress_stream(stream: t.Iterable[bytes], encoding: str) -> t.Iterator[bytes]:
+    """Yields the chunks of `stream` decompressed from `encoding` as they're consumed"""
+    decompressor = _get_decompressor(encoding)
+    for chunk in stream:
+        decompressed = decompressor.decompress(chunk)
+        if decompressed:
+            yield decompressed
+    remaining = decompressor.flush()
+    if remaining:
+        yield remaining
+
+
+def _get_compressor(encoding: str, level: t.Optional[int]) -> t.Any:
+    if encoding == "gzip":
+        return zlib.compressobj(
+            zlib.Z_DEFAULT_COMPRESSION if level is None else level,
+            zlib.DEFLATED,
+            _GZIP_WBITS,
+        )
+    if encoding == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor(
+            level=3 if level is None else level
+        ).compressobj()
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+def _get_decompressor(encoding: str) -> t.Any:
+    if encoding == "gzip":
+        return zlib.decompressobj(_GZIP_WBITS)
+    if encoding == "zstd":
+        import zstandard
+
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise ValueError(f"Unsupported content encoding: {encoding}")
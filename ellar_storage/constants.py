@@ -3,3 +3,6 @@ LOCAL_STORAGE_DRIVER_NAME = "Local Storage"
 
 KB = 1024
 MB = 1024 * KB
+
+# default number of concurrent operations of batch methods
+BATCH_CONCURRENCY = 8
@@ -0,0 +1,136 @@
+import contextlib
+import hashlib
+import json
+import os
+import string
+import threading
+import typing as t
+from tempfile import SpooledTemporaryFile
+
+import fasteners
+from libcloud.utils.files import read_in_chunks
+
+from ellar_storage.constants import IN_MEMORY_FILESIZE, LOCAL_STORAGE_DRIVER_NAME
+from ellar_storage.exceptions import ObjectDoesNotExistError
+from ellar_storage.storage import CHUNK_SIZE, Container
+
+# number of locks digests are spread over
+LOCK_STRIPES = 64
+# hidden folder of local containers holding the inter-process lock files
+LOCAL_LOCKS_DIRECTORY = ".locks"
+
+
+def spool_and_hash(
+    content: t.Union[t.IO[bytes], t.Iterable[bytes]], algorithm: str
+) -> t.Tuple[str, "SpooledTemporaryFile[bytes]"]:
+    """
+    Reads `content` once, returning its hex digest and a spooled copy rewound for upload.
+
+    The copy stays in memory up to `IN_MEMORY_FILESIZE` bytes.
+    """
+    digest = hashlib.new(algorithm)
+    spooled: "SpooledTemporaryFile[bytes]" = SpooledTemporaryFile(IN_MEMORY_FILESIZE)
+    try:
+        for chunk in read_in_chunks(content, chunk_size=CHUNK_SIZE):  # type:ignore[no-untyped-call]
+            digest.update(chunk)
+            spooled.write(chunk)
+    except BaseException:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    return digest.hexdigest(), spooled
+
+
+def is_digest(name: str, algorithm: str) -> bool:
+    """Whether `name` is a hex digest of `algorithm`, ie the name of a content addressed object"""
+    return len(name) == hashlib.new(algorithm).digest_size * 2 and all(
+        char in string.hexdigits for char in name
+    )
+
+
+def hash_file(path: str, algorithm: str) -> str:
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as content_file:
+        for chunk in iter(lambda: content_file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentRefs:
+    """
+    Reference counts of the objects of a content addressed container.
+
+    The count of an object is kept in a `<digest>.refs` object next to it.
+    Updates of a digest are serialized within the process, and across processes
+    on local storage with a lock file. Remote storages shared by several processes
+    can't lock, concurrent updates of the same digest there are best effort.
+    """
+
+    __slots__ = ("container", "_locks", "_locks_directory")
+
+    def __init__(self, container: Container) -> None:
+        self.container = container
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._locks_directory: t.Optional[str] = None
+        if container.driver.name == LOCAL_STORAGE_DRIVER_NAME:
+            self._locks_directory = os.path.join(
+                container.get_cdn_url(), LOCAL_LOCKS_DIRECTORY
+            )
+            os.makedirs(self._locks_directory, exist_ok=True)
+
+    @contextlib.contextmanager
+    def lock(self, digest: str) -> t.Iterator[None]:
+        with self._locks[int(digest[:8], 16) % LOCK_STRIPES]:
+            if self._locks_directory is None:
+                yield
+                return
+            lock = self._acquire_file_lock(self._get_lock_path(digest))
+            try:
+                yield
+            finally:
+                lock.release()
+
+    def get(self, digest: str) -> int:
+        try:
+            refs_obj = self.container.get_object(self._get_refs_name(digest))
+        except ObjectDoesNotExistError:
+            return 0
+        return int(json.loads(b"".join(refs_obj.as_stream()))["count"])
+
+    def set(self, digest: str, count: int) -> None:
+        """Sets the count of `digest`, the refs object and lock file are removed at 0"""
+        refs_name = self._get_refs_name(digest)
+        if count > 0:
+            self.container.upload_object_via_stream(
+                iterator=iter([json.dumps({"count": count}).encode()]),
+                object_name=refs_name,
+            )
+            return
+
+        with contextlib.suppress(ObjectDoesNotExistError):
+            self.container.get_object(refs_name).delete()
+        if self._locks_directory is not None:
+            # called with the lock held, processes waiting on it lock the file again
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self._get_lock_path(digest))
+
+    @staticmethod
+    def _acquire_file_lock(path: str) -> fasteners.InterProcessLock:
+        while True:
+            lock = fasteners.InterProcessLock(path)
+            lock.acquire()
+            # the file may have been removed while waiting, once its digest was released
+            try:
+                if os.stat(path).st_ino == os.fstat(lock.lockfile.fileno()).st_ino:
+                    return lock
+            except FileNotFoundError:
+                pass
+            lock.release()
+
+    def _get_lock_path(self, digest: str) -> str:
+        assert self._locks_directory is not None
+        return os.path.join(self._locks_directory, f"{digest}.lock")
+
+    @staticmethod
+    def _get_refs_name(digest: str) -> str:
+        return f"{digest}.refs"
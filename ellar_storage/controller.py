@@ -1,12 +1,52 @@
+import asyncio
+import contextlib
+import os.path
 import typing as t
 
 import ellar.common as ecm
-from ellar.common import NotFound
+from ellar.common import HTTPException, NotFound
 from ellar.core import Request
 from libcloud.storage.types import ObjectDoesNotExistError
-from starlette.responses import RedirectResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import (
+    FileResponse,
+    RedirectResponse,
+    Response,
+    StreamingResponse,
+)
+from starlette.types import Receive, Scope, Send
 
+from ellar_storage.backends import iter_content_from_thread
+from ellar_storage.exceptions import (
+    MultipartError,
+    UploadIncompleteError,
+    UploadOffsetMismatchError,
+    UploadSessionNotFoundError,
+    UploadTooLargeError,
+)
+from ellar_storage.metrics import (
+    PROMETHEUS_CONTENT_TYPE,
+    MetricsCollector,
+    OperationTimer,
+)
+from ellar_storage.responses import (
+    accepts_encoding,
+    get_content_disposition,
+    get_offload_response,
+    get_range_response,
+    get_validator_headers,
+    is_not_modified,
+    is_range_fresh,
+)
+from ellar_storage.resumable import ResumableUploadStore, UploadSession
+from ellar_storage.schemas import _ServingSetup
 from ellar_storage.services import StorageService
+from ellar_storage.stored_file import CachedStoredFile, StoredFile
+from ellar_storage.uploads import (
+    MultipartFileStream,
+    get_multipart_boundary,
+    parse_upload_metadata,
+)
 
 
 @ecm.Controller(name="storage", include_in_schema=False)
@@ -17,26 +57,445 @@ class StorageController:
     @ecm.get("/download/{path:path}", name="download", include_in_schema=False)
     @ecm.file()
     def download_file(self, req: Request, path: str) -> t.Any:
+        metrics = self._storage_service.metrics
+        if metrics is None:
+            return self._download_file(req, path)
+
+        try:
+            storage_name = self._storage_service.get_storage_name(path)
+        except (RuntimeError, ValueError):
+            # unknown storages aren't tracked, labels stay bounded by the configuration
+            return self._download_file(req, path)
+
+        timer = OperationTimer(metrics, storage_name, "download")
+        timer.__enter__()
+        try:
+            response = self._download_file(req, path)
+        except BaseException as ex:
+            timer.__exit__(type(ex), ex, ex.__traceback__)
+            raise
+        # measured until the body is sent
+        return _TrackedResponse(
+            _count_bytes_out(metrics, storage_name, req, response), timer
+        )
+
+    @ecm.get("/metrics", name="metrics", include_in_schema=False)
+    def get_metrics(self) -> t.Any:
+        """Storage metrics in the Prometheus text format, enabled with `metrics={"endpoint": True}`"""
+        metrics_setup = self._storage_service.storage_setup.metrics
+        metrics = self._storage_service.metrics
+        if metrics_setup is None or not metrics_setup.endpoint or metrics is None:
+            raise NotFound()
+        content = metrics.render()
+        if content is None:
+            raise NotFound()
+        return Response(content, media_type=PROMETHEUS_CONTENT_TYPE)
+
+    def _download_file(self, req: Request, path: str) -> Response:
         try:
             res = self._storage_service.get(path)
+            # local storage path or cached copy of a remote file
+            local_path = res.get_local_path()
+
+            if (
+                local_path is None
+                and not isinstance(res, CachedStoredFile)
+                # CDNs would send compressed files without their `Content-Encoding`
+                and res.content_encoding is None
+            ):
+                cdn_url = res.get_cdn_url()
+                if cdn_url is not None:  # pragma: no cover
+                    # ranges are forwarded to the CDN along with the redirect
+                    return RedirectResponse(cdn_url)
+
+            serving = self._storage_service.storage_setup.serving
+            validator_headers = get_validator_headers(res, serving.cache_control)
+            if is_not_modified(req.headers, res):
+                # answered before any metadata or content is read
+                return Response(status_code=304, headers=validator_headers)
+
+            headers = {
+                **validator_headers,
+                "Content-Disposition": get_content_disposition(res.filename),
+            }
+
+            if res.content_encoding is not None:
+                return _get_compressed_response(req, res, local_path, headers, serving)
+
+            if local_path is not None:
+                # the reverse proxy handles ranges of offloaded files
+                offload_response = get_offload_response(
+                    local_path,
+                    serving,
+                    res.content_type,
+                    headers,
+                )
+                if offload_response is not None:
+                    return offload_response
+
+            range_header = req.headers.get("range")
+            if range_header and is_range_fresh(req.headers.get("if-range"), res):
+                range_response = get_range_response(res, range_header, headers)
+                if range_response is not None:
+                    return range_response
 
-            if res.get_cdn_url() is None:  # pragma: no cover
+            if local_path is None or range_header:
+                # an ignored `Range` header is answered with the full content
                 return StreamingResponse(
-                    res.object.as_stream(),
+                    _stream_content(res, serving),
                     media_type=res.content_type,
-                    headers={
-                        "Content-Disposition": f"attachment;filename={res.filename}"
-                    },
+                    headers={**headers, "Accept-Ranges": "bytes"},
                 )
 
-            if res.object.driver.name != "Local Storage":  # pragma: no cover
-                return RedirectResponse(res.get_cdn_url())  # type:ignore[arg-type]
-
-            return {
-                "path": res.get_cdn_url(),  # since we are using a local storage, this will return a path to the file
-                "filename": res.filename,
-                "media_type": res.content_type,
-            }
+            # validators override the ones derived by FileResponse from the file stat
+            return _get_file_response(
+                res,
+                local_path,
+                lambda: StreamingResponse(
+                    _stream_content(res, serving),
+                    media_type=res.content_type,
+                    headers={**headers, "Accept-Ranges": "bytes"},
+                ),
+                filename=res.filename,
+                media_type=res.content_type,
+                headers=validator_headers,
+            )
 
         except ObjectDoesNotExistError as obex:
             raise NotFound() from obex
+
+    @ecm.post("/upload/{storage}", name="upload", include_in_schema=False)
+    async def upload_file(self, req: Request, storage: str) -> t.Any:
+        """
+        Streams the request body into `storage`, enabled with `upload={"enabled": True}`.
+
+        Accepts a `multipart/form-data` body, whose first file field is saved,
+        or a raw body named by the `filename` query parameter.
+        """
+        storage_setup = self._storage_service.storage_setup
+        if not storage_setup.upload.enabled or storage not in storage_setup.storages:
+            raise NotFound()
+
+        max_size = storage_setup.upload.max_size
+        content_length = req.headers.get("content-length", "")
+        if max_size is not None and content_length.isdigit():
+            if int(content_length) > max_size:
+                raise HTTPException(status_code=413)
+
+        stream: t.AsyncIterator[bytes] = req.stream()
+        filename = req.query_params.get("filename")
+        content_type = req.headers.get("content-type")
+        try:
+            boundary = get_multipart_boundary(content_type)
+            if boundary is not None:
+                file_stream = MultipartFileStream(stream, boundary)
+                if not await file_stream.find_file():
+                    raise HTTPException(
+                        status_code=400, detail="No file field in multipart body"
+                    )
+                stream = file_stream.__aiter__()
+                filename = file_stream.filename
+                content_type = file_stream.content_type
+
+            res = await self._storage_service.save_stream_async(
+                stream,
+                filename=_get_upload_name(filename),
+                content_type=content_type,
+                upload_storage=storage,
+                max_size=max_size,
+            )
+        except UploadTooLargeError as ex:
+            raise HTTPException(status_code=413) from ex
+        except MultipartError as ex:
+            raise HTTPException(status_code=400, detail=str(ex)) from ex
+
+        return _get_upload_result(storage, res)
+
+    @ecm.post("/resumable/{storage}", name="resumable", include_in_schema=False)
+    async def create_upload_session(self, req: Request, storage: str) -> t.Any:
+        """
+        Creates a resumable upload session, answering with its URL in `Location`.
+
+        The total size is announced with `Upload-Length` when known, and `Upload-Metadata`
+        carries base64 encoded `filename` and `content_type`, tus style.
+        """
+        store = self._get_upload_sessions(storage)
+        max_size = self._storage_service.storage_setup.upload.max_size
+
+        upload_length = req.headers.get("upload-length")
+        if upload_length is not None and not upload_length.isdigit():
+            raise HTTPException(status_code=400, detail="Invalid Upload-Length")
+        length = int(upload_length) if upload_length is not None else None
+        if max_size is not None and length is not None and length > max_size:
+            raise HTTPException(status_code=413)
+
+        try:
+            metadata = parse_upload_metadata(req.headers.get("upload-metadata", ""))
+        except ValueError as ex:
+            raise HTTPException(
+                status_code=400, detail="Invalid Upload-Metadata"
+            ) from ex
+
+        session = await run_in_threadpool(
+            store.create,
+            storage,
+            filename=_get_upload_name(metadata.get("filename")),
+            content_type=metadata.get("content_type") or metadata.get("filetype"),
+            length=length,
+            max_size=max_size,
+        )
+        location = req.url_for(
+            "storage:resumable-session", storage=storage, session_id=session.id
+        )
+        return Response(
+            status_code=201, headers={"Location": str(location), "Upload-Offset": "0"}
+        )
+
+    @ecm.head(
+        "/resumable/{storage}/{session_id}",
+        name="resumable-session",
+        include_in_schema=False,
+    )
+    async def get_upload_session(self, storage: str, session_id: str) -> t.Any:
+        """Answers with the `Upload-Offset` an interrupted upload resumes from"""
+        session = await self._get_upload_session(storage, session_id)
+        headers = {"Upload-Offset": str(session.offset), "Cache-Control": "no-store"}
+        if session.length is not None:
+            headers["Upload-Length"] = str(session.length)
+        return Response(headers=headers)
+
+    @ecm.patch("/resumable/{storage}/{session_id}", include_in_schema=False)
+    async def append_upload_session(
+        self, req: Request, storage: str, session_id: str
+    ) -> t.Any:
+        """
+        Appends the request body to the session,
+        which must be at the `Upload-Offset` sent with the request.
+        """
+        store = self._get_upload_sessions(storage)
+        if req.headers.get("content-type") != "application/offset+octet-stream":
+            raise HTTPException(status_code=415)
+        offset = req.headers.get("upload-offset", "")
+        if not offset.isdigit():
+            raise HTTPException(status_code=400, detail="Invalid Upload-Offset")
+
+        await self._get_upload_session(storage, session_id)
+        try:
+            session = await run_in_threadpool(
+                store.append,
+                session_id,
+                int(offset),
+                iter_content_from_thread(req.stream(), asyncio.get_running_loop()),
+            )
+        except UploadOffsetMismatchError as ex:
+            raise HTTPException(
+                status_code=409, headers={"Upload-Offset": str(ex.offset)}
+            ) from ex
+        except UploadTooLargeError as ex:
+            raise HTTPException(status_code=413) from ex
+        except UploadSessionNotFoundError as ex:
+            raise NotFound() from ex
+
+        return Response(status_code=204, headers={"Upload-Offset": str(session.offset)})
+
+    @ecm.post("/resumable/{storage}/{session_id}", include_in_schema=False)
+    async def complete_upload_session(self, storage: str, session_id: str) -> t.Any:
+        """Saves the uploaded content into `storage` once the session has received all of it"""
+        await self._get_upload_session(storage, session_id)
+        try:
+            res = await self._storage_service.complete_upload_session_async(session_id)
+        except UploadSessionNotFoundError as ex:
+            raise NotFound() from ex
+        except UploadIncompleteError as ex:
+            raise HTTPException(status_code=409, detail=str(ex)) from ex
+
+        return _get_upload_result(storage, res)
+
+    @ecm.delete("/resumable/{storage}/{session_id}", include_in_schema=False)
+    async def delete_upload_session(self, storage: str, session_id: str) -> t.Any:
+        store = self._get_upload_sessions(storage)
+        await self._get_upload_session(storage, session_id)
+        try:
+            await run_in_threadpool(store.delete, session_id)
+        except UploadSessionNotFoundError as ex:
+            raise NotFound() from ex
+        return Response(status_code=204)
+
+    def _get_upload_sessions(self, storage: str) -> ResumableUploadStore:
+        storage_setup = self._storage_service.storage_setup
+        store = self._storage_service.upload_sessions
+        if (
+            not storage_setup.upload.enabled
+            or store is None
+            or storage not in storage_setup.storages
+        ):
+            raise NotFound()
+        return store
+
+    async def _get_upload_session(self, storage: str, session_id: str) -> UploadSession:
+        store = self._get_upload_sessions(storage)
+        try:
+            session = await run_in_threadpool(store.get, session_id)
+        except UploadSessionNotFoundError as ex:
+            raise NotFound() from ex
+        if session.storage != storage:
+            raise NotFound()
+        return session
+
+
+def _get_compressed_response(
+    req: Request,
+    res: StoredFile,
+    local_path: t.Optional[str],
+    headers: t.Dict[str, str],
+    serving: _ServingSetup,
+) -> Response:
+    """
+    Sends the stored bytes of a compressed file with `Content-Encoding` if the client accepts it,
+    or decompresses them on the fly.
+
+    Ranges of the decompressed content aren't served.
+    """
+    content_encoding = t.cast(str, res.content_encoding)
+    headers = {**headers, "Vary": "Accept-Encoding"}
+
+    if not accepts_encoding(req.headers.get("accept-encoding"), content_encoding):
+        if "ETag" in headers:
+            # the decompressed content differs from the stored bytes
+            headers["ETag"] = f"W/{headers['ETag']}"
+        return StreamingResponse(
+            _stream_content(res, serving), media_type=res.content_type, headers=headers
+        )
+
+    headers["Content-Encoding"] = content_encoding
+    if local_path is not None:
+        # a reverse proxy would compress or decompress offloaded files by itself,
+        # the file is sent as is instead
+        return _get_file_response(
+            res,
+            local_path,
+            lambda: _get_raw_response(res, headers, serving),
+            media_type=res.content_type,
+            headers=headers,
+        )
+    return _get_raw_response(res, headers, serving)
+
+
+def _get_raw_response(
+    res: StoredFile, headers: t.Dict[str, str], serving: _ServingSetup
+) -> Response:
+    return StreamingResponse(
+        _stream_content(res, serving, raw=True),
+        media_type=res.content_type,
+        headers={**headers, "Content-Length": str(res.size)},
+    )
+
+
+def _get_file_response(
+    res: StoredFile,
+    local_path: str,
+    fallback: t.Callable[[], Response],
+    **kwargs: t.Any,
+) -> Response:
+    if isinstance(res, CachedStoredFile):
+        # the cached copy may be evicted by another worker before it's sent
+        return _CachedFileResponse(local_path, fallback, **kwargs)
+    return FileResponse(local_path, **kwargs)
+
+
+class _CachedFileResponse(FileResponse):
+    """Sends a cached copy of a file, or the `fallback` response once the copy is evicted"""
+
+    def __init__(
+        self, path: str, fallback: t.Callable[[], Response], **kwargs: t.Any
+    ) -> None:
+        super().__init__(path, **kwargs)
+        self.fallback = fallback
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.stat_result is None:
+            try:
+                stat_result = await run_in_threadpool(os.stat, self.path)
+            except FileNotFoundError:
+                await self.fallback()(scope, receive, send)
+                return
+            self.stat_result = stat_result
+            self.set_stat_headers(stat_result)
+        await super().__call__(scope, receive, send)
+
+
+class _TrackedResponse(Response):
+    """Sends `response`, ending the measure of its operation once the body is sent"""
+
+    def __init__(self, response: Response, timer: OperationTimer) -> None:
+        self.response = response
+        self.timer = timer
+        self.status_code = response.status_code
+        self.media_type = response.media_type
+        self.background = None
+        self.raw_headers = response.raw_headers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await self.response(scope, receive, send)
+        except BaseException as ex:
+            self.timer.__exit__(type(ex), ex, ex.__traceback__)
+            raise
+        self.timer.__exit__(None, None, None)
+
+
+def _count_bytes_out(
+    metrics: MetricsCollector, storage_name: str, req: Request, response: Response
+) -> Response:
+    if isinstance(response, StreamingResponse):
+        response.body_iterator = _aiter_counted(
+            response.body_iterator, metrics, storage_name
+        )
+    elif isinstance(response, _CachedFileResponse):
+        fallback = response.fallback
+        response.fallback = lambda: _count_bytes_out(
+            metrics, storage_name, req, fallback()
+        )
+
+    if isinstance(response, FileResponse) and "range" not in req.headers:
+        # sent by the application, unlike offloaded files
+        with contextlib.suppress(OSError):
+            metrics.add_bytes(storage_name, "out", os.path.getsize(response.path))
+    return response
+
+
+async def _aiter_counted(
+    content: t.AsyncIterable[t.Any], metrics: MetricsCollector, storage_name: str
+) -> t.AsyncIterator[t.Any]:
+    sent = 0
+    try:
+        async for chunk in content:
+            sent += len(chunk)
+            yield chunk
+    finally:
+        metrics.add_bytes(storage_name, "out", sent)
+
+
+def _stream_content(
+    res: StoredFile, serving: _ServingSetup, raw: bool = False
+) -> t.Union[t.Iterator[bytes], t.AsyncIterator[bytes]]:
+    if serving.prefetch_chunks:
+        return res.aiter_stream(max_prefetch=serving.prefetch_chunks, raw=raw)
+    # iterated by Starlette in a worker thread, one chunk at a time
+    return res.as_raw_stream() if raw else res.as_stream()
+
+
+def _get_upload_name(filename: t.Optional[str]) -> t.Optional[str]:
+    # client paths are never used as storage paths
+    if not filename:
+        return None
+    return os.path.basename(filename.replace("\\", "/")) or None
+
+
+def _get_upload_result(storage: str, res: StoredFile) -> t.Dict[str, t.Any]:
+    return {
+        "path": f"{storage}/{res.name}",
+        "filename": res.filename,
+        "content_type": res.content_type,
+        "size": res.size,
+    }
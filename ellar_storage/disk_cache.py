@@ -0,0 +1,152 @@
+import collections
+import contextlib
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import typing as t
+
+# age after which an unfinished cache fill is considered abandoned
+STALE_FILL_SECONDS = 3600
+
+
+class DiskCache:
+    """
+    Read-through cache of object content on local disk.
+
+    Cached files are named after the storage, the object name and the object etag,
+    so an entry is only valid for the version of the object it was filled from.
+    Least recently used entries are evicted once cached files exceed `max_bytes`.
+    """
+
+    __slots__ = ("directory", "max_bytes", "_entries", "_total_bytes", "_lock")
+
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # cache key -> (file name, size), least recently used first
+        self._entries: t.OrderedDict[str, t.Tuple[str, int]] = collections.OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_entries()
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_path(
+        self, storage: str, name: str, etag: t.Optional[str]
+    ) -> t.Optional[str]:
+        """Returns the cached file path of the object version, if cached"""
+        if etag is None:
+            return None
+
+        key = self._get_key(storage, name)
+        file_name = self._get_file_name(key, etag)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != file_name:
+                return None
+            self._entries.move_to_end(key)
+        return os.path.join(self.directory, file_name)
+
+    def fill(
+        self,
+        storage: str,
+        name: str,
+        etag: t.Optional[str],
+        size: int,
+        stream: t.Iterator[bytes],
+    ) -> t.Iterator[bytes]:
+        """
+        Yields `stream` while writing it to the cache.
+
+        The entry is only added once the stream is fully consumed and `size` bytes were written.
+        """
+        if etag is None or size > self.max_bytes:
+            yield from stream
+            return
+
+        key = self._get_key(storage, name)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        written = 0
+        try:
+            with os.fdopen(fd, "wb") as cache_file:
+                for chunk in stream:
+                    cache_file.write(chunk)
+                    written += len(chunk)
+                    yield chunk
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+
+        if written != size:  # pragma: no cover
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            return
+
+        file_name = self._get_file_name(key, etag)
+        try:
+            os.replace(tmp_path, os.path.join(self.directory, file_name))
+        except FileNotFoundError:  # pragma: no cover
+            return
+        self._add_entry(key, file_name, size)
+
+    def invalidate(self, storage: str, name: str) -> None:
+        key = self._get_key(storage, name)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._total_bytes -= entry[1]
+                self._remove_file(entry[0])
+
+    def _add_entry(self, key: str, file_name: str, size: int) -> None:
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous[1]
+                if previous[0] != file_name:
+                    self._remove_file(previous[0])
+
+            self._entries[key] = (file_name, size)
+            self._total_bytes += size
+
+            while self._total_bytes > self.max_bytes and self._entries:
+                _, (evicted, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                self._remove_file(evicted)
+
+    def _load_entries(self) -> None:
+        files = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file():
+                continue
+            stat = entry.stat()
+            if entry.name.endswith(".tmp"):
+                if stat.st_mtime < time.time() - STALE_FILL_SECONDS:
+                    # left over from an interrupted fill
+                    self._remove_file(entry.name)
+                continue
+            files.append((stat.st_atime, entry.name, stat.st_size))
+
+        for _, file_name, size in sorted(files):
+            self._add_entry(file_name.split("-", 1)[0], file_name, size)
+
+    def _remove_file(self, file_name: str) -> None:
+        with contextlib.suppress(OSError):
+            os.unlink(os.path.join(self.directory, file_name))
+
+    @staticmethod
+    def _get_key(storage: str, name: str) -> str:
+        return hashlib.sha256(f"{storage}/{name}".encode()).hexdigest()
+
+    @staticmethod
+    def _get_file_name(key: str, etag: str) -> str:
+        return f"{key}-{hashlib.sha256(etag.encode()).hexdigest()[:32]}"
@@ -0,0 +1,46 @@
+import json
+import typing as t
+
+from requests.adapters import HTTPAdapter
+
+from ellar_storage.storage import StorageDriver
+
+DriverKeyType = t.Tuple[t.Type[StorageDriver], str]
+
+
+def get_driver_key(
+    driver: t.Type[StorageDriver],
+    options: t.Dict[str, t.Any],
+    connection: t.Optional[t.Dict[str, t.Any]] = None,
+) -> DriverKeyType:
+    """
+    Returns a hashable key identifying a driver instance,
+    storages with the same key share a single driver and its connection pool.
+    """
+    return driver, json.dumps(
+        {"options": options, "connection": connection},
+        sort_keys=True,
+        default=repr,
+    )
+
+
+def configure_connection_pool(
+    driver: StorageDriver, pool_size: int, keep_alive: bool = True
+) -> bool:
+    """
+    Sets the HTTP connection pool size and keep-alive of a libcloud driver.
+
+    Returns False when the driver doesn't use a `requests` session
+    or mounts its own adapter for client certificates.
+    """
+    driver_connection = getattr(driver, "connection", None)
+    session = getattr(getattr(driver_connection, "connection", None), "session", None)
+    if session is None or getattr(driver_connection, "cert_file", None):
+        return False
+
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+    return True
@@ -12,3 +12,31 @@ from libcloud.storage.types import ObjectDoesNotExistError  # noqa
 from libcloud.storage.types import ObjectHashMismatchError  # noqa
 from libcloud.storage.types import InvalidContainerNameError  # noqa
 from libcloud.storage.types import ObjectHashMismatchError  # noqa
+
+
+class StorageExecutorFullError(RuntimeError):
+    """Raised when a storage executor configured to `reject` has no free slot"""
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when a streamed upload exceeds its configured maximum size"""
+
+
+class MultipartError(ValueError):
+    """Raised when a streamed multipart/form-data body is malformed"""
+
+
+class UploadSessionNotFoundError(LookupError):
+    """Raised when a resumable upload session doesn't exist or has expired"""
+
+
+class UploadOffsetMismatchError(ValueError):
+    """Raised when a resumable upload chunk doesn't start at the session offset"""
+
+    def __init__(self, offset: int) -> None:
+        super().__init__(f"Upload session is at offset {offset}")
+        self.offset = offset
+
+
+class UploadIncompleteError(ValueError):
+    """Raised when completing a resumable upload session that hasn't received all its content"""
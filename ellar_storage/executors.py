@@ -0,0 +1,145 @@
+import asyncio
+import collections
+import contextvars
+import functools
+import threading
+import typing as t
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from ellar_storage.exceptions import StorageExecutorFullError
+
+T = t.TypeVar("T")
+
+
+class StorageExecutor:
+    """
+    Bounded thread pool for the blocking I/O of a single storage.
+
+    At most `max_workers` calls run at once and at most `queue_size` more wait for a worker.
+    Once both are taken, callers either wait for a free slot (`overflow="wait"`)
+    or fail with `StorageExecutorFullError` (`overflow="reject"`).
+    """
+
+    __slots__ = (
+        "name",
+        "max_workers",
+        "queue_size",
+        "overflow",
+        "_executor",
+        "_lock",
+        "_waiters",
+        "_in_use",
+        "_active",
+        "_rejected",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: int,
+        queue_size: int = 0,
+        overflow: str = "wait",
+    ) -> None:
+        self.name = name
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.overflow = overflow
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"ellar-storage-{name}"
+        )
+        self._lock = threading.Lock()
+        self._waiters: t.Deque[asyncio.Future] = collections.deque()
+        self._in_use = 0
+        self._active = 0
+        self._rejected = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.queue_size
+
+    async def run(self, func: t.Callable[..., T], *args: t.Any, **kwargs: t.Any) -> T:
+        """Runs `func` in the storage pool, same as `starlette.concurrency.run_in_threadpool`"""
+        await self._acquire()
+        try:
+            context = contextvars.copy_context()
+            future = self._executor.submit(
+                context.run, functools.partial(self._call, func, *args, **kwargs)
+            )
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> t.Dict[str, t.Any]:
+        """Returns current pool occupancy"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "queue_size": self.queue_size,
+                "overflow": self.overflow,
+                "active": self._active,
+                "queued": self._in_use - self._active,
+                "waiting": len(self._waiters),
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+    def _call(self, func: t.Callable[..., T], *args: t.Any, **kwargs: t.Any) -> T:
+        with self._lock:
+            self._active += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def _on_done(self, _: Future) -> None:
+        self._release()
+
+    async def _acquire(self) -> None:
+        with self._lock:
+            if self._in_use < self.capacity:
+                self._in_use += 1
+                return
+
+            if self.overflow == "reject":
+                self._rejected += 1
+                raise StorageExecutorFullError(
+                    f"{self.name} storage executor is full "
+                    f"({self.max_workers} workers, {self.queue_size} queued)"
+                )
+
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            if waiter.done() and not waiter.cancelled():
+                # the slot was handed over just before cancellation
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        with self._lock:
+            if self._waiters:
+                # hand the slot over to the next waiter, `_in_use` stays the same
+                waiter = self._waiters.popleft()
+                waiter.get_loop().call_soon_threadsafe(self._wake, waiter)
+                return
+            self._in_use -= 1
+
+    def _wake(self, waiter: asyncio.Future) -> None:
+        if waiter.done():
+            # waiter was cancelled while the slot was handed over
+            self._release()
+            return
+        waiter.set_result(None)
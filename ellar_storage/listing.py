@@ -0,0 +1,275 @@
+import base64
+import binascii
+import os
+import typing as t
+from datetime import datetime, timezone
+
+from libcloud.storage.drivers.local import IGNORE_FOLDERS
+from libcloud.storage.drivers.s3 import BaseS3StorageDriver
+from libcloud.utils.py3 import httplib
+from libcloud.utils.xml import fixxpath
+
+from ellar_storage.constants import LOCAL_STORAGE_DRIVER_NAME
+from ellar_storage.content_addressed import LOCAL_LOCKS_DIRECTORY
+from ellar_storage.exceptions import LibcloudError
+from ellar_storage.metadata_store import SQLiteMetadataStore
+from ellar_storage.sharding import ShardedLocalStorageDriver, get_object_name
+from ellar_storage.storage import Container
+from ellar_storage.stored_file import _parse_datetime
+
+# default number of files fetched at once by the listing methods
+LIST_PAGE_SIZE = 1000
+
+NameFilterType = t.Callable[[str], bool]
+
+
+class FileEntry(t.NamedTuple):
+    """A listed file, retrieved without reading its metadata"""
+
+    storage: str
+    name: str
+    size: int
+    last_modified: t.Optional[datetime]
+
+    @property
+    def path(self) -> str:
+        """Path of the file for `StorageService.get` and `StorageService.delete`"""
+        return f"{self.storage}/{self.name}"
+
+
+class FilePage(t.NamedTuple):
+    files: t.List[FileEntry]
+    # resumes the listing after the last file of the page, None on the last page
+    continuation_token: t.Optional[str]
+
+
+def iter_file_pages(
+    container: Container,
+    storage_name: str,
+    prefix: t.Optional[str] = None,
+    page_size: int = LIST_PAGE_SIZE,
+    continuation_token: t.Optional[str] = None,
+    is_ignored: t.Optional[NameFilterType] = None,
+    catalog: t.Optional[SQLiteMetadataStore] = None,
+) -> t.Iterator[FilePage]:
+    """
+    Lists the files of `container` whose name starts with `prefix`, one page at a time.
+
+    Files are read from a single pass over the storage, so only a page is held in memory.
+    `continuation_token` resumes a listing after the last file of a previous page.
+    Local storages with a `catalog` are listed from it, a page per indexed query.
+    """
+    if page_size <= 0:
+        raise ValueError("page_size must be greater than 0")
+
+    after = _decode_token(continuation_token) if continuation_token else None
+    if catalog is not None:
+        files = _iter_catalog_files(
+            catalog, container, storage_name, prefix, after, page_size
+        )
+    elif container.driver.name == LOCAL_STORAGE_DRIVER_NAME:
+        files = _iter_local_files(container, storage_name, prefix, after)
+    elif isinstance(container.driver, BaseS3StorageDriver):
+        files = _iter_s3_files(container, storage_name, prefix, after, page_size)
+    else:
+        files = _iter_remote_files(container, storage_name, prefix, after)
+
+    page: t.List[FileEntry] = []
+    cursor = None
+    for entry, position in files:
+        if is_ignored is not None and is_ignored(entry.name):
+            continue
+        if len(page) == page_size:
+            yield FilePage(page, _encode_token(t.cast(str, cursor)))
+            page = []
+        page.append(entry)
+        cursor = position
+    yield FilePage(page, None)
+
+
+def _encode_token(position: str) -> str:
+    return base64.urlsafe_b64encode(position.encode("utf-8")).decode("ascii")
+
+
+def _decode_token(token: str) -> str:
+    try:
+        position = base64.b64decode(
+            token.encode("ascii"), altchars=b"-_", validate=True
+        )
+        return position.decode("utf-8")
+    except (binascii.Error, UnicodeError) as ex:
+        raise ValueError("Invalid continuation token") from ex
+
+
+def _iter_catalog_files(
+    catalog: SQLiteMetadataStore,
+    container: Container,
+    storage_name: str,
+    prefix: t.Optional[str],
+    after: t.Optional[str],
+    page_size: int,
+) -> t.Iterator[t.Tuple[FileEntry, str]]:
+    """
+    Lists the catalogued files of a local container in name order, `page_size` at a time.
+
+    Files are stat'ed for their size and modification time, catalogued files removed
+    without `StorageService` are skipped.
+    """
+    driver = container.driver
+    container_path = container.get_cdn_url()
+    while True:
+        entries = catalog.query(
+            container.name, prefix=prefix, after=after, limit=page_size
+        )
+        for entry in entries:
+            after = entry.name
+            if isinstance(driver, ShardedLocalStorageDriver):
+                path = driver._resolve_object_path(container, entry.name)
+            else:
+                path = os.path.join(container_path, entry.name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            yield (
+                FileEntry(
+                    storage_name,
+                    entry.name,
+                    stat.st_size,
+                    datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+                ),
+                entry.name,
+            )
+        if len(entries) < page_size:
+            break
+
+
+def _iter_local_files(
+    container: Container,
+    storage_name: str,
+    prefix: t.Optional[str],
+    after: t.Optional[str],
+) -> t.Iterator[t.Tuple[FileEntry, str]]:
+    """
+    Walks the container directory in name order, one directory listing at a time.
+
+    Each directory listing is sorted in memory, and a resumed listing walks the directories
+    again up to its position, so very large flat containers should be listed from the catalog,
+    or in a single pass with `iter_files`.
+    Positions are paths in the container, which differ from the names in sharded containers.
+    """
+    driver = container.driver
+    shard_depth = (
+        driver.shard_depth if isinstance(driver, ShardedLocalStorageDriver) else None
+    )
+    after_parts = tuple(after.split("/")) if after is not None else None
+
+    for parts, entry in _walk_sorted(container.get_cdn_url(), (), after_parts):
+        path = "/".join(parts)
+        name = path
+        if shard_depth is not None:
+            # files not resharded yet keep their flat name
+            name = get_object_name(path, shard_depth) or path
+        if prefix and not name.startswith(prefix):
+            continue
+
+        stat = entry.stat()
+        yield (
+            FileEntry(
+                storage_name,
+                name,
+                stat.st_size,
+                datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+            ),
+            path,
+        )
+
+
+def _walk_sorted(
+    path: str,
+    parts: t.Tuple[str, ...],
+    after_parts: t.Optional[t.Tuple[str, ...]],
+) -> t.Iterator[t.Tuple[t.Tuple[str, ...], "os.DirEntry[str]"]]:
+    try:
+        with os.scandir(path) as entries:
+            listing = sorted(entries, key=lambda entry: entry.name)
+    except FileNotFoundError:
+        return
+
+    for entry in listing:
+        entry_parts = (*parts, entry.name)
+        if entry.is_dir(follow_symlinks=False):
+            if entry.name in IGNORE_FOLDERS or entry.name == LOCAL_LOCKS_DIRECTORY:
+                continue
+            # directories before the position were listed entirely
+            if after_parts is None or entry_parts >= after_parts[: len(entry_parts)]:
+                yield from _walk_sorted(entry.path, entry_parts, after_parts)
+            continue
+
+        if after_parts is not None and entry_parts <= after_parts:
+            continue
+        if entry.name.startswith(".") and entry.name.endswith(".part"):
+            # upload in progress
+            continue
+        yield entry_parts, entry
+
+
+def _iter_remote_files(
+    container: Container,
+    storage_name: str,
+    prefix: t.Optional[str],
+    after: t.Optional[str],
+) -> t.Iterator[t.Tuple[FileEntry, str]]:
+    # providers list objects in name order, a resumed listing skips the names before the position
+    for obj in container.iterate_objects(prefix=prefix):
+        if after is not None and obj.name <= after:
+            continue
+        yield _get_remote_entry(storage_name, obj), obj.name
+
+
+def _iter_s3_files(
+    container: Container,
+    storage_name: str,
+    prefix: t.Optional[str],
+    after: t.Optional[str],
+    page_size: int,
+) -> t.Iterator[t.Tuple[FileEntry, str]]:
+    """Lists S3 objects from the position with the `marker` of the ListObjects API"""
+    driver = container.driver
+    params = {"max-keys": str(page_size)}
+    if prefix:
+        params["prefix"] = prefix
+
+    marker = after
+    while True:
+        if marker:
+            params["marker"] = marker
+        response = driver.connection.request(  # type:ignore[no-untyped-call]
+            driver._get_container_path(container), params=params
+        )
+        if response.status != httplib.OK:
+            raise LibcloudError(
+                f"Unexpected status code: {response.status}", driver=driver
+            )
+
+        objects = driver._to_objs(
+            obj=response.object, xpath="Contents", container=container
+        )
+        for obj in objects:
+            marker = obj.name
+            yield _get_remote_entry(storage_name, obj), obj.name
+
+        is_truncated = response.object.findtext(
+            fixxpath(xpath="IsTruncated", namespace=driver.namespace)  # type:ignore[no-untyped-call]
+        )
+        if not objects or (is_truncated or "").lower() != "true":
+            break
+
+
+def _get_remote_entry(storage_name: str, obj: t.Any) -> FileEntry:
+    return FileEntry(
+        storage_name,
+        obj.name,
+        obj.size,
+        _parse_datetime(obj.extra.get("last_modified")),
+    )
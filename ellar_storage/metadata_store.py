@@ -0,0 +1,310 @@
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import typing as t
+from abc import ABC, abstractmethod
+
+from ellar_storage.exceptions import ObjectDoesNotExistError
+from ellar_storage.storage import Container, Object
+from ellar_storage.utils import get_metadata_file_obj, load_local_metadata
+
+# file name of the catalog kept in the `key` directory of local storages
+CATALOG_FILE_NAME = ".ellar_storage_catalog.sqlite3"
+
+_CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    container TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    content_type TEXT,
+    metadata TEXT NOT NULL,
+    PRIMARY KEY (container, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS objects_content_type ON objects (container, content_type);
+CREATE INDEX IF NOT EXISTS objects_size ON objects (container, size);
+CREATE TABLE IF NOT EXISTS complete_containers (container TEXT PRIMARY KEY);
+"""
+
+
+class CatalogEntry(t.NamedTuple):
+    name: str
+    size: int
+    content_type: t.Optional[str]
+    metadata: t.Dict[str, t.Any]
+
+
+class MetadataStore(ABC):
+    """
+    Keeps the metadata of local storage objects,
+    which libcloud local storage driver doesn't support.
+    """
+
+    __slots__ = ()
+
+    @abstractmethod
+    def get(self, obj: Object) -> t.Dict[str, t.Any]:
+        """Retrieves the metadata of `obj`, empty if it has none"""
+
+    @abstractmethod
+    def set(self, obj: Object, metadata: t.Dict[str, t.Any]) -> None:
+        """Saves the metadata of `obj`, once its content is written"""
+
+    @abstractmethod
+    def delete(self, obj: Object) -> None:
+        """Removes the metadata of `obj`, once it's deleted"""
+
+    def delete_many(self, objs: t.Sequence[Object]) -> None:
+        for obj in objs:
+            self.delete(obj)
+
+
+class SidecarMetadataStore(MetadataStore):
+    """Saves the metadata of each object in a `<name>.metadata.json` file next to it"""
+
+    __slots__ = ()
+
+    def get(self, obj: Object) -> t.Dict[str, t.Any]:
+        return load_local_metadata(obj)
+
+    def set(self, obj: Object, metadata: t.Dict[str, t.Any]) -> None:
+        if not metadata:
+            # same as a missing metadata file, an overwritten file doesn't keep the former one
+            self.delete(obj)
+            return
+        obj.container.upload_object_via_stream(
+            iterator=get_metadata_file_obj(metadata),
+            object_name=f"{obj.name}.metadata.json",
+        )
+
+    def delete(self, obj: Object) -> None:
+        with contextlib.suppress(ObjectDoesNotExistError):
+            obj.container.get_object(f"{obj.name}.metadata.json").delete()
+
+    def delete_many(self, objs: t.Sequence[Object]) -> None:
+        # removed directly, without a driver lookup per file
+        for obj in objs:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(f"{obj.get_cdn_url()}.metadata.json")
+
+
+class SQLiteMetadataStore(MetadataStore):
+    """
+    Catalog of the objects of local storages in a SQLite database,
+    indexed by container and name, content type and size.
+
+    Each thread uses its own connection, and the database is opened in WAL mode
+    so that several processes can share it.
+    Objects saved before the catalog was used keep their `.metadata.json` file,
+    which is read when an object isn't in the catalog.
+    A container is complete once every file in it is catalogued: it was empty when the
+    catalog was first used, or its files were imported with `import_sidecars`.
+    """
+
+    __slots__ = ("path", "timeout", "_local", "_connections", "_lock")
+
+    def __init__(self, path: str, timeout: float = 5.0) -> None:
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections: t.List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def get(self, obj: Object) -> t.Dict[str, t.Any]:
+        row = (
+            self._connect()
+            .execute(
+                "SELECT metadata FROM objects WHERE container = ? AND name = ?",
+                (obj.container.name, obj.name),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return load_local_metadata(obj)
+        return t.cast(t.Dict[str, t.Any], json.loads(row[0]))
+
+    def set(self, obj: Object, metadata: t.Dict[str, t.Any]) -> None:
+        self._connect().execute(
+            "INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?)",
+            (
+                obj.container.name,
+                obj.name,
+                obj.size,
+                metadata.get("content_type"),
+                json.dumps(metadata),
+            ),
+        )
+
+    def delete(self, obj: Object) -> None:
+        self.delete_many([obj])
+
+    def delete_many(self, objs: t.Sequence[Object]) -> None:
+        connection = self._connect()
+        with _transaction(connection):
+            deleted = [
+                obj
+                for obj in objs
+                if connection.execute(
+                    "DELETE FROM objects WHERE container = ? AND name = ?",
+                    (obj.container.name, obj.name),
+                ).rowcount
+                == 0
+            ]
+        # objects saved before the catalog was used
+        SidecarMetadataStore().delete_many(deleted)
+
+    def query(
+        self,
+        container: str,
+        prefix: t.Optional[str] = None,
+        content_type: t.Optional[str] = None,
+        min_size: t.Optional[int] = None,
+        max_size: t.Optional[int] = None,
+        after: t.Optional[str] = None,
+        limit: t.Optional[int] = None,
+    ) -> t.List[CatalogEntry]:
+        """
+        Returns the catalog entries of `container` ordered by name,
+        filtered by name `prefix`, `content_type` and size bounds.
+
+        `after` skips the names up to and including it, to fetch the next page.
+        """
+        sql = [
+            "SELECT name, size, content_type, metadata FROM objects WHERE container = ?"
+        ]
+        params: t.List[t.Any] = [container]
+        if prefix:
+            # a range of the primary key rather than a LIKE scan
+            sql.append("AND name >= ? AND name < ?")
+            params += [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)]
+        if after is not None:
+            sql.append("AND name > ?")
+            params.append(after)
+        if content_type is not None:
+            sql.append("AND content_type = ?")
+            params.append(content_type)
+        if min_size is not None:
+            sql.append("AND size >= ?")
+            params.append(min_size)
+        if max_size is not None:
+            sql.append("AND size <= ?")
+            params.append(max_size)
+        sql.append("ORDER BY name")
+        if limit is not None:
+            sql.append("LIMIT ?")
+            params.append(limit)
+
+        return [
+            CatalogEntry(name, size, entry_content_type, json.loads(metadata))
+            for name, size, entry_content_type, metadata in self._connect().execute(
+                " ".join(sql), params
+            )
+        ]
+
+    def usage(self, container: str) -> t.Dict[str, int]:
+        """Returns the number of objects of `container` in the catalog and their total size"""
+        count, size = (
+            self._connect()
+            .execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects WHERE container = ?",
+                (container,),
+            )
+            .fetchone()
+        )
+        return {"count": count, "size": size}
+
+    def is_complete(self, container: str) -> bool:
+        """Whether every file of `container` is catalogued, so it can be listed from the catalog"""
+        return (
+            self._connect()
+            .execute(
+                "SELECT 1 FROM complete_containers WHERE container = ?", (container,)
+            )
+            .fetchone()
+            is not None
+        )
+
+    def init_container(self, container: Container) -> None:
+        """Marks `container` complete if it has no files when the catalog is first used"""
+        if not self.is_complete(container.name) and (
+            next(iter(container.iterate_objects()), None) is None
+        ):
+            self._mark_complete(container.name)
+
+    def import_sidecars(self, container: Container) -> int:
+        """
+        Moves the `.metadata.json` files of `container` into the catalog, along with the files
+        saved without one, and returns the number of files imported.
+
+        The container is complete afterwards.
+        """
+        imported = 0
+        for obj in container.iterate_objects():
+            if obj.name.endswith(".metadata.json"):
+                continue
+            if self._contains(container.name, obj.name):
+                continue
+            self.set(obj, load_local_metadata(obj))
+            imported += 1
+        for metadata_obj in container.iterate_objects():
+            if metadata_obj.name.endswith(".metadata.json") and self._contains(
+                container.name, metadata_obj.name[: -len(".metadata.json")]
+            ):
+                metadata_obj.delete()
+        self._mark_complete(container.name)
+        return imported
+
+    def _contains(self, container: str, name: str) -> bool:
+        return (
+            self._connect()
+            .execute(
+                "SELECT 1 FROM objects WHERE container = ? AND name = ?",
+                (container, name),
+            )
+            .fetchone()
+            is not None
+        )
+
+    def _mark_complete(self, container: str) -> None:
+        self._connect().execute(
+            "INSERT OR IGNORE INTO complete_containers VALUES (?)", (container,)
+        )
+
+    def close(self) -> None:
+        """Closes the connections of every thread"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection: t.Optional[sqlite3.Connection] = getattr(
+            self._local, "connection", None
+        )
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path,
+                timeout=self.timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_CATALOG_SCHEMA)
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+
+@contextlib.contextmanager
+def _transaction(connection: sqlite3.Connection) -> t.Iterator[None]:
+    connection.execute("BEGIN")
+    try:
+        yield
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    connection.execute("COMMIT")
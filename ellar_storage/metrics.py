@@ -0,0 +1,208 @@
+import bisect
+import contextlib
+import threading
+import time
+import typing as t
+from abc import ABC, abstractmethod
+
+ByteDirection = t.Literal["in", "out"]
+
+# upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_NO_TRACKING: t.ContextManager[None] = contextlib.nullcontext()
+
+
+class MetricsCollector(ABC):
+    """
+    Receives the metrics of storage operations, eg `save`, `get` or `download`,
+    labelled with the storage name and the operation.
+
+    Calls are made from the event loop and from worker threads.
+    """
+
+    __slots__ = ()
+
+    @abstractmethod
+    def observe(self, storage: str, operation: str, seconds: float) -> None:
+        """Records the duration of an operation"""
+
+    @abstractmethod
+    def add_in_flight(self, storage: str, operation: str, delta: int) -> None:
+        """Updates the number of running operations"""
+
+    @abstractmethod
+    def add_error(self, storage: str, operation: str, error: str) -> None:
+        """Counts an operation failed with the `error` exception type"""
+
+    @abstractmethod
+    def add_bytes(self, storage: str, direction: ByteDirection, count: int) -> None:
+        """Counts bytes saved into (`in`) or downloaded from (`out`) a storage"""
+
+    def render(self) -> t.Optional[str]:
+        """Metrics in the Prometheus text format, if the collector supports it"""
+        return None
+
+
+class OperationTimer:
+    """Context manager recording the duration, in-flight count and errors of an operation"""
+
+    __slots__ = ("collector", "storage", "operation", "_started")
+
+    def __init__(self, collector: MetricsCollector, storage: str, operation: str):
+        self.collector = collector
+        self.storage = storage
+        self.operation = operation
+        self._started = 0.0
+
+    def __enter__(self) -> None:
+        self.collector.add_in_flight(self.storage, self.operation, 1)
+        self._started = time.perf_counter()
+
+    def __exit__(self, exc_type: t.Any, exc: t.Any, tb: t.Any) -> None:
+        self.collector.observe(
+            self.storage, self.operation, time.perf_counter() - self._started
+        )
+        self.collector.add_in_flight(self.storage, self.operation, -1)
+        if exc_type is not None:
+            self.collector.add_error(self.storage, self.operation, exc_type.__name__)
+
+
+def track_operation(
+    collector: t.Optional[MetricsCollector], storage: str, operation: str
+) -> t.ContextManager[None]:
+    """Measures an operation with `collector`, a shared no-op context if metrics are disabled"""
+    if collector is None:
+        return _NO_TRACKING
+    return OperationTimer(collector, storage, operation)
+
+
+class PrometheusCollector(MetricsCollector):
+    """Keeps the metrics in memory and renders them in the Prometheus text format"""
+
+    __slots__ = ("buckets", "_lock", "_latencies", "_in_flight", "_errors", "_bytes")
+
+    def __init__(self, buckets: t.Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # bucket counts, the last one for `+Inf`, sum and count of the observations
+        self._latencies: t.Dict[t.Tuple[str, str], t.List[t.Any]] = {}
+        self._in_flight: t.Dict[t.Tuple[str, str], int] = {}
+        self._errors: t.Dict[t.Tuple[str, str, str], int] = {}
+        self._bytes: t.Dict[t.Tuple[str, str], int] = {}
+
+    def observe(self, storage: str, operation: str, seconds: float) -> None:
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._latencies.get((storage, operation))
+            if histogram is None:
+                histogram = self._latencies[(storage, operation)] = [
+                    [0] * (len(self.buckets) + 1),
+                    0.0,
+                    0,
+                ]
+            histogram[0][index] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def add_in_flight(self, storage: str, operation: str, delta: int) -> None:
+        with self._lock:
+            key = (storage, operation)
+            self._in_flight[key] = self._in_flight.get(key, 0) + delta
+
+    def add_error(self, storage: str, operation: str, error: str) -> None:
+        with self._lock:
+            key = (storage, operation, error)
+            self._errors[key] = self._errors.get(key, 0) + 1
+
+    def add_bytes(self, storage: str, direction: ByteDirection, count: int) -> None:
+        with self._lock:
+            key = (storage, direction)
+            self._bytes[key] = self._bytes.get(key, 0) + count
+
+    def render(self) -> str:
+        with self._lock:
+            latencies = {
+                key: (list(counts), total, count)
+                for key, (counts, total, count) in self._latencies.items()
+            }
+            in_flight = dict(self._in_flight)
+            errors = dict(self._errors)
+            bytes_ = dict(self._bytes)
+
+        lines = [
+            "# HELP ellar_storage_operation_duration_seconds Duration of storage operations.",
+            "# TYPE ellar_storage_operation_duration_seconds histogram",
+        ]
+        bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for (storage, operation), (counts, total, count) in sorted(latencies.items()):
+            labels = _format_labels(storage=storage, operation=operation)
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                lines.append(
+                    "ellar_storage_operation_duration_seconds_bucket"
+                    f'{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(
+                f"ellar_storage_operation_duration_seconds_sum{{{labels}}} {_format_value(total)}"
+            )
+            lines.append(
+                f"ellar_storage_operation_duration_seconds_count{{{labels}}} {count}"
+            )
+
+        lines += [
+            "# HELP ellar_storage_operations_in_flight Storage operations running.",
+            "# TYPE ellar_storage_operations_in_flight gauge",
+        ]
+        for (storage, operation), value in sorted(in_flight.items()):
+            labels = _format_labels(storage=storage, operation=operation)
+            lines.append(f"ellar_storage_operations_in_flight{{{labels}}} {value}")
+
+        lines += [
+            "# HELP ellar_storage_operation_errors_total Failed storage operations by exception type.",
+            "# TYPE ellar_storage_operation_errors_total counter",
+        ]
+        for (storage, operation, error), value in sorted(errors.items()):
+            labels = _format_labels(storage=storage, operation=operation, error=error)
+            lines.append(f"ellar_storage_operation_errors_total{{{labels}}} {value}")
+
+        lines += [
+            "# HELP ellar_storage_bytes_total Bytes saved into and downloaded from storages.",
+            "# TYPE ellar_storage_bytes_total counter",
+        ]
+        for (storage, direction), value in sorted(bytes_.items()):
+            labels = _format_labels(storage=storage, direction=direction)
+            lines.append(f"ellar_storage_bytes_total{{{labels}}} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(**labels: str) -> str:
+    return ",".join(
+        f'{name}="{_escape_label(value)}"' for name, value in labels.items()
+    )
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value))
@@ -27,12 +27,22 @@ class StorageModule(ModuleBase, IModuleSetup):
         cls,
         default: t.Optional[str] = None,
         disable_storage_controller: bool = False,
+        metadata_cache: t.Optional[t.Dict[str, t.Any]] = None,
+        initialization: str = "eager",
+        serving: t.Optional[t.Dict[str, t.Any]] = None,
+        upload: t.Optional[t.Dict[str, t.Any]] = None,
+        metrics: t.Optional[t.Dict[str, t.Any]] = None,
         **kwargs: _StorageSetupKey,
     ) -> DynamicModule:
         schema = StorageSetup(
             storages=kwargs,  # type:ignore[arg-type]
             default=default,
             disable_storage_controller=disable_storage_controller,
+            metadata_cache=metadata_cache,  # type:ignore[arg-type]
+            initialization=initialization,  # type:ignore[arg-type]
+            serving=serving or {},  # type:ignore[arg-type]
+            upload=upload or {},  # type:ignore[arg-type]
+            metrics=metrics,  # type:ignore[arg-type]
         )
         return DynamicModule(
             cls,
@@ -0,0 +1,229 @@
+import base64
+import concurrent.futures
+import contextlib
+import hashlib
+import http
+import threading
+import typing as t
+
+from libcloud.utils.files import read_in_chunks
+
+from ellar_storage.exceptions import LibcloudError
+from ellar_storage.storage import Container, Object, StorageDriver
+
+# smallest part accepted by S3, except for the last part of an upload
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+PartType = t.Tuple[int, str]
+
+
+def supports_parallel_multipart(
+    driver: t.Union[StorageDriver, t.Type[StorageDriver]],
+) -> bool:
+    """Returns whether the driver, or driver class, speaks the S3 multipart upload API"""
+    return bool(getattr(driver, "supports_s3_multipart_upload", False)) and hasattr(
+        driver, "_initiate_multipart"
+    )
+
+
+class ParallelMultipartUploader:
+    """
+    Uploads large objects to S3 compatible storages in parts sent concurrently.
+
+    libcloud multipart uploads send one part at a time over the driver connection.
+    Here parts are read from the content sequentially and uploaded by `max_concurrency` threads,
+    each using its own driver from `driver_factory` since libcloud connections aren't thread safe.
+    Streamed content is buffered up to `threshold` bytes to choose between a single and a multipart
+    upload. The buffered parts are released as they're uploaded, after which at most
+    `max_concurrency + 1` parts are held in memory: the parts being uploaded and the one read next.
+    """
+
+    __slots__ = (
+        "driver_factory",
+        "threshold",
+        "part_size",
+        "max_concurrency",
+        "_local",
+        "_pool",
+        "_pool_lock",
+    )
+
+    def __init__(
+        self,
+        driver_factory: t.Callable[[], StorageDriver],
+        threshold: int,
+        part_size: int = 8 * 1024 * 1024,
+        max_concurrency: int = 4,
+    ) -> None:
+        self.driver_factory = driver_factory
+        self.threshold = threshold
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency
+        self._local = threading.local()
+        self._pool: t.Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def upload(
+        self,
+        container: Container,
+        object_name: str,
+        content: t.Union[t.IO[bytes], t.Iterable[bytes]],
+        extra: t.Optional[t.Dict[str, t.Any]] = None,
+        headers: t.Optional[t.Dict[str, str]] = None,
+    ) -> Object:
+        """
+        Uploads `content` to `container`.
+
+        Content smaller than `threshold` is uploaded with `upload_object_via_stream`.
+        """
+        parts: t.Iterator[bytes] = read_in_chunks(  # type:ignore[no-untyped-call]
+            content, chunk_size=self.part_size, fill_size=True
+        )
+
+        head, complete = _read_head(parts, self.threshold)
+        if complete:
+            return container.upload_object_via_stream(
+                iterator=iter(head),
+                object_name=object_name,
+                extra=extra,
+                headers=headers,
+            )
+
+        return self._upload_parts(
+            container, object_name, _chain(head, parts), extra or {}, headers or {}
+        )
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def _upload_parts(
+        self,
+        container: Container,
+        object_name: str,
+        parts: t.Iterator[bytes],
+        extra: t.Dict[str, t.Any],
+        headers: t.Dict[str, str],
+    ) -> Object:
+        driver: t.Any = container.driver
+        meta_data = extra.get("meta_data")
+        acl = extra.get("acl")
+
+        # same headers as libcloud multipart uploads
+        request_headers = dict(headers)
+        request_headers.update(driver._to_storage_class_headers(None))
+        request_headers["Content-Type"] = driver._determine_content_type(
+            extra.get("content_type"), object_name
+        )
+        for key, value in (meta_data or {}).items():
+            request_headers[f"{driver.http_vendor_prefix}-meta-{key}"] = value
+        if acl:
+            request_headers[f"{driver.http_vendor_prefix}-acl"] = acl
+
+        upload_id = driver._initiate_multipart(
+            container, object_name, headers=request_headers
+        )
+        pool = self._get_pool()
+        pending: t.Set["concurrent.futures.Future[PartType]"] = set()
+        uploaded: t.List[PartType] = []
+        size = 0
+        try:
+            for part_number, data in enumerate(parts, start=1):
+                if len(pending) >= self.max_concurrency:
+                    done, pending = concurrent.futures.wait(
+                        pending, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    uploaded.extend(future.result() for future in done)
+                size += len(data)
+                pending.add(
+                    pool.submit(
+                        self._upload_part,
+                        container,
+                        object_name,
+                        upload_id,
+                        part_number,
+                        data,
+                    )
+                )
+
+            uploaded.extend(future.result() for future in pending)
+            etag = driver._commit_multipart(
+                container, object_name, upload_id, sorted(uploaded)
+            )
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            concurrent.futures.wait(pending)
+            with contextlib.suppress(Exception):
+                driver._abort_multipart(container, object_name, upload_id)
+            raise
+
+        return Object(
+            name=object_name,
+            size=size,
+            hash=etag,
+            extra={"acl": acl},
+            meta_data=meta_data or {},
+            container=container,
+            driver=driver,
+        )
+
+    def _upload_part(
+        self,
+        container: Container,
+        object_name: str,
+        upload_id: str,
+        part_number: int,
+        data: bytes,
+    ) -> PartType:
+        driver = self._get_driver()
+        response = driver.connection.request(
+            driver._get_object_path(container, object_name),
+            method="PUT",
+            data=data,
+            headers={
+                "Content-Length": str(len(data)),
+                "Content-MD5": base64.b64encode(hashlib.md5(data).digest()).decode(),
+            },
+            params={"uploadId": upload_id, "partNumber": part_number},
+        )
+        if response.status != http.HTTPStatus.OK:
+            raise LibcloudError(
+                f"Error uploading part {part_number} of {object_name}", driver=driver
+            )
+        return part_number, response.headers["etag"].replace('"', "")
+
+    def _get_driver(self) -> t.Any:
+        driver = getattr(self._local, "driver", None)
+        if driver is None:
+            driver = self._local.driver = self.driver_factory()
+        return driver
+
+    def _get_pool(self) -> concurrent.futures.ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_concurrency,
+                    thread_name_prefix="ellar-storage-multipart",
+                )
+            return self._pool
+
+
+def _read_head(parts: t.Iterator[bytes], size: int) -> t.Tuple[t.List[bytes], bool]:
+    """Reads parts up to `size` bytes, returns them and whether the content ended before"""
+    head: t.List[bytes] = []
+    head_size = 0
+    for part in parts:
+        head.append(part)
+        head_size += len(part)
+        if head_size >= size:
+            return head, False
+    return head, True
+
+
+def _chain(head: t.List[bytes], tail: t.Iterator[bytes]) -> t.Iterator[bytes]:
+    # parts are removed from `head` as they're consumed, so they're freed once uploaded
+    while head:
+        yield head.pop(0)
+    yield from tail
@@ -0,0 +1,198 @@
+import io
+import mmap
+import os
+import tempfile
+import typing as t
+
+# size of the blocks fetched by `StoredFile.read`, ranged fetches are aligned on it
+READ_BUFFER_SIZE = 1024 * 1024
+# maximum number of blocks fetched ahead of sequential reads
+READAHEAD_BLOCKS = 4
+# content spooled by `StoredFile.as_memoryview` up to this size is kept in memory,
+# larger content is spooled to a temporary file
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+FetchRangeType = t.Callable[[int, int], bytes]
+
+
+class BlockReader:
+    """
+    Reads a file of `size` bytes through `fetch(start, end)` calls aligned on `block_size` blocks.
+
+    Random reads only fetch the blocks they touch. Sequential reads fetch up to
+    `readahead` more blocks at once, doubling the number of blocks fetched ahead on each fetch.
+    """
+
+    __slots__ = (
+        "size",
+        "block_size",
+        "readahead",
+        "_fetch",
+        "_buffer",
+        "_buffer_start",
+        "_ahead",
+    )
+
+    def __init__(
+        self,
+        size: int,
+        fetch: FetchRangeType,
+        block_size: int = READ_BUFFER_SIZE,
+        readahead: int = READAHEAD_BLOCKS,
+    ) -> None:
+        self.size = size
+        self.block_size = block_size
+        self.readahead = readahead
+        self._fetch = fetch
+        self._buffer = b""
+        self._buffer_start = 0
+        self._ahead = 0
+
+    def read(self, position: int, n: int = -1) -> bytes:
+        """Reads up to `n` bytes from `position`, up to the end of the file if `n` is negative"""
+        end = self.size if n < 0 else min(position + n, self.size)
+        chunks = []
+        while position < end:
+            offset = position - self._buffer_start
+            if not 0 <= offset < len(self._buffer):
+                if not self._fill(position, end):
+                    # the file was truncated in the meantime
+                    break
+                offset = position - self._buffer_start
+            chunk = self._buffer[offset : offset + end - position]
+            chunks.append(chunk)
+            position += len(chunk)
+        return b"".join(chunks)
+
+    def _fill(self, position: int, end: int) -> bool:
+        if self._buffer and position == self._buffer_start + len(self._buffer):
+            self._ahead = min(max(self._ahead * 2, 1), self.readahead)
+        else:
+            self._ahead = 0
+
+        start = position - position % self.block_size
+        blocks = -(-end // self.block_size) + self._ahead
+        data = self._fetch(start, min(blocks * self.block_size, self.size))
+        self._buffer = data
+        self._buffer_start = start
+        return position < start + len(data)
+
+
+class StreamReader:
+    """
+    Reads a file from the stream returned by `open_stream`, for content without random access
+    such as compressed files.
+
+    Forward seeks skip the content of the stream, backward seeks open a new stream.
+    """
+
+    __slots__ = ("_open_stream", "_stream", "_position", "_pending", "_size")
+
+    def __init__(self, open_stream: t.Callable[[], t.Iterator[bytes]]) -> None:
+        self._open_stream = open_stream
+        self._stream: t.Optional[t.Iterator[bytes]] = None
+        # offset of `_pending` in the file
+        self._position = 0
+        self._pending = b""
+        self._size: t.Optional[int] = None
+
+    @property
+    def size(self) -> int:
+        """Size of the content, the stream is read to its end when it's unknown"""
+        if self._size is None:
+            if self._stream is None:
+                stream, size = iter(self._open_stream()), 0
+            else:
+                stream, size = self._stream, self._position + len(self._pending)
+            for chunk in stream:
+                size += len(chunk)
+            self._size = size
+            # the next read opens a new stream
+            self._stream = None
+        return self._size
+
+    def read(self, position: int, n: int = -1) -> bytes:
+        """Reads up to `n` bytes from `position`, up to the end of the file if `n` is negative"""
+        if self._stream is None or position < self._position:
+            self._stream = iter(self._open_stream())
+            self._position = 0
+            self._pending = b""
+
+        chunks = []
+        while n != 0:
+            if not self._pending:
+                chunk = next(self._stream, None)
+                if chunk is None:
+                    self._size = self._position
+                    break
+                self._pending = chunk
+
+            if position > self._position:
+                # skipped up to the position
+                skipped = min(position - self._position, len(self._pending))
+                self._pending = self._pending[skipped:]
+                self._position += skipped
+                continue
+
+            size = len(self._pending) if n < 0 else min(n, len(self._pending))
+            chunks.append(self._pending[:size])
+            self._pending = self._pending[size:]
+            self._position += size
+            position += size
+            if n > 0:
+                n -= size
+        return b"".join(chunks)
+
+
+def pread(fd: int, length: int, offset: int) -> bytes:
+    """Reads up to `length` bytes at `offset` of the `fd` file descriptor"""
+    chunks = []
+    while length > 0:
+        if hasattr(os, "pread"):
+            chunk = os.pread(fd, length, offset)
+        else:  # pragma: no cover
+            # Windows, file descriptors of a StoredFile aren't shared between threads
+            os.lseek(fd, offset, os.SEEK_SET)
+            chunk = os.read(fd, length)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        length -= len(chunk)
+        offset += len(chunk)
+    return b"".join(chunks)
+
+
+def map_file(path: str) -> memoryview:
+    """Maps the file at `path` in memory and returns a read-only view of it"""
+    with open(path, "rb") as file:
+        return _map_fd(file.fileno())
+
+
+def spool_to_memoryview(
+    stream: t.Iterable[bytes], max_size: int = SPOOL_MAX_SIZE
+) -> memoryview:
+    """
+    Collects `stream` in memory and returns a read-only view of it,
+    past `max_size` bytes the content is spooled to a temporary file mapped in memory.
+    """
+    chunks = iter(stream)
+    buffer = io.BytesIO()
+    for chunk in chunks:
+        buffer.write(chunk)
+        if buffer.tell() > max_size:
+            with tempfile.TemporaryFile() as file:
+                file.write(buffer.getbuffer())
+                buffer.close()
+                for chunk in chunks:
+                    file.write(chunk)
+                file.flush()
+                return _map_fd(file.fileno())
+    return buffer.getbuffer().toreadonly()
+
+
+def _map_fd(fd: int) -> memoryview:
+    if os.fstat(fd).st_size == 0:
+        # empty files can't be mapped
+        return memoryview(b"")
+    # the mapping outlives the file descriptor, and is released with the view
+    return memoryview(mmap.mmap(fd, 0, access=mmap.ACCESS_READ))
@@ -0,0 +1,320 @@
+import os
+import re
+import typing as t
+import uuid
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from urllib.parse import quote
+
+from starlette.responses import Response, StreamingResponse
+
+from ellar_storage.schemas import _ServingSetup
+from ellar_storage.stored_file import StoredFile
+
+# Upper bound of ranges served in one multipart/byteranges response
+MAX_RANGES = 16
+
+_RANGE_SPEC = re.compile(r"^\s*(\d*)\s*-\s*(\d*)\s*$")
+
+
+class ByteRange(t.NamedTuple):
+    start: int
+    # inclusive, same as HTTP `Content-Range`
+    end: int
+
+    @property
+    def length(self) -> int:
+        return self.end - self.start + 1
+
+    def content_range(self, size: int) -> str:
+        return f"bytes {self.start}-{self.end}/{size}"
+
+
+class RangeNotSatisfiable(ValueError):
+    """Raised when none of the requested ranges overlaps the file"""
+
+
+def parse_range_header(header: str, size: int) -> t.Optional[t.List[ByteRange]]:
+    """
+    Parses an HTTP `Range` header against a file of `size` bytes.
+
+    Returns `None` when the header is malformed or uses another unit, in which case it should be ignored.
+    Overlapping and adjacent ranges are merged.
+    Raises `RangeNotSatisfiable` when no range overlaps the file.
+    """
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs:
+        return None
+
+    ranges: t.List[ByteRange] = []
+    for spec in specs.split(","):
+        match = _RANGE_SPEC.match(spec)
+        if match is None:
+            return None
+
+        first, last = match.groups()
+        if not first and not last:
+            return None
+
+        if not first:
+            # suffix range, the last `last` bytes
+            suffix = int(last)
+            if suffix == 0 or size == 0:
+                continue
+            ranges.append(ByteRange(max(size - suffix, 0), size - 1))
+            continue
+
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start >= size:
+            continue
+        end = min(int(last), size - 1) if last else size - 1
+        ranges.append(ByteRange(start, end))
+
+    if not ranges:
+        raise RangeNotSatisfiable(header)
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for byte_range in ranges[1:]:
+        previous = merged[-1]
+        if byte_range.start <= previous.end + 1:
+            merged[-1] = ByteRange(previous.start, max(previous.end, byte_range.end))
+        else:
+            merged.append(byte_range)
+
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
+
+
+def get_range_response(
+    stored_file: StoredFile,
+    range_header: str,
+    headers: t.Optional[t.Dict[str, str]] = None,
+) -> t.Optional[Response]:
+    """
+    Builds a `206 Partial Content` response for `range_header` served from `StoredFile.range_as_stream`,
+    or a `416 Range Not Satisfiable` response.
+
+    Returns `None` when the full file should be served instead.
+    """
+    size = stored_file.size
+    try:
+        ranges = parse_range_header(range_header, size)
+    except RangeNotSatisfiable:
+        return Response(
+            status_code=416,
+            headers={"Content-Range": f"bytes */{size}", "Accept-Ranges": "bytes"},
+        )
+
+    if ranges is None:
+        return None
+
+    response_headers = dict(headers or {})
+    response_headers["Accept-Ranges"] = "bytes"
+
+    if len(ranges) == 1:
+        (byte_range,) = ranges
+        response_headers["Content-Range"] = byte_range.content_range(size)
+        response_headers["Content-Length"] = str(byte_range.length)
+        return StreamingResponse(
+            stored_file.range_as_stream(byte_range.start, byte_range.end + 1),
+            status_code=206,
+            media_type=stored_file.content_type,
+            headers=response_headers,
+        )
+
+    boundary = uuid.uuid4().hex
+    part_headers = [
+        (
+            f"--{boundary}\r\n"
+            f"Content-Type: {stored_file.content_type}\r\n"
+            f"Content-Range: {byte_range.content_range(size)}\r\n\r\n"
+        ).encode("latin-1")
+        for byte_range in ranges
+    ]
+    closing = f"\r\n--{boundary}--\r\n".encode("latin-1")
+
+    response_headers["Content-Length"] = str(
+        sum(len(part) for part in part_headers)
+        + sum(byte_range.length for byte_range in ranges)
+        + 2 * (len(ranges) - 1)
+        + len(closing)
+    )
+
+    def _multipart_stream() -> t.Iterator[bytes]:
+        for index, (part, byte_range) in enumerate(zip(part_headers, ranges)):
+            if index:
+                yield b"\r\n"
+            yield part
+            yield from stored_file.range_as_stream(byte_range.start, byte_range.end + 1)
+        yield closing
+
+    return StreamingResponse(
+        _multipart_stream(),
+        status_code=206,
+        media_type=f"multipart/byteranges; boundary={boundary}",
+        headers=response_headers,
+    )
+
+
+def get_validator_headers(
+    stored_file: StoredFile, cache_control: t.Optional[str] = None
+) -> t.Dict[str, str]:
+    """Returns `ETag`, `Last-Modified` and `Cache-Control` headers of `stored_file`"""
+    headers = {}
+    etag = stored_file.etag
+    if etag is not None:
+        headers["ETag"] = etag
+    last_modified = stored_file.last_modified
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    return headers
+
+
+def accepts_encoding(accept_encoding: t.Optional[str], content_encoding: str) -> bool:
+    """Evaluates an `Accept-Encoding` request header, with its quality values, for `content_encoding`"""
+    if not accept_encoding:
+        return False
+
+    qualities: t.Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, *params = item.split(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        # `x-gzip` is an alias of `gzip`
+        qualities["gzip" if coding == "x-gzip" else coding] = quality
+
+    return qualities.get(content_encoding, qualities.get("*", 0.0)) > 0
+
+
+def is_not_modified(
+    request_headers: t.Mapping[str, str], stored_file: StoredFile
+) -> bool:
+    """
+    Evaluates `If-None-Match` and `If-Modified-Since` request headers.
+
+    `If-Modified-Since` is ignored when `If-None-Match` is sent, as required by RFC 9110.
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        etag = stored_file.etag
+        if etag is None:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        # weak comparison
+        return "*" in tags or _strip_weak(etag) in {_strip_weak(tag) for tag in tags}
+
+    if_modified_since = _parse_http_date(request_headers.get("if-modified-since"))
+    last_modified = stored_file.last_modified
+    if if_modified_since is None or last_modified is None:
+        return False
+    # HTTP dates have a one second resolution
+    return last_modified.replace(microsecond=0) <= if_modified_since
+
+
+def is_range_fresh(if_range: t.Optional[str], stored_file: StoredFile) -> bool:
+    """
+    Evaluates an `If-Range` request header.
+
+    `Range` must be ignored, and the full content sent, when this returns `False`.
+    """
+    if not if_range:
+        return True
+
+    if_range = if_range.strip()
+    if if_range.startswith(('"', "W/")):
+        # strong comparison, weak tags never match
+        return if_range == stored_file.etag
+
+    if_range_date = _parse_http_date(if_range)
+    last_modified = stored_file.last_modified
+    if if_range_date is None or last_modified is None:
+        return False
+    return last_modified.replace(microsecond=0) == if_range_date
+
+
+def get_content_disposition(filename: str, disposition_type: str = "attachment") -> str:
+    """
+    `Content-Disposition` header value for `filename`, same as Starlette's `FileResponse`.
+
+    Names that aren't plain ASCII are sent percent-encoded with `filename*`,
+    since header values are encoded as latin-1.
+    """
+    quoted_filename = quote(filename)
+    if quoted_filename != filename:
+        return f"{disposition_type}; filename*=utf-8''{quoted_filename}"
+    return f'{disposition_type}; filename="{filename}"'
+
+
+def get_offload_response(
+    local_path: str,
+    serving: _ServingSetup,
+    media_type: str,
+    headers: t.Optional[t.Dict[str, str]] = None,
+) -> t.Optional[Response]:
+    """
+    Builds an empty response asking the reverse proxy to send the file at `local_path`,
+    with `X-Accel-Redirect` (nginx) or `X-Sendfile` (apache, lighttpd) header.
+
+    Returns `None` when the file should be sent by the application,
+    that's for `sendfile` strategy, when no location maps `local_path`,
+    or for `x-sendfile` when the path can't be sent as is in a header.
+    """
+    response_headers = dict(headers or {})
+
+    if serving.strategy == "x-sendfile":
+        path = os.path.abspath(local_path)
+        if not (path.isascii() and path.isprintable()):
+            # header values are latin-1, they wouldn't match the file system path bytes
+            return None
+        response_headers["X-Sendfile"] = path
+        return Response(media_type=media_type, headers=response_headers)
+
+    if serving.strategy == "x-accel-redirect":
+        internal_path = _get_internal_path(local_path, serving.locations)
+        if internal_path is None:
+            return None
+        response_headers["X-Accel-Redirect"] = internal_path
+        return Response(media_type=media_type, headers=response_headers)
+
+    return None
+
+
+def _strip_weak(etag: str) -> str:
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def _parse_http_date(value: t.Optional[str]) -> t.Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    # dates without timezone are invalid HTTP dates
+    return parsed if parsed.tzinfo else None
+
+
+def _get_internal_path(local_path: str, locations: t.Dict[str, str]) -> t.Optional[str]:
+    local_path = os.path.abspath(local_path)
+    # the most specific directory wins
+    for directory in sorted(locations, key=len, reverse=True):
+        root = os.path.abspath(directory)
+        if os.path.commonpath([root, local_path]) == root:
+            relative_path = os.path.relpath(local_path, root).replace(os.sep, "/")
+            return f"{locations[directory].rstrip('/')}/{quote(relative_path)}"
+    return None
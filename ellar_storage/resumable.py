@@ -0,0 +1,188 @@
+import contextlib
+import os
+import re
+import shutil
+import time
+import typing as t
+import uuid
+
+import fasteners
+from pydantic import BaseModel
+
+from ellar_storage.exceptions import (
+    UploadIncompleteError,
+    UploadOffsetMismatchError,
+    UploadSessionNotFoundError,
+    UploadTooLargeError,
+)
+
+T = t.TypeVar("T")
+
+_SESSION_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadSession(BaseModel):
+    id: str
+    # storage the upload is saved into once completed
+    storage: str
+    filename: t.Optional[str] = None
+    content_type: t.Optional[str] = None
+    # total size announced by the client, if known upfront
+    length: t.Optional[int] = None
+    # size limit of uploads of unknown length
+    max_size: t.Optional[int] = None
+    created_at: float
+    # bytes received so far, derived from the session data file
+    offset: int = 0
+
+    @property
+    def is_complete(self) -> bool:
+        return self.length is None or self.offset == self.length
+
+
+class ResumableUploadStore:
+    """
+    Resumable upload sessions persisted in `directory`.
+
+    Each session is a folder holding its state and the content received so far,
+    so any worker sharing `directory` can continue or complete an upload.
+    Operations on a session are serialized with an inter-process file lock,
+    and sessions older than `ttl` seconds are removed when new ones are created.
+    """
+
+    __slots__ = ("directory", "ttl")
+
+    def __init__(self, directory: str, ttl: float = 24 * 3600) -> None:
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def create(
+        self,
+        storage: str,
+        filename: t.Optional[str] = None,
+        content_type: t.Optional[str] = None,
+        length: t.Optional[int] = None,
+        max_size: t.Optional[int] = None,
+    ) -> UploadSession:
+        self.remove_expired()
+
+        session = UploadSession(
+            id=uuid.uuid4().hex,
+            storage=storage,
+            filename=filename,
+            content_type=content_type,
+            length=length,
+            max_size=max_size,
+            created_at=time.time(),
+        )
+        session_path = self._get_session_path(session.id)
+        os.makedirs(session_path)
+        open(os.path.join(session_path, "data"), "wb").close()
+        # written last, a session without state is ignored and eventually removed
+        with open(os.path.join(session_path, "session.json"), "w") as state_file:
+            state_file.write(session.model_dump_json(exclude={"offset"}))
+        return session
+
+    def get(self, session_id: str) -> UploadSession:
+        session_path = self._get_session_path(session_id)
+        try:
+            with open(os.path.join(session_path, "session.json")) as state_file:
+                session = UploadSession.model_validate_json(state_file.read())
+            session.offset = os.path.getsize(os.path.join(session_path, "data"))
+        except FileNotFoundError as ex:
+            raise UploadSessionNotFoundError(session_id) from ex
+
+        if session.created_at < time.time() - self.ttl:
+            raise UploadSessionNotFoundError(session_id)
+        return session
+
+    def append(
+        self, session_id: str, offset: int, content: t.Iterable[bytes]
+    ) -> UploadSession:
+        """
+        Appends `content` to the session, which must currently be at `offset`.
+
+        Chunks received before a failure are kept, the client resumes from the new session offset.
+        """
+        with self._lock(session_id):
+            session = self.get(session_id)
+            if offset != session.offset:
+                raise UploadOffsetMismatchError(session.offset)
+
+            limit = session.length if session.length is not None else session.max_size
+            data_path = os.path.join(self._get_session_path(session_id), "data")
+            with open(data_path, "ab") as data_file:
+                for chunk in content:
+                    if limit is not None and session.offset + len(chunk) > limit:
+                        raise UploadTooLargeError(f"Upload exceeds {limit} bytes")
+                    data_file.write(chunk)
+                    session.offset += len(chunk)
+            return session
+
+    def complete(self, session_id: str, save: t.Callable[[UploadSession, str], T]) -> T:
+        """
+        Calls `save` with the session and the path of its content, then removes the session.
+
+        Raises `UploadIncompleteError` while the announced length hasn't been received.
+        """
+        with self._lock(session_id):
+            session = self.get(session_id)
+            if not session.is_complete:
+                raise UploadIncompleteError(
+                    f"Received {session.offset} of {session.length} bytes"
+                )
+            result = save(
+                session, os.path.join(self._get_session_path(session_id), "data")
+            )
+            self._remove(session_id)
+            return result
+
+    def delete(self, session_id: str) -> None:
+        with self._lock(session_id):
+            self.get(session_id)
+            self._remove(session_id)
+
+    def remove_expired(self) -> None:
+        expired_before = time.time() - self.ttl
+        for entry in os.scandir(self.directory):
+            session_id = entry.name.split(".", 1)[0]
+            if not _SESSION_ID.match(session_id):
+                continue
+            try:
+                if entry.stat().st_mtime >= expired_before:
+                    continue
+            except FileNotFoundError:  # pragma: no cover
+                # removed by another worker
+                continue
+            if entry.is_dir():
+                lock = fasteners.InterProcessLock(self._get_lock_path(session_id))
+                # sessions in use are left for a later sweep
+                if lock.acquire(blocking=False):
+                    try:
+                        self._remove(session_id)
+                    finally:
+                        lock.release()
+            elif not os.path.exists(self._get_session_path(session_id)):
+                # lock left by a request to a removed session
+                with contextlib.suppress(OSError):
+                    os.unlink(entry.path)
+
+    def _remove(self, session_id: str) -> None:
+        shutil.rmtree(self._get_session_path(session_id), ignore_errors=True)
+        with contextlib.suppress(OSError):
+            os.unlink(self._get_lock_path(session_id))
+
+    @contextlib.contextmanager
+    def _lock(self, session_id: str) -> t.Iterator[None]:
+        lock = fasteners.InterProcessLock(self._get_lock_path(session_id))
+        with lock:
+            yield
+
+    def _get_session_path(self, session_id: str) -> str:
+        if not _SESSION_ID.match(session_id):
+            raise UploadSessionNotFoundError(session_id)
+        return os.path.join(self.directory, session_id)
+
+    def _get_lock_path(self, session_id: str) -> str:
+        return f"{self._get_session_path(session_id)}.lock"
@@ -1,14 +1,133 @@
 import typing as t
 
 from ellar.pydantic import field_validator, model_validator
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
-from ellar_storage.storage import StorageDriver
+from ellar_storage.backends import PREFETCH_CHUNKS
+from ellar_storage.checksums import ChecksumAlgorithm, is_crc32c_available
+from ellar_storage.compression import (
+    COMPRESSIBLE_CONTENT_TYPES,
+    ContentEncoding,
+    is_zstd_available,
+)
+from ellar_storage.metadata_store import MetadataStore
+from ellar_storage.metrics import LATENCY_BUCKETS, MetricsCollector
+from ellar_storage.multipart import MIN_PART_SIZE, supports_parallel_multipart
+from ellar_storage.reader import READ_BUFFER_SIZE, READAHEAD_BLOCKS
+from ellar_storage.storage import Container, StorageDriver
+
+
+class _StorageExecutorSetup(BaseModel):
+    # number of threads running the storage I/O
+    max_workers: int = Field(default=4, gt=0)
+    # number of calls allowed to wait for a free thread
+    queue_size: int = Field(default=0, ge=0)
+    # what to do when all threads and queue slots are taken,
+    # `wait` for a free slot or `reject` with `StorageExecutorFullError`
+    overflow: t.Literal["wait", "reject"] = "wait"
+
+
+class _StorageConnectionSetup(BaseModel):
+    # maximum number of HTTP connections kept open by the driver
+    pool_size: int = Field(default=10, gt=0)
+    # reuse HTTP connections between requests
+    keep_alive: bool = True
+
+
+class _DiskCacheSetup(BaseModel):
+    # directory holding the cached files
+    directory: str
+    # maximum size of the cached files, least recently used files are evicted first
+    max_bytes: int = Field(gt=0)
+
+
+class _MultipartUploadSetup(BaseModel):
+    # objects of at least this size in bytes are uploaded in parts sent concurrently,
+    # streamed content is buffered up to this size to find out
+    threshold: int = Field(default=64 * 1024 * 1024, gt=0)
+    # size of each part in bytes, S3 requires at least 5 MiB
+    part_size: int = Field(default=8 * 1024 * 1024, ge=MIN_PART_SIZE)
+    # number of parts uploaded at the same time
+    max_concurrency: int = Field(default=4, gt=0)
+
+
+class _ContentAddressedSetup(BaseModel):
+    # hash function naming the objects after their content
+    algorithm: t.Literal["sha256", "sha1", "md5", "blake2b"] = "sha256"
+
+
+class _ChecksumSetup(BaseModel):
+    # digests computed while the content is uploaded, `crc32c` requires the `crc32c` package
+    algorithms: t.List[ChecksumAlgorithm] = Field(default=["sha256"], min_length=1)
+    # check the content against its digest when a file is read in full,
+    # raising `ObjectHashMismatchError` at the end of the stream
+    verify: bool = False
+
+    @field_validator("algorithms")
+    def post_algorithms_validate(
+        cls, value: t.List[ChecksumAlgorithm]
+    ) -> t.List[ChecksumAlgorithm]:
+        if "crc32c" in value and not is_crc32c_available():
+            raise ValueError("`crc32c` checksums require the `crc32c` package")
+        return list(dict.fromkeys(value))
+
+
+class _CompressionSetup(BaseModel):
+    # codec compressing the content on save, `zstd` requires the `zstandard` package
+    codec: ContentEncoding = "gzip"
+    # compression level of the codec, the codec default if not set
+    level: t.Optional[int] = None
+    # content types compressed on save, `*` wildcards allowed,
+    # files of other content types are stored as is
+    content_types: t.List[str] = Field(
+        default=list(COMPRESSIBLE_CONTENT_TYPES), min_length=1
+    )
+
+    @field_validator("codec")
+    def post_codec_validate(cls, value: ContentEncoding) -> ContentEncoding:
+        if value == "zstd" and not is_zstd_available():
+            raise ValueError("`zstd` compression requires the `zstandard` package")
+        return value
+
+
+class _ReadBufferSetup(BaseModel):
+    # size in bytes of the blocks fetched by `StoredFile.read`, ranged fetches are aligned on it
+    buffer_size: int = Field(default=READ_BUFFER_SIZE, gt=0)
+    # maximum number of blocks fetched ahead while a file is read sequentially,
+    # readahead is disabled with 0
+    readahead: int = Field(default=READAHEAD_BLOCKS, ge=0)
 
 
 class _StorageSetupItem(BaseModel):
     driver: t.Type[StorageDriver]
     options: t.Dict[str, t.Any] = {}
+    # dedicated thread pool for the storage async operations,
+    # uses Starlette's shared thread pool if not set
+    executor: t.Optional[_StorageExecutorSetup] = None
+    # HTTP connection pool of the storage driver,
+    # storages with the same driver, options and connection share one driver instance
+    connection: t.Optional[_StorageConnectionSetup] = None
+    # read-through cache of the storage files on local disk
+    disk_cache: t.Optional[_DiskCacheSetup] = None
+    # parallel multipart uploads of large objects, S3 compatible drivers only
+    multipart: t.Optional[_MultipartUploadSetup] = None
+    # store objects under the digest of their content,
+    # identical content is stored once and deleted with its last reference
+    content_addressed: t.Optional[_ContentAddressedSetup] = None
+    # digests of the content computed on save, and optionally verified on read
+    checksums: t.Optional[_ChecksumSetup] = None
+    # compress the content of text files on save, decompressed when read,
+    # the encoding of each file is kept in its metadata
+    compression: t.Optional[_CompressionSetup] = None
+    # buffering of the seekable `StoredFile` reads
+    read_buffer: _ReadBufferSetup = _ReadBufferSetup()
+    # where local storages keep the object metadata, ignored by other drivers,
+    # `catalog` in a SQLite database in the `key` directory, `sidecar` in a
+    # `<name>.metadata.json` file next to each object,
+    # or a callable returning a `MetadataStore` for the storage container
+    metadata_store: t.Union[
+        t.Literal["catalog", "sidecar"], t.Callable[[Container], MetadataStore]
+    ] = "sidecar"
 
     @field_validator("options", mode="before")
     def pre_options_validate(cls, value: t.Dict) -> t.Any:
@@ -17,6 +136,66 @@ class _StorageSetupItem(BaseModel):
 
         return value
 
+    @model_validator(mode="after")
+    def post_multipart_validate(self) -> "_StorageSetupItem":
+        if self.multipart is not None and not supports_parallel_multipart(self.driver):
+            raise ValueError(
+                f"{self.driver.name} driver doesn't support multipart uploads"
+            )
+        return self
+
+
+class _MetadataCacheSetup(BaseModel):
+    # maximum number of cached metadata entries
+    max_size: int = Field(default=1024, gt=0)
+    # seconds before an entry expires, entries never expire if not set
+    ttl: t.Optional[float] = Field(default=None, gt=0)
+
+
+class _ServingSetup(BaseModel):
+    # how StorageController serves files available on local disk,
+    # `sendfile` returns a file response, sent with the ASGI `http.response.pathsend`
+    # extension when the server supports it,
+    # `x-accel-redirect` and `x-sendfile` return an empty response with a header
+    # telling the reverse proxy (nginx, apache, lighttpd) to send the file
+    strategy: t.Literal["sendfile", "x-accel-redirect", "x-sendfile"] = "sendfile"
+    # maps local directories to the proxy internal locations serving them,
+    # eg {"/var/www/media": "/protected-media"}, used by `x-accel-redirect`
+    locations: t.Dict[str, str] = {}
+    # `Cache-Control` header of downloads, eg "public, max-age=3600", not sent if None
+    cache_control: t.Optional[str] = None
+    # chunks of a streamed download read per worker thread call, the next ones are read
+    # while the previous ones are sent, 0 hands each chunk over to a worker thread instead
+    prefetch_chunks: int = Field(default=PREFETCH_CHUNKS, ge=0)
+
+    @model_validator(mode="after")
+    def post_locations_validate(self) -> "_ServingSetup":
+        if self.strategy == "x-accel-redirect" and not self.locations:
+            raise ValueError("`x-accel-redirect` serving strategy requires `locations`")
+        return self
+
+
+class _UploadSetup(BaseModel):
+    # expose the streaming `POST /upload/{storage}` route of StorageController
+    enabled: bool = False
+    # maximum upload size in bytes, unlimited if None
+    max_size: t.Optional[int] = Field(default=None, gt=0)
+    # directory persisting resumable upload sessions, shared by every worker,
+    # the resumable upload routes are only exposed when set
+    sessions_directory: t.Optional[str] = None
+    # seconds after which an unfinished resumable upload session is removed
+    session_ttl: float = Field(default=24 * 3600, gt=0)
+
+
+class _MetricsSetup(BaseModel):
+    # returns the collector receiving the storage metrics, `PrometheusCollector` if not set
+    collector: t.Optional[t.Callable[[], MetricsCollector]] = None
+    # upper bounds in seconds of the latency histogram buckets of `PrometheusCollector`
+    buckets: t.List[float] = Field(default=list(LATENCY_BUCKETS), min_length=1)
+    # expose the metrics in the Prometheus text format on the `GET /metrics` route
+    # of StorageController
+    endpoint: bool = False
+
 
 class StorageSetup(BaseModel):
     # default storage name that must exist in `storages`
@@ -26,6 +205,19 @@ class StorageSetup(BaseModel):
     storages: t.Dict[str, _StorageSetupItem]
     # disable StorageController
     disable_storage_controller: bool = False
+    # how StorageController serves local files
+    serving: _ServingSetup = _ServingSetup()
+    # streaming upload route of StorageController
+    upload: _UploadSetup = _UploadSetup()
+    # how storage containers are initialized,
+    # `eager` one after the other at startup, `parallel` concurrently at startup
+    # or `lazy` on first use
+    initialization: t.Literal["eager", "parallel", "lazy"] = "eager"
+    # in-process metadata cache for local storages, disabled if not set
+    metadata_cache: t.Optional[_MetadataCacheSetup] = None
+    # latency, bytes, errors and in-flight metrics of the storage operations,
+    # disabled if not set
+    metrics: t.Optional[_MetricsSetup] = None
 
     @model_validator(mode="before")
     def post_default_validate(cls, values: t.Dict) -> t.Any:
@@ -1,21 +1,72 @@
+import asyncio
+import collections
 import contextlib
+import functools
+import json
+import logging
 import os
+import threading
+import time
 import typing as t
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 from ellar.common import UploadFile
 from ellar.di import injectable
 from starlette.concurrency import run_in_threadpool
 
-from ellar_storage.constants import LOCAL_STORAGE_DRIVER_NAME
+from ellar_storage.backends import (
+    AsyncStorageBackend,
+    RunSyncType,
+    UploadContent,
+    get_async_backend,
+    iter_content_from_thread,
+    open_binary_file,
+)
+from ellar_storage.batch import BatchResult, run_batch, run_batch_async
+from ellar_storage.cache import MetadataCache
+from ellar_storage.checksums import ChecksumHasher
+from ellar_storage.compression import compress_stream, is_compressible
+from ellar_storage.constants import BATCH_CONCURRENCY, LOCAL_STORAGE_DRIVER_NAME
+from ellar_storage.content_addressed import (
+    ContentRefs,
+    hash_file,
+    is_digest,
+    spool_and_hash,
+)
+from ellar_storage.disk_cache import DiskCache
+from ellar_storage.drivers import (
+    DriverKeyType,
+    configure_connection_pool,
+    get_driver_key,
+)
 from ellar_storage.exceptions import (
     ContainerAlreadyExistsError,
     ObjectDoesNotExistError,
 )
+from ellar_storage.executors import StorageExecutor
+from ellar_storage.listing import LIST_PAGE_SIZE, FileEntry, FilePage, iter_file_pages
+from ellar_storage.metadata_store import (
+    CATALOG_FILE_NAME,
+    MetadataStore,
+    SidecarMetadataStore,
+    SQLiteMetadataStore,
+)
+from ellar_storage.metrics import MetricsCollector, PrometheusCollector, track_operation
+from ellar_storage.multipart import ParallelMultipartUploader
+from ellar_storage.resumable import ResumableUploadStore, UploadSession
 from ellar_storage.schemas import StorageSetup
-from ellar_storage.storage import Container
-from ellar_storage.stored_file import StoredFile
-from ellar_storage.utils import get_metadata_file_obj
+from ellar_storage.storage import Container, Object, StorageDriver
+from ellar_storage.stored_file import CachedStoredFile, StoredFile
+from ellar_storage.uploads import limit_stream
+from ellar_storage.utils import (
+    load_local_metadata,
+    load_remote_checksums,
+)
+
+logger = logging.getLogger("ellar.storage")
+
+SaveItemType = t.Union[UploadFile, t.Dict[str, t.Any]]
 
 
 @injectable
@@ -24,40 +75,241 @@ class StorageService:
     Manages lib-cloud registered storage drivers for saving, deleting and retrieving files
     """
 
-    __slots__ = ("_storages", "_storage_default")
+    __slots__ = (
+        "_storage_setup",
+        "_storages",
+        "_storage_default",
+        "_storage_locks",
+        "_drivers",
+        "_drivers_lock",
+        "_startup_timings",
+        "_async_backends",
+        "_executors",
+        "_metadata_cache",
+        "_disk_caches",
+        "_upload_sessions",
+        "_multipart_uploaders",
+        "_content_refs",
+        "_metadata_stores",
+        "_metrics",
+    )
 
     def __init__(self, storage_setup: StorageSetup) -> None:
-        result = {}
+        self._storage_setup = storage_setup
+        self._storages: t.Dict[str, Container] = {}
+        self._storage_default = t.cast(str, storage_setup.default)
+        self._storage_locks = {
+            name: threading.Lock() for name in storage_setup.storages
+        }
+        self._startup_timings: t.Dict[str, float] = {}
+        self._drivers: t.Dict[DriverKeyType, StorageDriver] = {}
+        self._drivers_lock = threading.Lock()
+        self._async_backends: t.Dict[str, AsyncStorageBackend] = {}
+        self._executors: t.Dict[str, StorageExecutor] = {}
+        self._disk_caches: t.Dict[str, DiskCache] = {}
+        self._multipart_uploaders: t.Dict[str, ParallelMultipartUploader] = {}
+        self._content_refs: t.Dict[str, ContentRefs] = {}
+        self._metadata_stores: t.Dict[str, MetadataStore] = {}
 
+        disk_caches: t.Dict[str, DiskCache] = {}
+        catalogs: t.Dict[str, SQLiteMetadataStore] = {}
         for storage_name, value in storage_setup.storages.items():
             if value.driver.name == LOCAL_STORAGE_DRIVER_NAME:
-                # if its local storage, we need to create the path
-                os.makedirs(value.options["key"], 0o777, exist_ok=True)
+                if value.metadata_store == "catalog":
+                    # storages with the same `key` directory share its catalog
+                    path = os.path.abspath(
+                        os.path.join(value.options["key"], CATALOG_FILE_NAME)
+                    )
+                    if path not in catalogs:
+                        catalogs[path] = SQLiteMetadataStore(path)
+                    self._metadata_stores[storage_name] = catalogs[path]
+                elif value.metadata_store == "sidecar":
+                    self._metadata_stores[storage_name] = SidecarMetadataStore()
+
+            if value.disk_cache is not None:
+                # storages caching into the same directory share its byte budget
+                directory = os.path.abspath(value.disk_cache.directory)
+                if directory not in disk_caches:
+                    disk_caches[directory] = DiskCache(
+                        directory, max_bytes=value.disk_cache.max_bytes
+                    )
+                self._disk_caches[storage_name] = disk_caches[directory]
+
+            if value.executor is not None:
+                self._executors[storage_name] = StorageExecutor(
+                    storage_name,
+                    max_workers=value.executor.max_workers,
+                    queue_size=value.executor.queue_size,
+                    overflow=value.executor.overflow,
+                )
+
+        self._metadata_cache = (
+            MetadataCache(
+                max_size=storage_setup.metadata_cache.max_size,
+                ttl=storage_setup.metadata_cache.ttl,
+            )
+            if storage_setup.metadata_cache is not None
+            else None
+        )
+        self._metrics: t.Optional[MetricsCollector] = None
+        if storage_setup.metrics is not None:
+            self._metrics = (
+                storage_setup.metrics.collector()
+                if storage_setup.metrics.collector is not None
+                else PrometheusCollector(storage_setup.metrics.buckets)
+            )
+        self._upload_sessions = (
+            ResumableUploadStore(
+                storage_setup.upload.sessions_directory,
+                ttl=storage_setup.upload.session_ttl,
+            )
+            if storage_setup.upload.sessions_directory is not None
+            else None
+        )
 
-            driver = value.driver(**value.options)
+        if storage_setup.initialization == "eager":
+            for storage_name in storage_setup.storages:
+                self._init_storage(storage_name)
+        elif storage_setup.initialization == "parallel":
+            with ThreadPoolExecutor(
+                max_workers=len(storage_setup.storages),
+                thread_name_prefix="ellar-storage-init",
+            ) as executor:
+                # consume results so that initialization errors are raised
+                list(executor.map(self._init_storage, storage_setup.storages))
+
+    def _init_storage(self, storage_name: str) -> Container:
+        with self._storage_locks[storage_name]:
+            if storage_name in self._storages:
+                return self._storages[storage_name]
+
+            started = time.perf_counter()
+            driver = self._get_driver(storage_name)
 
             with contextlib.suppress(ContainerAlreadyExistsError):
                 driver.create_container(container_name=storage_name)
 
             storage_container = driver.get_container(container_name=storage_name)
-            result[storage_name] = storage_container
 
-        self._storages = result
-        self._storage_default = t.cast(str, storage_setup.default)
+            setup = self._storage_setup.storages[storage_name]
+            if callable(setup.metadata_store) and (
+                driver.name == LOCAL_STORAGE_DRIVER_NAME
+            ):
+                self._metadata_stores[storage_name] = setup.metadata_store(
+                    storage_container
+                )
+
+            metadata_store = self._metadata_stores.get(storage_name)
+            if isinstance(metadata_store, SQLiteMetadataStore):
+                metadata_store.init_container(storage_container)
+
+            if setup.content_addressed:
+                self._content_refs[storage_name] = ContentRefs(storage_container)
+
+            multipart = setup.multipart
+            if multipart is not None:
+                self._multipart_uploaders[storage_name] = ParallelMultipartUploader(
+                    # part uploads run on their own driver instances
+                    functools.partial(self._create_driver, storage_name),
+                    threshold=multipart.threshold,
+                    part_size=multipart.part_size,
+                    max_concurrency=multipart.max_concurrency,
+                )
+
+            async_backend = get_async_backend(
+                storage_container,
+                run_sync=self._get_run_sync(storage_name),
+                metadata_store=self._metadata_stores.get(storage_name),
+            )
+            if async_backend is not None:
+                self._async_backends[storage_name] = async_backend
+
+            self._storages[storage_name] = storage_container
+            self._startup_timings[storage_name] = time.perf_counter() - started
+            logger.info(
+                "%s storage initialized in %.3fs",
+                storage_name,
+                self._startup_timings[storage_name],
+            )
+            return storage_container
+
+    def _get_driver(self, storage_name: str) -> StorageDriver:
+        value = self._storage_setup.storages[storage_name]
+        connection = value.connection.model_dump() if value.connection else None
+        key = get_driver_key(value.driver, value.options, connection)
+
+        with self._drivers_lock:
+            driver = self._drivers.get(key)
+            if driver is not None:
+                return driver
+
+            if value.driver.name == LOCAL_STORAGE_DRIVER_NAME:
+                # if its local storage, we need to create the path
+                os.makedirs(value.options["key"], 0o777, exist_ok=True)
+
+            driver = self._create_driver(storage_name)
+            self._drivers[key] = driver
+            return driver
+
+    def _create_driver(self, storage_name: str) -> StorageDriver:
+        value = self._storage_setup.storages[storage_name]
+        driver = value.driver(**value.options)
+        if value.connection is not None:
+            configure_connection_pool(
+                driver,
+                pool_size=value.connection.pool_size,
+                keep_alive=value.connection.keep_alive,
+            )
+        return driver
+
+    @property
+    def storage_setup(self) -> StorageSetup:
+        return self._storage_setup
+
+    @property
+    def startup_timings(self) -> t.Dict[str, float]:
+        """Seconds spent initializing each storage container, for the storages initialized so far"""
+        return dict(self._startup_timings)
 
     def get_container(self, name: t.Optional[str] = None) -> Container:
         """
         Gets the container instance associate to the name,
         return default if name isn't provided.
+
+        Containers are initialized on first use when `initialization` is `lazy`.
         """
-        if name is None:
-            container = self._storages.get(self._storage_default)
-            assert container is not None
+        name = self._get_storage_name(name)
+        container = self._storages.get(name)
+        if container is not None:
             return container
-        if name in self._storages:
-            return self._storages[name]
+        return self._init_storage(name)
+
+    def _get_storage_name(self, name: t.Optional[str] = None) -> str:
+        if name is None:
+            return self._storage_default
+        if name in self._storage_setup.storages:
+            return name
         raise RuntimeError(f"{name} storage has not been added to Storage Config")
 
+    async def _get_async_backend(
+        self, name: t.Optional[str] = None
+    ) -> t.Optional[AsyncStorageBackend]:
+        name = self._get_storage_name(name)
+        if name not in self._storages:
+            # container isn't initialized yet, avoid blocking the event loop
+            await self._get_run_sync(name)(self.get_container, name)
+        return self._async_backends.get(name)
+
+    def get_async_backend(
+        self, name: t.Optional[str] = None
+    ) -> t.Optional[AsyncStorageBackend]:
+        """
+        Gets the async backend associated to the storage name if its driver has one,
+        uses default storage if name isn't provided.
+        """
+        self.get_container(name)
+        return self._async_backends.get(name or self._storage_default)
+
     def save(
         self,
         file: UploadFile,
@@ -72,7 +324,7 @@ class StorageService:
         extra_.setdefault("content_type", file.content_type)
 
         return self.save_content(
-            name=file.filename or str(uuid.uuid4())[10],
+            name=file.filename or uuid.uuid4().hex,
             content=file.file,
             upload_storage=upload_storage,
             metadata={"content_type": file.content_type, "filename": file.filename},
@@ -89,64 +341,410 @@ class StorageService:
         headers: t.Optional[t.Dict[str, str]] = None,
         content_path: t.Optional[str] = None,
     ) -> StoredFile:
-        """Save file into provided `upload_storage`"""
+        """
+        Save file into provided `upload_storage`.
+
+        Content addressed storages ignore `name` and store the content under its digest.
+        """
         if content is None and content_path is None:
             raise ValueError("Either content or content_path must be specified")
 
-        if metadata is not None:
-            extra = {
-                "meta_data": metadata,
-                "content_type": metadata.get(
-                    "content_type", "application/octet-stream"
-                ),
-            }
+        storage_name = self._get_storage_name(upload_storage)
+        with track_operation(self._metrics, storage_name, "save"):
+            return self._save_content(
+                storage_name, name, content, metadata, extra, headers, content_path
+            )
 
-        container = self.get_container(upload_storage)
+    def _save_content(
+        self,
+        storage_name: str,
+        name: str,
+        content: t.Optional[t.Iterator[bytes]],
+        metadata: t.Optional[t.Dict[str, t.Any]],
+        extra: t.Optional[t.Dict[str, t.Any]],
+        headers: t.Optional[t.Dict[str, str]],
+        content_path: t.Optional[str],
+    ) -> StoredFile:
+        """`save_content` without its tracking, measured by the caller"""
+        # copied, the stored metadata is added to it without touching the caller's
+        extra = dict(self._get_extra(metadata, extra) or {})
+        container = self.get_container(storage_name)
+        if self._is_content_addressed(storage_name):
+            return self._save_content_addressed(
+                storage_name, container, content, content_path, extra, headers
+            )
 
-        if (
-            container.driver.name == LOCAL_STORAGE_DRIVER_NAME
-            and extra is not None
-            and extra.get("meta_data", None) is not None
-        ):
+        obj = self._upload(
+            storage_name, container, name, content, content_path, extra, headers
+        )
+        self._on_saved(storage_name, obj, extra)
+        return self._make_stored_file(storage_name, obj)
+
+    def _upload(
+        self,
+        storage_name: str,
+        container: Container,
+        name: str,
+        content: t.Optional[t.Union[t.IO[bytes], t.Iterator[bytes]]],
+        content_path: t.Optional[str],
+        extra: t.Optional[t.Dict[str, t.Any]],
+        headers: t.Optional[t.Dict[str, str]],
+    ) -> Object:
+        storage_setup = self._storage_setup.storages[storage_name]
+        checksums_setup = storage_setup.checksums
+        hasher = (
+            ChecksumHasher(checksums_setup.algorithms)
+            if checksums_setup is not None
+            else None
+        )
+        compression = storage_setup.compression
+        if compression is not None and extra is not None:
+            metadata = extra.get("meta_data") or {}
+            content_type = extra.get("content_type") or metadata.get("content_type")
+            if is_compressible(content_type, compression.content_types):
+                # sent before the content to remote storages
+                extra["meta_data"] = {**metadata, "content_encoding": compression.codec}
+            else:
+                compression = None
+        else:
+            compression = None
+
+        with contextlib.ExitStack() as stack:
+            if compression is not None or hasher is not None:
+                # content is compressed and its digests computed as it's uploaded
+                if content_path is not None:
+                    content = stack.enter_context(open_binary_file(content_path))
+                    content_path = None
+                assert content is not None
+                if compression is not None:
+                    content = compress_stream(
+                        content, compression.codec, compression.level
+                    )
+                if hasher is not None:
+                    # digests of the stored bytes
+                    content = hasher.wrap(content)
+
+            with track_operation(self._metrics, storage_name, "upload"):
+                obj = self._upload_content(
+                    storage_name, container, name, content, content_path, extra, headers
+                )
+        if self._metrics is not None:
+            self._metrics.add_bytes(storage_name, "in", obj.size)
+
+        metadata = (extra or {}).get("meta_data")
+        if hasher is not None:
+            checksums = hasher.hexdigests()
+            if container.driver.name == LOCAL_STORAGE_DRIVER_NAME:
+                metadata = {**(metadata or {}), "checksums": checksums}
+                if extra is not None:
+                    extra["meta_data"] = metadata
+            else:
+                # remote metadata is sent before the content, digests are kept aside
+                container.upload_object_via_stream(
+                    iterator=iter([json.dumps(checksums).encode()]),
+                    object_name=f"{name}.checksums.json",
+                )
+                obj.meta_data = {**(obj.meta_data or {}), "checksums": checksums}
+
+        metadata_store = self._metadata_stores.get(storage_name)
+        if metadata_store is not None:
             """
-            Libcloud local storage driver doesn't support metadata, so the metadata
-            is saved in the same container with the combination of the original name
-            and `.metadata.json` as name
+            Libcloud local storage driver doesn't support metadata,
+            so the metadata is saved in the storage metadata store
             """
-            container.upload_object_via_stream(
-                iterator=get_metadata_file_obj(extra["meta_data"]),
-                object_name=f"{name}.metadata.json",
-            )
+            with track_operation(self._metrics, storage_name, "metadata_set"):
+                metadata_store.set(obj, metadata or {})
+            if metadata is not None:
+                obj.meta_data = metadata
+        return obj
+
+    def _upload_content(
+        self,
+        storage_name: str,
+        container: Container,
+        name: str,
+        content: t.Optional[t.Union[t.IO[bytes], t.Iterator[bytes]]],
+        content_path: t.Optional[str],
+        extra: t.Optional[t.Dict[str, t.Any]],
+        headers: t.Optional[t.Dict[str, str]],
+    ) -> Object:
+        uploader = self._multipart_uploaders.get(storage_name)
         if content_path is not None:
-            return StoredFile(
-                container.upload_object(
-                    file_path=content_path,
-                    object_name=name,
-                    extra=extra,
-                    headers=headers,
-                )
+            if (
+                uploader is not None
+                and os.path.getsize(content_path) >= uploader.threshold
+            ):
+                with open_binary_file(content_path) as content_file:
+                    return uploader.upload(
+                        container, name, content_file, extra=extra, headers=headers
+                    )
+            return container.upload_object(
+                file_path=content_path,
+                object_name=name,
+                extra=extra,
+                headers=headers,
             )
+
         assert content is not None
-        return StoredFile(
-            container.upload_object_via_stream(
-                iterator=content, object_name=name, extra=extra, headers=headers
+        if uploader is not None:
+            return uploader.upload(
+                container, name, content, extra=extra, headers=headers
             )
+        return container.upload_object_via_stream(
+            iterator=content, object_name=name, extra=extra, headers=headers
         )
 
+    def _save_content_addressed(
+        self,
+        storage_name: str,
+        container: Container,
+        content: t.Optional[t.Union[t.IO[bytes], t.Iterator[bytes]]],
+        content_path: t.Optional[str],
+        extra: t.Optional[t.Dict[str, t.Any]],
+        headers: t.Optional[t.Dict[str, str]],
+    ) -> StoredFile:
+        """
+        Saves content under its digest, the upload is skipped when the content is already stored.
+
+        Metadata of the first upload of a content is kept.
+        """
+        setup = self._storage_setup.storages[storage_name].content_addressed
+        assert setup is not None
+        spooled = None
+        if content_path is not None:
+            digest = hash_file(content_path, setup.algorithm)
+        else:
+            assert content is not None
+            digest, spooled = spool_and_hash(content, setup.algorithm)
+
+        refs = self._content_refs[storage_name]
+        try:
+            with refs.lock(digest):
+                count = refs.get(digest)
+                obj = None
+                if count:
+                    with contextlib.suppress(ObjectDoesNotExistError):
+                        obj = container.get_object(digest)
+
+                if obj is None:
+                    obj = self._upload(
+                        storage_name,
+                        container,
+                        digest,
+                        spooled,
+                        content_path if spooled is None else None,
+                        extra,
+                        headers,
+                    )
+                    self._on_saved(storage_name, obj, extra)
+                refs.set(digest, count + 1)
+        finally:
+            if spooled is not None:
+                spooled.close()
+
+        return self._make_stored_file(storage_name, obj)
+
+    def _release_content(self, storage_name: str, digest: str) -> bool:
+        """Drops a reference of a content addressed object, deleting it with the last one"""
+        container = self.get_container(storage_name)
+        refs = self._content_refs[storage_name]
+        with refs.lock(digest):
+            obj = container.get_object(digest)
+            count = refs.get(digest)
+            if count > 1:
+                refs.set(digest, count - 1)
+                return True
+
+            refs.set(digest, 0)
+            return self._delete_object(storage_name, obj)
+
+    def get_executor(self, name: t.Optional[str] = None) -> t.Optional[StorageExecutor]:
+        """
+        Gets the dedicated executor of the storage name if configured,
+        uses default storage if name isn't provided.
+        """
+        return self._executors.get(self._get_storage_name(name))
+
+    def get_executor_stats(self) -> t.Dict[str, t.Dict[str, t.Any]]:
+        """Returns the occupancy of each storage dedicated executor"""
+        return {name: executor.stats() for name, executor in self._executors.items()}
+
+    def _get_run_sync(self, name: t.Optional[str] = None) -> RunSyncType:
+        executor = self.get_executor(name)
+        run_sync = executor.run if executor is not None else run_in_threadpool
+        if self._metrics is None:
+            return run_sync
+        return functools.partial(
+            _run_sync_measured,
+            run_sync,
+            self._metrics,
+            self._get_storage_name(name),
+        )
+
+    @property
+    def metadata_cache(self) -> t.Optional[MetadataCache]:
+        return self._metadata_cache
+
+    def get_disk_cache(self, name: t.Optional[str] = None) -> t.Optional[DiskCache]:
+        """
+        Gets the disk cache of the storage name if configured,
+        uses default storage if name isn't provided.
+        """
+        return self._disk_caches.get(self._get_storage_name(name))
+
+    def _is_content_addressed(self, storage_name: str) -> bool:
+        # decided on the setup, refs are only created once the storage is initialized
+        return self._storage_setup.storages[storage_name].content_addressed is not None
+
+    def _is_content_addressed_name(self, storage_name: str, name: str) -> bool:
+        """Whether `name` is reference counted, files saved before the mode was enabled aren't"""
+        setup = self._storage_setup.storages[storage_name].content_addressed
+        return setup is not None and is_digest(name, setup.algorithm)
+
+    def _processes_content(self, name: t.Optional[str] = None) -> bool:
+        """Whether the content is hashed or compressed as it's saved"""
+        storage_name = self._get_storage_name(name)
+        storage_setup = self._storage_setup.storages[storage_name]
+        return (
+            self._is_content_addressed(storage_name)
+            or storage_setup.checksums is not None
+            or storage_setup.compression is not None
+        )
+
+    @property
+    def metrics(self) -> t.Optional[MetricsCollector]:
+        """Collector of the storage operation metrics, if `metrics` is configured"""
+        return self._metrics
+
+    @property
+    def upload_sessions(self) -> t.Optional[ResumableUploadStore]:
+        """Resumable upload sessions, if `upload.sessions_directory` is configured"""
+        return self._upload_sessions
+
+    def get_metadata_store(
+        self, name: t.Optional[str] = None
+    ) -> t.Optional[MetadataStore]:
+        """
+        Gets the metadata store of the storage name if it uses the local driver,
+        uses default storage if name isn't provided.
+        """
+        name = self._get_storage_name(name)
+        self.get_container(name)
+        return self._metadata_stores.get(name)
+
+    def _load_local_metadata(
+        self, storage_name: str, obj: Object
+    ) -> t.Dict[str, t.Any]:
+        metadata_store = self._metadata_stores.get(storage_name)
+        with track_operation(self._metrics, storage_name, "metadata_get"):
+            if metadata_store is None:
+                return load_local_metadata(obj)
+            return metadata_store.get(obj)
+
+    def _get_local_metadata(self, storage_name: str, obj: Object) -> t.Dict[str, t.Any]:
+        if self._metadata_cache is None:
+            return self._load_local_metadata(storage_name, obj)
+
+        metadata = self._metadata_cache.get(storage_name, obj.name, obj.hash)
+        if metadata is None:
+            metadata = self._load_local_metadata(storage_name, obj)
+            self._metadata_cache.set(storage_name, obj.name, obj.hash, metadata)
+        return metadata
+
+    def _on_saved(
+        self, storage_name: str, obj: Object, extra: t.Optional[t.Dict[str, t.Any]]
+    ) -> None:
+        disk_cache = self._disk_caches.get(storage_name)
+        if disk_cache is not None:
+            disk_cache.invalidate(storage_name, obj.name)
+
+        if obj.driver.name != LOCAL_STORAGE_DRIVER_NAME:
+            return
+
+        metadata = (extra or {}).get("meta_data")
+        if metadata is not None:
+            # metadata was just written alongside the object, no need to read it back
+            obj.meta_data = metadata
+
+        if self._metadata_cache is not None:
+            if metadata is not None:
+                self._metadata_cache.set(storage_name, obj.name, obj.hash, metadata)
+            else:
+                self._metadata_cache.invalidate(storage_name, obj.name)
+
+    def _on_deleted(self, storage_name: str, name: str) -> None:
+        if self._metadata_cache is not None:
+            self._metadata_cache.invalidate(storage_name, name)
+
+        disk_cache = self._disk_caches.get(storage_name)
+        if disk_cache is not None:
+            disk_cache.invalidate(storage_name, name)
+
+    def _make_stored_file(self, storage_name: str, obj: Object) -> StoredFile:
+        kwargs: t.Dict[str, t.Any] = {
+            "metadata_loader": functools.partial(
+                self._get_local_metadata, storage_name
+            ),
+            "metadata_store": self._metadata_stores.get(storage_name),
+            "run_sync": self._get_run_sync(storage_name),
+        }
+        storage_setup = self._storage_setup.storages[storage_name]
+        kwargs["buffer_size"] = storage_setup.read_buffer.buffer_size
+        kwargs["readahead"] = storage_setup.read_buffer.readahead
+        if storage_setup.compression is not None:
+            kwargs["compressed"] = True
+        checksums_setup = storage_setup.checksums
+        if checksums_setup is not None:
+            kwargs["verify_checksums"] = checksums_setup.verify
+            if obj.driver.name != LOCAL_STORAGE_DRIVER_NAME:
+                kwargs["checksums_loader"] = load_remote_checksums
+
+        disk_cache = self._disk_caches.get(storage_name)
+        if disk_cache is not None:
+            return CachedStoredFile(obj, disk_cache, storage_name, **kwargs)
+        return StoredFile(obj, **kwargs)
+
+    @staticmethod
+    def _get_extra(
+        metadata: t.Optional[t.Dict[str, t.Any]],
+        extra: t.Optional[t.Dict[str, t.Any]],
+    ) -> t.Optional[t.Dict[str, t.Any]]:
+        if metadata is not None:
+            return {
+                "meta_data": metadata,
+                "content_type": metadata.get(
+                    "content_type", "application/octet-stream"
+                ),
+            }
+        return extra
+
+    def get_storage_name(self, path: str) -> str:
+        """
+        Returns the storage name of `path`, expected to be `storage_name/file_id`,
+        raises `RuntimeError` if the storage isn't configured.
+        """
+        return self.__get_storage_from_path(path)[0]
+
     def __get_storage_from_path(self, path: str) -> t.Tuple[str, str]:
         path_split = path.split("/")
         if len(path_split) == 1:
             upload_storage, file_id = self._storage_default, path_split[0]
         else:
             upload_storage, file_id = path_split
-        return upload_storage, file_id
+        # validated before it's used as a metrics label
+        return self._get_storage_name(upload_storage), file_id
 
     def get(self, path: str) -> StoredFile:
         """
         Retrieve the file with `provided` path, path is expected to be `storage_name/file_id`.
         """
         upload_storage, file_id = self.__get_storage_from_path(path)
-        return StoredFile(self.get_container(upload_storage).get_object(file_id))
+        with track_operation(self._metrics, upload_storage, "get"):
+            return self._get(upload_storage, file_id)
+
+    def _get(self, storage_name: str, file_id: str) -> StoredFile:
+        obj = self.get_container(storage_name).get_object(file_id)
+        return self._make_stored_file(storage_name, obj)
 
     def delete(self, path: str) -> bool:
         """
@@ -155,22 +753,230 @@ class StorageService:
         The path is expected to be `storage_name/file_id`.
         """
         upload_storage, file_id = self.__get_storage_from_path(path)
-        obj = self.get_container(upload_storage).get_object(file_id)
+        with track_operation(self._metrics, upload_storage, "delete"):
+            return self._delete(upload_storage, file_id)
+
+    def _delete(self, storage_name: str, file_id: str) -> bool:
+        if self._is_content_addressed_name(storage_name, file_id):
+            return self._release_content(storage_name, file_id)
+
+        obj = self.get_container(storage_name).get_object(file_id)
+        return self._delete_object(storage_name, obj)
+
+    def _delete_object(self, storage_name: str, obj: Object) -> bool:
+        self._on_deleted(storage_name, obj.name)
+
+        metadata_store = self._metadata_stores.get(storage_name)
+        if metadata_store is None and obj.driver.name == LOCAL_STORAGE_DRIVER_NAME:
+            metadata_store = SidecarMetadataStore()
+        if metadata_store is not None:
+            deleted = obj.delete()
+            if deleted:
+                # removed once the object is, so it's never left without metadata
+                metadata_store.delete(obj)
+            return deleted
 
-        if obj.driver.name == LOCAL_STORAGE_DRIVER_NAME:
-            """Try deleting associated metadata file"""
+        if self._storage_setup.storages[storage_name].checksums is not None:
             with contextlib.suppress(ObjectDoesNotExistError):
-                obj.container.get_object(f"{obj.name}.metadata.json").delete()
+                obj.container.get_object(f"{obj.name}.checksums.json").delete()
 
         return obj.delete()
 
+    def save_many(
+        self,
+        items: t.Sequence[SaveItemType],
+        upload_storage: t.Optional[str] = None,
+        max_concurrency: int = BATCH_CONCURRENCY,
+    ) -> t.List[BatchResult[StoredFile]]:
+        """
+        Save many files concurrently.
+
+        Each item is either an `UploadFile` or a dict of `save_content` arguments.
+        Returns a result per item, in order, holding the saved file or the raised error.
+        """
+        return run_batch(
+            functools.partial(self._save_item, upload_storage=upload_storage),
+            items,
+            [self._get_save_item_key(item) for item in items],
+            max_concurrency,
+        )
+
+    def get_many(
+        self, paths: t.Sequence[str], max_concurrency: int = BATCH_CONCURRENCY
+    ) -> t.List[BatchResult[StoredFile]]:
+        """Retrieve many files concurrently, returns a result per path, in order"""
+        return run_batch(self.get, paths, paths, max_concurrency)
+
+    def delete_many(
+        self, paths: t.Sequence[str], max_concurrency: int = BATCH_CONCURRENCY
+    ) -> t.List[BatchResult[bool]]:
+        """
+        Delete many files concurrently, returns a result per path, in order.
+
+        Metadata of local storages is removed in one pass per storage once all files are deleted.
+        """
+        deleted_objs: t.Dict[str, t.List[Object]] = collections.defaultdict(list)
+
+        def _delete(path: str) -> bool:
+            upload_storage, file_id = self.__get_storage_from_path(path)
+            if self._is_content_addressed_name(upload_storage, file_id):
+                return self._release_content(upload_storage, file_id)
+
+            obj = self.get_container(upload_storage).get_object(file_id)
+            if obj.driver.name != LOCAL_STORAGE_DRIVER_NAME:
+                return self._delete_object(upload_storage, obj)
+
+            self._on_deleted(upload_storage, file_id)
+            deleted = obj.delete()
+            if deleted:
+                deleted_objs[upload_storage].append(obj)
+            return deleted
+
+        results = run_batch(_delete, paths, paths, max_concurrency)
+
+        for storage_name, objs in deleted_objs.items():
+            metadata_store = self._metadata_stores.get(storage_name)
+            (metadata_store or SidecarMetadataStore()).delete_many(objs)
+        return results
+
+    def list_files(
+        self,
+        storage: t.Optional[str] = None,
+        prefix: t.Optional[str] = None,
+        page_size: int = LIST_PAGE_SIZE,
+        continuation_token: t.Optional[str] = None,
+    ) -> FilePage:
+        """
+        Lists a page of the files of `storage` whose name starts with `prefix`,
+        uses default storage if not provided.
+
+        The `continuation_token` of the page fetches the next one, and is None on the last page.
+        """
+        return next(
+            self._iter_file_pages(storage, prefix, page_size, continuation_token)
+        )
+
+    def iter_files(
+        self,
+        storage: t.Optional[str] = None,
+        prefix: t.Optional[str] = None,
+        page_size: int = LIST_PAGE_SIZE,
+    ) -> t.Iterator[FileEntry]:
+        """
+        Iterates over the files of `storage` whose name starts with `prefix`,
+        fetching `page_size` files at a time. Metadata and checksums files are skipped.
+        """
+        for page in self._iter_file_pages(storage, prefix, page_size):
+            yield from page.files
+
+    def _iter_file_pages(
+        self,
+        storage: t.Optional[str],
+        prefix: t.Optional[str],
+        page_size: int,
+        continuation_token: t.Optional[str] = None,
+    ) -> t.Iterator[FilePage]:
+        storage_name = self._get_storage_name(storage)
+        container = self.get_container(storage_name)
+        catalog = self._metadata_stores.get(storage_name)
+        if isinstance(catalog, SQLiteMetadataStore) and not catalog.is_complete(
+            storage_name
+        ):
+            # files saved before the catalog was used are only found by walking the directory
+            catalog = None
+        return iter_file_pages(
+            container,
+            storage_name,
+            prefix=prefix,
+            page_size=page_size,
+            continuation_token=continuation_token,
+            is_ignored=functools.partial(self._is_internal_file, storage_name),
+            catalog=catalog if isinstance(catalog, SQLiteMetadataStore) else None,
+        )
+
+    def _is_internal_file(self, storage_name: str, name: str) -> bool:
+        """Files the storage keeps alongside the saved ones"""
+        if name.endswith(".metadata.json") and (
+            self._storage_setup.storages[storage_name].driver.name
+            == LOCAL_STORAGE_DRIVER_NAME
+        ):
+            return True
+        if name.endswith(".refs") and self._is_content_addressed(storage_name):
+            return True
+        return name.endswith(".checksums.json") and (
+            self._storage_setup.storages[storage_name].checksums is not None
+        )
+
+    def _save_item(
+        self, item: SaveItemType, upload_storage: t.Optional[str] = None
+    ) -> StoredFile:
+        if isinstance(item, dict):
+            return self.save_content(**{"upload_storage": upload_storage, **item})
+        return self.save(item, upload_storage=upload_storage)
+
+    async def _save_item_async(
+        self, item: SaveItemType, upload_storage: t.Optional[str] = None
+    ) -> StoredFile:
+        if isinstance(item, dict):
+            return await self.save_content_async(
+                **{"upload_storage": upload_storage, **item}
+            )
+        return await self.save_async(item, upload_storage=upload_storage)
+
+    @staticmethod
+    def _get_save_item_key(item: SaveItemType) -> str:
+        if isinstance(item, dict):
+            return str(item["name"])
+        return item.filename or ""
+
     async def delete_async(self, path: str) -> bool:
         """Async Delete File Operation"""
-        return await run_in_threadpool(self.delete, path)
+        upload_storage, file_id = self.__get_storage_from_path(path)
+        with track_operation(self._metrics, upload_storage, "delete_async"):
+            backend = await self._get_async_backend(upload_storage)
+            if backend is None or self._is_content_addressed_name(
+                upload_storage, file_id
+            ):
+                # tracked as `delete_async` only
+                return t.cast(
+                    bool,
+                    await self._get_run_sync(upload_storage)(
+                        self._delete, upload_storage, file_id
+                    ),
+                )
+
+            obj = await backend.get_object(file_id)
+            self._on_deleted(upload_storage, file_id)
+            return await backend.delete_object(obj)
 
     async def get_async(self, path: str) -> StoredFile:
         """Async Get File Operation"""
-        return await run_in_threadpool(self.get, path)
+        upload_storage, file_id = self.__get_storage_from_path(path)
+        with track_operation(self._metrics, upload_storage, "get_async"):
+            backend = await self._get_async_backend(upload_storage)
+            if backend is None:
+                # tracked as `get_async` only
+                return t.cast(
+                    StoredFile,
+                    await self._get_run_sync(upload_storage)(
+                        self._get, upload_storage, file_id
+                    ),
+                )
+
+            obj = await backend.get_object(file_id)
+            metadata = (
+                self._metadata_cache.get(upload_storage, obj.name, obj.hash)
+                if self._metadata_cache is not None
+                else None
+            )
+            if metadata is None:
+                metadata = await backend.get_metadata(obj)
+                if self._metadata_cache is not None:
+                    self._metadata_cache.set(
+                        upload_storage, obj.name, obj.hash, metadata
+                    )
+            obj.meta_data = metadata
+            return self._make_stored_file(upload_storage, obj)
 
     async def save_async(
         self,
@@ -178,26 +984,206 @@ class StorageService:
         upload_storage: t.Optional[str] = None,
     ) -> StoredFile:
         """Async Save File Operation"""
-        return await run_in_threadpool(self.save, file, upload_storage=upload_storage)
+        return await self.save_content_async(
+            name=file.filename or uuid.uuid4().hex,
+            content=file.file,
+            upload_storage=upload_storage,
+            metadata={"content_type": file.content_type, "filename": file.filename},
+            headers=dict(file.headers),
+        )
 
     async def save_content_async(
         self,
         name: str,
-        content: t.Optional[t.Iterator[bytes]] = None,
+        content: t.Optional[UploadContent] = None,
         upload_storage: t.Optional[str] = None,
         metadata: t.Optional[t.Dict[str, t.Any]] = None,
         extra: t.Optional[t.Dict[str, t.Any]] = None,
         headers: t.Optional[t.Dict[str, str]] = None,
         content_path: t.Optional[str] = None,
     ) -> StoredFile:
-        """Async Save Content Operation"""
-        return await run_in_threadpool(
-            self.save_content,
-            name,
-            content=content,
+        """
+        Async Save Content Operation.
+
+        Storages with an async backend stream `content` chunk by chunk,
+        others run `save_content` in a worker thread.
+        """
+        if content is None and content_path is None:
+            raise ValueError("Either content or content_path must be specified")
+
+        storage_name = self._get_storage_name(upload_storage)
+        with track_operation(self._metrics, storage_name, "save_async"):
+            backend = await self._get_async_backend(upload_storage)
+            if backend is None or self._processes_content(upload_storage):
+                # content is hashed and compressed while uploaded by `save_content`
+                if hasattr(content, "__aiter__"):
+                    content = iter_content_from_thread(
+                        t.cast(t.AsyncIterator[bytes], content),
+                        asyncio.get_running_loop(),
+                    )
+                # tracked as `save_async` only
+                return t.cast(
+                    StoredFile,
+                    await self._get_run_sync(upload_storage)(
+                        self._save_content,
+                        storage_name,
+                        name,
+                        t.cast(t.Optional[t.Iterator[bytes]], content),
+                        metadata,
+                        extra,
+                        headers,
+                        content_path,
+                    ),
+                )
+
+            extra = self._get_extra(metadata, extra)
+            if content_path is not None:
+                content_file = await backend.run_sync(open_binary_file, content_path)
+                try:
+                    obj = await backend.upload_object(
+                        content_file, object_name=name, extra=extra, headers=headers
+                    )
+                finally:
+                    await backend.run_sync(content_file.close)
+            else:
+                assert content is not None
+                obj = await backend.upload_object(
+                    content, object_name=name, extra=extra, headers=headers
+                )
+            if self._metrics is not None:
+                self._metrics.add_bytes(storage_name, "in", obj.size)
+            self._on_saved(storage_name, obj, extra)
+            return self._make_stored_file(storage_name, obj)
+
+    async def save_stream_async(
+        self,
+        stream: t.AsyncIterator[bytes],
+        filename: t.Optional[str] = None,
+        content_type: t.Optional[str] = None,
+        upload_storage: t.Optional[str] = None,
+        max_size: t.Optional[int] = None,
+        extra: t.Optional[t.Dict[str, t.Any]] = None,
+    ) -> StoredFile:
+        """
+        Saves `stream` chunks into `upload_storage` as they arrive, eg `request.stream()`.
+
+        Unlike `save_async`, the content is never spooled to a temporary file,
+        so it's written once with bounded memory.
+        Raises `UploadTooLargeError` when `max_size` bytes are exceeded.
+        """
+        if max_size is not None:
+            stream = limit_stream(stream, max_size)
+
+        content_type = content_type or "application/octet-stream"
+        return await self.save_content_async(
+            name=filename or uuid.uuid4().hex,
+            content=stream,
             upload_storage=upload_storage,
-            metadata=metadata,
+            metadata={"content_type": content_type, "filename": filename},
             extra=extra,
-            headers=headers,
-            content_path=content_path,
+            headers={"Content-Type": content_type},
         )
+
+    async def complete_upload_session_async(self, session_id: str) -> StoredFile:
+        """
+        Saves the content received by a resumable upload session into its storage
+        and removes the session.
+
+        Raises `UploadSessionNotFoundError` and `UploadIncompleteError`.
+        """
+        if self._upload_sessions is None:
+            raise RuntimeError("Resumable uploads require `upload.sessions_directory`")
+
+        store = self._upload_sessions
+        session = await run_in_threadpool(store.get, session_id)
+        return t.cast(
+            StoredFile,
+            await self._get_run_sync(session.storage)(
+                store.complete, session_id, self._save_upload_session
+            ),
+        )
+
+    def _save_upload_session(self, session: UploadSession, path: str) -> StoredFile:
+        content_type = session.content_type or "application/octet-stream"
+        return self.save_content(
+            name=session.filename or uuid.uuid4().hex,
+            content_path=path,
+            upload_storage=session.storage,
+            metadata={"content_type": content_type, "filename": session.filename},
+            headers={"Content-Type": content_type},
+        )
+
+    async def save_many_async(
+        self,
+        items: t.Sequence[SaveItemType],
+        upload_storage: t.Optional[str] = None,
+        max_concurrency: int = BATCH_CONCURRENCY,
+    ) -> t.List[BatchResult[StoredFile]]:
+        """Async Save Many Operation"""
+        return await run_batch_async(
+            functools.partial(self._save_item_async, upload_storage=upload_storage),
+            items,
+            [self._get_save_item_key(item) for item in items],
+            max_concurrency,
+        )
+
+    async def get_many_async(
+        self, paths: t.Sequence[str], max_concurrency: int = BATCH_CONCURRENCY
+    ) -> t.List[BatchResult[StoredFile]]:
+        """Async Get Many Operation"""
+        return await run_batch_async(self.get_async, paths, paths, max_concurrency)
+
+    async def delete_many_async(
+        self, paths: t.Sequence[str], max_concurrency: int = BATCH_CONCURRENCY
+    ) -> t.List[BatchResult[bool]]:
+        """Async Delete Many Operation"""
+        return await run_batch_async(self.delete_async, paths, paths, max_concurrency)
+
+    async def list_files_async(
+        self,
+        storage: t.Optional[str] = None,
+        prefix: t.Optional[str] = None,
+        page_size: int = LIST_PAGE_SIZE,
+        continuation_token: t.Optional[str] = None,
+    ) -> FilePage:
+        """Async List Files Operation"""
+        return t.cast(
+            FilePage,
+            await self._get_run_sync(storage)(
+                self.list_files, storage, prefix, page_size, continuation_token
+            ),
+        )
+
+    async def iter_files_async(
+        self,
+        storage: t.Optional[str] = None,
+        prefix: t.Optional[str] = None,
+        page_size: int = LIST_PAGE_SIZE,
+    ) -> t.AsyncIterator[FileEntry]:
+        """Async Iterate Files Operation, each page is fetched in a worker thread"""
+        run_sync = self._get_run_sync(storage)
+        pages = await run_sync(self._iter_file_pages, storage, prefix, page_size)
+        while True:
+            page = await run_sync(next, pages, None)
+            if page is None:
+                break
+            for entry in page.files:
+                yield entry
+
+
+async def _run_sync_measured(
+    run_sync: RunSyncType,
+    metrics: MetricsCollector,
+    storage_name: str,
+    func: t.Callable[..., t.Any],
+    *args: t.Any,
+    **kwargs: t.Any,
+) -> t.Any:
+    """Runs `func` with `run_sync`, recording the time it waited for a worker thread"""
+    submitted = time.perf_counter()
+
+    def _call() -> t.Any:
+        metrics.observe(storage_name, "queue_wait", time.perf_counter() - submitted)
+        return func(*args, **kwargs)
+
+    return await run_sync(_call)
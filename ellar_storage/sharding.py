@@ -0,0 +1,208 @@
+import contextlib
+import hashlib
+import os
+import shutil
+import typing as t
+
+from libcloud.storage.drivers.local import IGNORE_FOLDERS, LocalStorageDriver
+
+from ellar_storage.content_addressed import LOCAL_LOCKS_DIRECTORY
+from ellar_storage.storage import Container, Object
+
+# hex characters of the name hash used by each directory level
+SHARD_WIDTH = 2
+# objects stored next to the object they describe, sharded by its name
+SIDECAR_SUFFIXES = (".metadata.json",)
+
+
+def get_shard_name(object_name: str, depth: int = 2) -> str:
+    """
+    Returns the path of `object_name` in a sharded container, e.g. `ab/cd/<object_name>`,
+    with one directory level per `depth` taken from the hash of the name.
+    """
+    key = object_name
+    for suffix in SIDECAR_SUFFIXES:
+        if key.endswith(suffix):
+            key = key[: -len(suffix)]
+            break
+
+    name_hash = hashlib.md5(key.encode("utf-8")).hexdigest()
+    levels = [
+        name_hash[level * SHARD_WIDTH : (level + 1) * SHARD_WIDTH]
+        for level in range(depth)
+    ]
+    return "/".join([*levels, object_name])
+
+
+def get_object_name(shard_name: str, depth: int = 2) -> t.Optional[str]:
+    """Returns the object name stored at `shard_name`, or None if it isn't a sharded path"""
+    parts = shard_name.split("/", depth)
+    if len(parts) <= depth:
+        return None
+    object_name = parts[-1]
+    if get_shard_name(object_name, depth) != shard_name:
+        return None
+    return object_name
+
+
+class ShardedLocalStorageDriver(LocalStorageDriver):
+    """
+    Local storage driver spreading the objects of a container over hashed directories.
+
+    `files/report.pdf` is stored as `<key>/files/ab/cd/report.pdf`, where `abcd` starts
+    the hash of its name, while object names stay unchanged.
+    Objects of a container written flat by `LocalStorageDriver` are still found
+    until `reshard_container` moves them.
+    """
+
+    def __init__(
+        self, key: str, *args: t.Any, ex_shard_depth: int = 2, **kwargs: t.Any
+    ):
+        if not 1 <= ex_shard_depth <= 4:
+            raise ValueError("ex_shard_depth must be between 1 and 4")
+        self.shard_depth = ex_shard_depth
+        super().__init__(key, *args, **kwargs)  # type:ignore[no-untyped-call]
+
+    def get_object_path(self, container: Container, object_name: str) -> str:
+        """Returns the sharded path `object_name` is written to"""
+        return os.path.join(
+            self.base_path,
+            container.name,
+            get_shard_name(object_name, self.shard_depth),
+        )
+
+    def _resolve_object_path(self, container: Container, object_name: str) -> str:
+        path = self.get_object_path(container, object_name)
+        if not os.path.exists(path):
+            flat_path = os.path.join(self.base_path, container.name, object_name)
+            if os.path.isfile(flat_path):
+                return flat_path
+        return path
+
+    def _make_object(self, container: Container, object_name: str) -> Object:
+        path = self._resolve_object_path(container, object_name)
+        container_path = os.path.join(self.base_path, container.name)
+        obj: Object = super()._make_object(  # type:ignore[no-untyped-call]
+            container, os.path.relpath(path, container_path)
+        )
+        obj.name = object_name
+        return obj
+
+    def _get_objects(self, container: Container) -> t.Iterator[Object]:
+        container_path = self.get_container_cdn_url(container, check=True)  # type:ignore[no-untyped-call]
+
+        for folder, subfolders, files in os.walk(container_path, topdown=True):
+            for ignored in (*IGNORE_FOLDERS, LOCAL_LOCKS_DIRECTORY):
+                if ignored in subfolders:
+                    subfolders.remove(ignored)
+
+            for name in files:
+                path = os.path.relpath(os.path.join(folder, name), container_path)
+                shard_name = path.replace(os.sep, "/")
+                # objects not resharded yet keep their flat name
+                object_name = get_object_name(shard_name, self.shard_depth)
+                yield self._make_object(container, object_name or shard_name)
+
+    def get_object_cdn_url(self, obj: Object) -> str:
+        return self._resolve_object_path(obj.container, obj.name)
+
+    def upload_object(
+        self,
+        file_path: str,
+        container: Container,
+        object_name: str,
+        extra: t.Optional[t.Dict[str, t.Any]] = None,
+        verify_hash: bool = True,
+        headers: t.Optional[t.Dict[str, str]] = None,
+    ) -> Object:
+        obj_path = self._make_object_path(container, object_name)
+        with self._lock_cls(obj_path):  # type:ignore[no-untyped-call]
+            shutil.copy(file_path, obj_path)
+        self._on_written(container, object_name, obj_path)
+        return self._make_object(container, object_name)
+
+    def upload_object_via_stream(
+        self,
+        iterator: t.Iterator[bytes],
+        container: Container,
+        object_name: str,
+        extra: t.Optional[t.Dict[str, t.Any]] = None,
+        headers: t.Optional[t.Dict[str, str]] = None,
+    ) -> Object:
+        obj_path = self._make_object_path(container, object_name)
+        lock = self._lock_cls(obj_path)  # type:ignore[no-untyped-call]
+        with lock, open(obj_path, "wb") as obj_file:
+            for data in iterator:
+                obj_file.write(data)
+        self._on_written(container, object_name, obj_path)
+        return self._make_object(container, object_name)
+
+    def _make_object_path(self, container: Container, object_name: str) -> str:
+        self.get_container_cdn_url(container, check=True)  # type:ignore[no-untyped-call]
+        obj_path = self.get_object_path(container, object_name)
+        os.makedirs(os.path.dirname(obj_path), exist_ok=True)
+        return obj_path
+
+    def _on_written(
+        self, container: Container, object_name: str, obj_path: str
+    ) -> None:
+        os.chmod(obj_path, 0o664)
+        discard_flat_copy(container, object_name)
+
+
+def discard_flat_copy(container: Container, object_name: str) -> None:
+    """
+    Removes the flat copy of `object_name` left from before resharding,
+    which would otherwise outlive content written to its sharded path.
+    """
+    flat_path = os.path.join(container.get_cdn_url(), object_name)
+    if os.path.isfile(flat_path):
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(flat_path)
+
+
+def reshard_container(container: Container) -> int:
+    """
+    Moves the flat objects of a local `container` into the hashed directories
+    of its `ShardedLocalStorageDriver`, with their metadata files, and returns
+    the number of files moved.
+
+    Objects stay readable while they are moved, and the migration can be resumed
+    when interrupted. A flat file whose sharded copy was written meanwhile is removed.
+    """
+    driver = container.driver
+    if not isinstance(driver, ShardedLocalStorageDriver):
+        raise TypeError("reshard_container requires a ShardedLocalStorageDriver")
+
+    container_path = container.get_cdn_url()
+    moved = 0
+    for folder, _, files in os.walk(container_path, topdown=False):
+        for name in files:
+            path = os.path.join(folder, name)
+            object_name = os.path.relpath(path, container_path).replace(os.sep, "/")
+            if _is_ignored(object_name) or get_object_name(
+                object_name, driver.shard_depth
+            ):
+                continue
+
+            shard_path = driver.get_object_path(container, object_name)
+            with driver._lock_cls(shard_path):  # type:ignore[no-untyped-call]
+                if os.path.exists(shard_path):
+                    os.unlink(path)
+                    continue
+                os.makedirs(os.path.dirname(shard_path), exist_ok=True)
+                os.replace(path, shard_path)
+            moved += 1
+
+        if folder != container_path:
+            # kept when a file was written into it meanwhile
+            with contextlib.suppress(OSError):
+                os.rmdir(folder)
+    return moved
+
+
+def _is_ignored(object_name: str) -> bool:
+    folder = object_name.split("/", 1)[0]
+    return "/" in object_name and (
+        folder in IGNORE_FOLDERS or folder == LOCAL_LOCKS_DIRECTORY
+    )
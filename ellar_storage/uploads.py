@@ -0,0 +1,195 @@
+import base64
+import re
+import typing as t
+from urllib.parse import unquote
+
+from ellar_storage.exceptions import MultipartError, UploadTooLargeError
+
+# upper bound of the headers block of a multipart part
+MAX_PART_HEADERS_SIZE = 16 * 1024
+
+_HEADER_PARAM = re.compile(
+    r';\s*([\w!#$%&\'*+.^`|~-]+\*?)\s*=\s*("(?:[^"\\]|\\.)*"|[^;]*)'
+)
+
+
+async def limit_stream(
+    stream: t.AsyncIterator[bytes], max_size: int
+) -> t.AsyncIterator[bytes]:
+    """Yields `stream` chunks, raising `UploadTooLargeError` past `max_size` bytes"""
+    received = 0
+    async for chunk in stream:
+        received += len(chunk)
+        if received > max_size:
+            raise UploadTooLargeError(f"Upload exceeds {max_size} bytes")
+        yield chunk
+
+
+def get_multipart_boundary(content_type: t.Optional[str]) -> t.Optional[bytes]:
+    """Returns the boundary of a `multipart/form-data` content type, if it's one"""
+    if not content_type:
+        return None
+    media_type, params = _parse_header(content_type)
+    if media_type != "multipart/form-data" or not params.get("boundary"):
+        return None
+    return params["boundary"].encode("latin-1")
+
+
+def parse_upload_metadata(header: str) -> t.Dict[str, str]:
+    """
+    Parses a tus `Upload-Metadata` header, comma separated keys with base64 encoded values,
+    eg `filename dmlkZW8ubXA0,content_type dmlkZW8vbXA0`.
+
+    Raises `ValueError` on invalid base64 or UTF-8 values.
+    """
+    metadata = {}
+    for pair in header.split(","):
+        key, _, value = pair.strip().partition(" ")
+        if key:
+            metadata[key] = base64.b64decode(value.strip(), validate=True).decode()
+    return metadata
+
+
+class MultipartFileStream:
+    """
+    Incremental `multipart/form-data` parser streaming the content of the first file field.
+
+    Nothing is spooled: part content is yielded as request body chunks arrive,
+    keeping only a boundary-sized tail buffered.
+
+    Usage:
+        file_stream = MultipartFileStream(request.stream(), boundary)
+        if await file_stream.find_file():
+            await storage_service.save_stream_async(file_stream, file_stream.filename)
+    """
+
+    __slots__ = (
+        "filename",
+        "content_type",
+        "field_name",
+        "_stream",
+        "_delimiter",
+        "_buffer",
+        "_consumed",
+    )
+
+    def __init__(self, stream: t.AsyncIterator[bytes], boundary: bytes) -> None:
+        self.filename: t.Optional[str] = None
+        self.content_type: t.Optional[str] = None
+        self.field_name: t.Optional[str] = None
+        self._stream = stream.__aiter__()
+        self._delimiter = b"\r\n--" + boundary
+        # the body starts with the delimiter, without the leading CRLF
+        self._buffer = bytearray(b"\r\n")
+        self._consumed = False
+
+    async def find_file(self) -> bool:
+        """Moves to the next file field, returns `False` when the body has none"""
+        while True:
+            if not await self._skip_to_delimiter():
+                return False
+            while len(self._buffer) < 2:
+                if not await self._receive():
+                    raise MultipartError("Unexpected end of multipart body")
+            if self._buffer.startswith(b"--"):
+                # closing delimiter
+                return False
+            if not await self._read_until(b"\r\n", MAX_PART_HEADERS_SIZE):
+                raise MultipartError("Malformed multipart delimiter line")
+            del self._buffer[: self._buffer.index(b"\r\n") + 2]
+
+            headers = await self._read_part_headers()
+            disposition, params = _parse_header(headers.get("content-disposition", ""))
+            if disposition != "form-data":
+                raise MultipartError("Missing form-data Content-Disposition")
+            if "filename" in params:
+                self.filename = params["filename"]
+                self.field_name = params.get("name")
+                self.content_type = headers.get(
+                    "content-type", "application/octet-stream"
+                )
+                self._consumed = False
+                return True
+
+    def __aiter__(self) -> t.AsyncIterator[bytes]:
+        return self._iter_part()
+
+    async def _iter_part(self) -> t.AsyncIterator[bytes]:
+        if self._consumed:  # pragma: no cover
+            raise RuntimeError("Multipart part has already been consumed")
+        self._consumed = True
+
+        keep = len(self._delimiter) - 1
+        while True:
+            index = self._buffer.find(self._delimiter)
+            if index >= 0:
+                if index:
+                    yield bytes(self._buffer[:index])
+                del self._buffer[:index]
+                return
+
+            if len(self._buffer) > keep:
+                # the tail may hold the start of the delimiter
+                yield bytes(self._buffer[:-keep])
+                del self._buffer[:-keep]
+
+            if not await self._receive():
+                raise MultipartError("Unexpected end of multipart body")
+
+    async def _skip_to_delimiter(self) -> bool:
+        keep = len(self._delimiter) - 1
+        while True:
+            index = self._buffer.find(self._delimiter)
+            if index >= 0:
+                del self._buffer[: index + len(self._delimiter)]
+                return True
+            if len(self._buffer) > keep:
+                del self._buffer[:-keep]
+            if not await self._receive():
+                return False
+
+    async def _read_part_headers(self) -> t.Dict[str, str]:
+        if not await self._read_until(b"\r\n\r\n", MAX_PART_HEADERS_SIZE):
+            raise MultipartError("Multipart part headers are too large or truncated")
+
+        end = self._buffer.index(b"\r\n\r\n")
+        raw_headers = bytes(self._buffer[:end]).decode("utf-8", errors="replace")
+        del self._buffer[: end + 4]
+
+        headers = {}
+        for line in raw_headers.split("\r\n"):
+            name, sep, value = line.partition(":")
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        return headers
+
+    async def _read_until(self, marker: bytes, max_size: int) -> bool:
+        while marker not in self._buffer:
+            if len(self._buffer) > max_size or not await self._receive():
+                return False
+        return True
+
+    async def _receive(self) -> bool:
+        try:
+            chunk = await self._stream.__anext__()
+        except StopAsyncIteration:
+            return False
+        self._buffer.extend(chunk)
+        return True
+
+
+def _parse_header(value: str) -> t.Tuple[str, t.Dict[str, str]]:
+    main, _, rest = value.partition(";")
+    params: t.Dict[str, str] = {}
+    for name, param in _HEADER_PARAM.findall(";" + rest):
+        name = name.lower()
+        param = param.strip()
+        if param.startswith('"'):
+            param = re.sub(r"\\(.)", r"\1", param[1:-1])
+        if name.endswith("*"):
+            # RFC 5987, eg filename*=UTF-8''na%C3%AFve.txt
+            charset, _, encoded = param.partition("''")
+            params[name[:-1]] = unquote(encoded, encoding=charset or "utf-8")
+            continue
+        params.setdefault(name, param)
+    return main.strip().lower(), params
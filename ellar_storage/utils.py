@@ -3,6 +3,8 @@ import typing as t
 from tempfile import SpooledTemporaryFile
 
 from ellar_storage.constants import IN_MEMORY_FILESIZE
+from ellar_storage.exceptions import ObjectDoesNotExistError
+from ellar_storage.storage import Object
 
 
 def get_metadata_file_obj(
@@ -12,3 +14,22 @@ def get_metadata_file_obj(
     f.write(json.dumps(metadata).encode())
     f.seek(0)
     return f
+
+
+def load_local_metadata(obj: Object) -> t.Dict[str, t.Any]:
+    """Retrieve metadata from the `.metadata.json` file associated with `obj`"""
+    try:
+        metadata_obj = obj.container.get_object(f"{obj.name}.metadata.json")
+        with open(metadata_obj.get_cdn_url()) as metadata_file:
+            return t.cast(t.Dict[str, t.Any], json.load(metadata_file))
+    except ObjectDoesNotExistError:  # pragma: no cover
+        return {}
+
+
+def load_remote_checksums(obj: Object) -> t.Dict[str, str]:
+    """Retrieve checksums from the `.checksums.json` object associated with `obj`"""
+    try:
+        checksums_obj = obj.container.get_object(f"{obj.name}.checksums.json")
+    except ObjectDoesNotExistError:
+        return {}
+    return t.cast(t.Dict[str, str], json.loads(b"".join(checksums_obj.as_stream())))
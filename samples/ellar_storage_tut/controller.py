@@ -35,7 +35,7 @@ class FileManagerController(ControllerBase):
     @file(media_type="application/octet-stream", streaming=True)
     def download_file(self, path: Query[str]):
         res = self._storage_service.get(path)
-        return {"media_type": res.content_type, "content": res.as_stream()}
+        return {"media_type": res.content_type, "content": res.aiter_stream()}
 
     @get("/download_as_attachment")
     @file(media_type="application/octet-stream")
@@ -0,0 +1,58 @@
+import json
+
+from benchmarks.__main__ import main, parse_size
+from benchmarks.backends import fake_s3_backend, local_backend
+from benchmarks.runner import BenchmarkCase, run_case
+
+
+def test_parse_size():
+    assert parse_size("1KB") == 1024
+    assert parse_size("1.5mb") == 1536 * 1024
+    assert parse_size("1GB") == 1024**3
+    assert parse_size("100") == 100
+
+
+def test_run_case():
+    for backend, factory in (("local", local_backend), ("fake-s3", fake_s3_backend(0))):
+        results = run_case(
+            BenchmarkCase(backend, factory, size=2048, concurrency=2, operations=2),
+            ["sync", "async", "controller"],
+        )
+        assert [(result.api, result.operation) for result in results] == [
+            ("sync", "save"),
+            ("sync", "get"),
+            ("sync", "stream"),
+            ("sync", "delete"),
+            ("async", "save"),
+            ("async", "get"),
+            ("async", "stream"),
+            ("async", "delete"),
+            ("controller", "download"),
+            ("controller", "download_range"),
+        ]
+        assert all(result.operations == 2 for result in results)
+        assert results[0].throughput == 4096 / results[0].seconds
+
+
+def test_run_and_compare(tmp_path, capsys):
+    output = str(tmp_path / "results.json")
+    assert (
+        main(
+            [
+                "--backends=local,moto",
+                "--apis=sync",
+                "--sizes=1KB",
+                "--concurrency=1",
+                "--repeat=2",
+                f"--output={output}",
+            ]
+        )
+        == 0
+    )
+    with open(output) as file:
+        report = json.load(file)
+    assert report["parameters"]["sizes"] == [1024]
+    assert {result["backend"] for result in report["results"]} >= {"local"}
+
+    assert main(["compare", output, output]) == 0
+    assert "local       sync           save" in capsys.readouterr().out
@@ -0,0 +1,73 @@
+import os.path
+import time
+
+from ellar.common.datastructures import ContentFile
+from ellar.testing import Test
+
+from ellar_storage import Provider, StorageModule, StorageService, get_driver
+from ellar_storage.cache import MetadataCache
+
+from .utils import DUMB_DIRS
+
+
+def test_metadata_cache_lru_eviction():
+    cache = MetadataCache(max_size=2)
+    cache.set("files", "a.txt", "v1", {"filename": "a.txt"})
+    cache.set("files", "b.txt", "v1", {"filename": "b.txt"})
+
+    assert cache.get("files", "a.txt", "v1") == {"filename": "a.txt"}
+    cache.set("files", "c.txt", "v1", {"filename": "c.txt"})
+
+    assert len(cache) == 2
+    assert cache.get("files", "b.txt", "v1") is None
+    assert cache.get("files", "a.txt", "v1") == {"filename": "a.txt"}
+
+
+def test_metadata_cache_version_and_ttl():
+    cache = MetadataCache(ttl=0.05)
+    cache.set("files", "a.txt", "v1", {"filename": "a.txt"})
+
+    assert cache.get("files", "a.txt", "v2") is None
+    assert cache.get("files", "a.txt", "v1") is None
+
+    cache.set("files", "a.txt", "v1", {"filename": "a.txt"})
+    time.sleep(0.06)
+    assert cache.get("files", "a.txt", "v1") is None
+
+
+def test_storage_service_metadata_cache(clear_dir):
+    tm = Test.create_test_module(
+        modules=[StorageModule.register_setup()],
+        config_module={
+            "STORAGE_CONFIG": {
+                "storages": {
+                    "files": {
+                        "driver": get_driver(Provider.LOCAL),
+                        "options": {"key": os.path.join(DUMB_DIRS, "fixtures")},
+                    },
+                },
+                "metadata_cache": {"max_size": 10},
+            }
+        },
+    )
+    storage_service: StorageService = tm.get(StorageService)
+    cache = storage_service.metadata_cache
+    assert isinstance(cache, MetadataCache)
+
+    storage_service.save(ContentFile(b"File saving worked", name="get.txt"))
+    assert len(cache) == 1
+
+    # the sidecar is not read back as long as the cached version matches
+    os.remove(os.path.join(DUMB_DIRS, "fixtures", "files", "get.txt.metadata.json"))
+    assert storage_service.get("get.txt").filename == "get.txt"
+    assert cache.hits == 1
+
+    storage_service.save_content(
+        name="get.txt",
+        content=iter([b"overwritten"]),
+        metadata={"filename": "renamed.txt", "content_type": "text/plain"},
+    )
+    assert storage_service.get("get.txt").filename == "renamed.txt"
+
+    assert storage_service.delete("get.txt")
+    assert len(cache) == 0
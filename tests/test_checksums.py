@@ -0,0 +1,96 @@
+import hashlib
+import os.path
+
+import pytest
+from ellar.common.datastructures import ContentFile
+
+from ellar_storage.checksums import ChecksumHasher, is_crc32c_available
+from ellar_storage.exceptions import ObjectHashMismatchError
+
+from .utils import TEST_FIXTURES_DIRS, get_storage_service
+
+CONTENT = b"File saving worked"
+
+
+def test_checksum_hasher():
+    hasher = ChecksumHasher(["md5", "sha256"])
+    assert b"".join(hasher.wrap(iter([b"File ", b"saving worked"]))) == CONTENT
+    assert hasher.hexdigests() == {
+        "md5": hashlib.md5(CONTENT).hexdigest(),
+        "sha256": hashlib.sha256(CONTENT).hexdigest(),
+    }
+
+
+def test_checksum_hasher_crc32c():
+    pytest.importorskip("crc32c")
+    hasher = ChecksumHasher(["crc32c"])
+    hasher.update(b"123456789")
+    # CRC-32C check value
+    assert hasher.hexdigests() == {"crc32c": "e3069283"}
+
+
+def test_checksums_computed_on_save(clear_dir):
+    storage_service = get_storage_service(checksums={"algorithms": ["md5", "sha256"]})
+    expected = {
+        "md5": hashlib.md5(CONTENT).hexdigest(),
+        "sha256": hashlib.sha256(CONTENT).hexdigest(),
+    }
+
+    stored_file = storage_service.save(ContentFile(CONTENT, name="get.txt"))
+    assert stored_file.checksums == expected
+    assert stored_file.filename == "get.txt"
+
+    stored_file = storage_service.get("files/get.txt")
+    assert stored_file.checksums == expected
+    assert stored_file.content_type == "text/plain"
+
+    content_path = os.path.join(TEST_FIXTURES_DIRS, "test.txt")
+    with open(content_path, "rb") as content_file:
+        content = content_file.read()
+    stored_file = storage_service.save_content("test.txt", content_path=content_path)
+    assert stored_file.read() == content
+    assert storage_service.get("files/test.txt").checksums == {
+        "md5": hashlib.md5(content).hexdigest(),
+        "sha256": hashlib.sha256(content).hexdigest(),
+    }
+
+
+@pytest.mark.asyncio
+async def test_checksums_computed_on_async_save(clear_dir):
+    storage_service = get_storage_service(checksums={})
+
+    async def _stream():
+        yield CONTENT
+
+    await storage_service.save_stream_async(_stream(), filename="get.txt")
+    stored_file = await storage_service.get_async("files/get.txt")
+    assert stored_file.checksums == {"sha256": hashlib.sha256(CONTENT).hexdigest()}
+
+
+def test_checksums_verified_on_read(clear_dir):
+    storage_service = get_storage_service(checksums={"verify": True})
+    stored_file = storage_service.save(ContentFile(CONTENT, name="get.txt"))
+    assert storage_service.get("files/get.txt").read() == CONTENT
+
+    # same size, different content
+    with open(stored_file.get_local_path(), "wb") as corrupted:
+        corrupted.write(b"File saving failed")
+
+    with pytest.raises(ObjectHashMismatchError):
+        storage_service.get("files/get.txt").read()
+    with pytest.raises(ObjectHashMismatchError):
+        list(storage_service.get("files/get.txt").as_stream())
+
+    # partial reads can't be verified
+    assert storage_service.get("files/get.txt").read(4) == b"File"
+
+    assert (
+        get_storage_service(checksums={}).get("files/get.txt").read()
+        == b"File saving failed"
+    )
+
+
+@pytest.mark.skipif(is_crc32c_available(), reason="crc32c is installed")
+def test_crc32c_requires_package():
+    with pytest.raises(ValueError, match="require the `crc32c` package"):
+        get_storage_service(checksums={"algorithms": ["crc32c"]})
@@ -0,0 +1,168 @@
+import gzip
+import hashlib
+
+import pytest
+from ellar.common.datastructures import ContentFile
+from ellar.testing import Test
+
+from ellar_storage import StorageModule, StorageService
+from ellar_storage.compression import (
+    compress_stream,
+    decompress_stream,
+    is_compressible,
+)
+from ellar_storage.responses import accepts_encoding
+
+from .utils import get_storage, get_storage_service
+
+CONTENT = b'{"name": "document", "values": [1, 2, 3]}\n' * 100
+
+
+def _save_json(storage_service, name="data.json"):
+    return storage_service.save_content(
+        name,
+        content=iter([CONTENT[:1000], CONTENT[1000:]]),
+        metadata={"content_type": "application/json", "filename": name},
+    )
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_compress_stream(encoding):
+    if encoding == "zstd":
+        pytest.importorskip("zstandard")
+
+    compressed = b"".join(compress_stream(iter([CONTENT[:10], CONTENT[10:]]), encoding))
+    assert len(compressed) < len(CONTENT)
+    assert b"".join(decompress_stream(iter([compressed]), encoding)) == CONTENT
+
+    with pytest.raises(ValueError, match="Unsupported content encoding"):
+        list(decompress_stream(iter([compressed]), "br"))
+
+
+def test_is_compressible():
+    patterns = ["text/*", "application/json"]
+    assert is_compressible("text/csv; charset=utf-8", patterns)
+    assert is_compressible("Application/JSON", patterns)
+    assert not is_compressible("image/png", patterns)
+    assert not is_compressible(None, patterns)
+
+
+def test_accepts_encoding():
+    assert accepts_encoding("gzip, deflate", "gzip")
+    assert accepts_encoding("x-gzip", "gzip")
+    assert accepts_encoding("*", "zstd")
+    assert not accepts_encoding("gzip;q=0, *", "gzip")
+    assert not accepts_encoding("br, *;q=0", "zstd")
+    assert not accepts_encoding("identity", "gzip")
+    assert not accepts_encoding(None, "gzip")
+
+
+def test_save_content_compresses(clear_dir):
+    storage_service = get_storage_service(compression={})
+    stored_file = _save_json(storage_service)
+
+    with open(stored_file.get_local_path(), "rb") as file:
+        assert gzip.decompress(file.read()) == CONTENT
+    assert stored_file.size < len(CONTENT)
+    assert stored_file.metadata["content_encoding"] == "gzip"
+
+    stored_file = storage_service.get("files/data.json")
+    assert stored_file.content_encoding == "gzip"
+    assert stored_file.filename == "data.json"
+    assert stored_file.read() == CONTENT
+    stored_file.seek(0)
+    assert stored_file.read(10) == CONTENT[:10]
+    assert b"".join(stored_file.range_as_stream(1990, 2010)) == CONTENT[1990:2010]
+    assert gzip.decompress(b"".join(stored_file.as_raw_stream())) == CONTENT
+
+    # other content types are stored as is
+    image = storage_service.save_content(
+        "get.png", content=iter([b"image"]), metadata={"content_type": "image/png"}
+    )
+    assert image.content_encoding is None
+    with open(image.get_local_path(), "rb") as file:
+        assert file.read() == b"image"
+
+
+def test_save_content_keeps_caller_extra(clear_dir):
+    storage_service = get_storage_service(compression={}, checksums={})
+    extra = {"content_type": "application/json", "meta_data": {"filename": "a.json"}}
+    stored_file = storage_service.save_content(
+        "data.json", content=iter([CONTENT]), extra=extra
+    )
+    assert stored_file.content_encoding == "gzip"
+    assert extra == {
+        "content_type": "application/json",
+        "meta_data": {"filename": "a.json"},
+    }
+
+
+def test_save_content_zstd(clear_dir):
+    pytest.importorskip("zstandard")
+    storage_service = get_storage_service(
+        compression={"codec": "zstd", "level": 10, "content_types": ["text/*"]}
+    )
+    stored_file = storage_service.save(ContentFile(CONTENT, name="data.txt"))
+    assert stored_file.content_encoding == "zstd"
+    assert stored_file.size < len(CONTENT)
+    assert storage_service.get("files/data.txt").read() == CONTENT
+
+
+def test_compression_with_checksums(clear_dir):
+    storage_service = get_storage_service(compression={}, checksums={"verify": True})
+    stored_file = _save_json(storage_service)
+
+    # digests of the stored bytes, verified before decompression
+    raw = b"".join(stored_file.as_raw_stream())
+    assert stored_file.checksums["sha256"] == hashlib.sha256(raw).hexdigest()
+    assert storage_service.get("files/data.json").read() == CONTENT
+
+
+@pytest.mark.asyncio
+async def test_save_content_async_compresses(clear_dir):
+    storage_service = get_storage_service(compression={})
+
+    async def _stream():
+        yield CONTENT[:1000]
+        yield CONTENT[1000:]
+
+    stored_file = await storage_service.save_stream_async(
+        _stream(), filename="data.csv", content_type="text/csv"
+    )
+    assert stored_file.content_encoding == "gzip"
+    assert stored_file.read() == CONTENT
+
+
+def test_storage_controller_compressed_download(clear_dir):
+    tm = Test.create_test_module(
+        modules=[StorageModule.setup(files=get_storage(compression={}))]
+    )
+    storage_service: StorageService = tm.get(StorageService)
+    stored_file = _save_json(storage_service)
+
+    client = tm.get_test_client()
+    url = tm.create_application().url_path_for(
+        "storage:download", path="files/data.json"
+    )
+
+    res = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert res.status_code == 200
+    assert res.headers["content-encoding"] == "gzip"
+    assert res.headers["vary"] == "Accept-Encoding"
+    assert res.headers["content-length"] == str(stored_file.size)
+    assert res.headers["etag"] == stored_file.etag
+    # decoded by the client
+    assert res.content == CONTENT
+
+    res = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert res.status_code == 200
+    assert "content-encoding" not in res.headers
+    assert res.headers["etag"] == f"W/{stored_file.etag}"
+    assert res.headers["content-type"].startswith("application/json")
+    assert res.content == CONTENT
+
+    res = client.get(
+        url,
+        headers={"Accept-Encoding": "identity", "If-None-Match": stored_file.etag},
+    )
+    assert res.status_code == 304
@@ -0,0 +1,156 @@
+import hashlib
+import os.path
+
+import pytest
+from ellar.common.datastructures import ContentFile
+
+from ellar_storage.content_addressed import ContentRefs, spool_and_hash
+from ellar_storage.exceptions import ObjectDoesNotExistError
+
+from .utils import FILES_DIR, TEST_FIXTURES_DIRS, get_storage_service
+
+
+def _refs(storage_service, digest):
+    return ContentRefs(storage_service.get_container("files")).get(digest)
+
+
+def test_spool_and_hash():
+    digest, spooled = spool_and_hash(iter([b"abc", b"def"]), "sha256")
+    with spooled:
+        assert digest == hashlib.sha256(b"abcdef").hexdigest()
+        assert spooled.read() == b"abcdef"
+
+
+def test_content_addressed_save_deduplicates(clear_dir):
+    storage_service = get_storage_service(content_addressed={}, images=True)
+    digest = hashlib.sha256(b"same content").hexdigest()
+
+    first = storage_service.save(ContentFile(b"same content", name="a.txt"))
+    second = storage_service.save_content(
+        "b.txt", content=iter([b"same ", b"content"]), metadata={"filename": "b.txt"}
+    )
+
+    assert first.name == second.name == digest
+    assert first.filename == "a.txt"
+    # metadata of the first upload is kept
+    assert storage_service.get(f"files/{digest}").filename == "a.txt"
+    assert _refs(storage_service, digest) == 2
+
+    other = storage_service.save(ContentFile(b"other content", name="a.txt"))
+    assert other.name == hashlib.sha256(b"other content").hexdigest()
+    assert _refs(storage_service, other.name) == 1
+
+    assert storage_service.delete(f"files/{digest}")
+    assert storage_service.get(f"files/{digest}").read() == b"same content"
+    assert _refs(storage_service, digest) == 1
+
+    assert storage_service.delete(f"files/{digest}")
+    with pytest.raises(ObjectDoesNotExistError):
+        storage_service.get(f"files/{digest}")
+    assert _refs(storage_service, digest) == 0
+    assert not any(name.startswith(digest) for name in os.listdir(FILES_DIR))
+    # lock files are removed with the last reference
+    assert os.listdir(os.path.join(FILES_DIR, ".locks")) == [f"{other.name}.lock"]
+
+    with pytest.raises(ObjectDoesNotExistError):
+        storage_service.delete(f"files/{digest}")
+
+
+@pytest.mark.asyncio
+async def test_content_addressed_delete_files_saved_before(clear_dir):
+    for name in ("notes.txt", "other.txt", "async.txt"):
+        get_storage_service().save(ContentFile(b"plain content", name=name))
+    storage_service = get_storage_service(content_addressed={})
+
+    # files saved before the mode was enabled aren't reference counted
+    assert storage_service.delete("files/notes.txt")
+    assert storage_service.delete_many(["files/other.txt"])[0].value is True
+    assert await storage_service.delete_async("files/async.txt")
+    assert sorted(os.listdir(FILES_DIR)) == [".locks"]
+    with pytest.raises(ObjectDoesNotExistError):
+        storage_service.delete("files/notes.txt")
+
+
+def test_content_addressed_delete_lazy_storage(clear_dir):
+    storage_service = get_storage_service(content_addressed={}, images=True)
+    digest = storage_service.save(ContentFile(b"same content", name="a.txt")).name
+    storage_service.save(ContentFile(b"same content", name="b.txt"))
+    assert _refs(storage_service, digest) == 2
+
+    # the first use of a lazy storage releases a reference
+    assert get_storage_service(
+        content_addressed={}, images=True, setup={"initialization": "lazy"}
+    ).delete(f"files/{digest}")
+    assert storage_service.get(f"files/{digest}").read() == b"same content"
+    assert _refs(storage_service, digest) == 1
+
+    results = get_storage_service(
+        content_addressed={}, images=True, setup={"initialization": "lazy"}
+    ).delete_many([f"files/{digest}"])
+    assert results[0].ok
+    assert _refs(storage_service, digest) == 0
+    with pytest.raises(ObjectDoesNotExistError):
+        storage_service.get(f"files/{digest}")
+
+
+def test_content_addressed_content_path_and_algorithm(clear_dir):
+    storage_service = get_storage_service(
+        content_addressed={"algorithm": "md5"}, images=True
+    )
+    content_path = os.path.join(TEST_FIXTURES_DIRS, "test.txt")
+    with open(content_path, "rb") as content_file:
+        content = content_file.read()
+
+    from_path = storage_service.save_content("test.txt", content_path=content_path)
+    from_stream = storage_service.save_content("copy.txt", content=iter([content]))
+
+    assert from_path.name == from_stream.name == hashlib.md5(content).hexdigest()
+    assert _refs(storage_service, from_path.name) == 2
+
+    results = storage_service.delete_many([f"files/{from_path.name}"] * 2)
+    assert all(result.ok for result in results)
+    assert _refs(storage_service, from_path.name) == 0
+
+    # other storages keep naming objects after the file name
+    assert (
+        storage_service.save(
+            ContentFile(b"content", name="a.txt"), upload_storage="images"
+        ).name
+        == "a.txt"
+    )
+
+
+@pytest.mark.asyncio
+async def test_content_addressed_async(clear_dir):
+    storage_service = get_storage_service(content_addressed={}, images=True)
+    digest = hashlib.sha256(b"async content").hexdigest()
+
+    async def _stream():
+        yield b"async "
+        yield b"content"
+
+    first = await storage_service.save_stream_async(_stream(), filename="a.txt")
+    second = await storage_service.save_content_async(
+        "b.txt", content=iter([b"async content"])
+    )
+    assert first.name == second.name == digest
+
+    assert await storage_service.delete_async(f"files/{digest}")
+    assert (await storage_service.get_async(f"files/{digest}")).read() == (
+        b"async content"
+    )
+    assert await storage_service.delete_async(f"files/{digest}")
+    with pytest.raises(ObjectDoesNotExistError):
+        await storage_service.get_async(f"files/{digest}")
+
+
+def test_save_without_filename_uses_unique_names(clear_dir):
+    storage_service = get_storage_service(content_addressed={}, images=True)
+    names = {
+        storage_service.save(
+            ContentFile(content, name=None), upload_storage="images"
+        ).name
+        for content in (b"a", b"b")
+    }
+    assert len(names) == 2
+    assert all(len(name) == 32 for name in names)
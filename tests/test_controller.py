@@ -1,9 +1,26 @@
+import os.path
+from urllib.parse import quote
+
+import pytest
 from ellar.common.datastructures import ContentFile
 from ellar.testing import Test
 
-from ellar_storage import StorageService
+from ellar_storage import (
+    Provider,
+    StorageModule,
+    StorageService,
+    StorageSetup,
+    get_driver,
+)
+from ellar_storage.responses import (
+    ByteRange,
+    RangeNotSatisfiable,
+    get_content_disposition,
+    parse_range_header,
+)
 
 from .test_service import module_config
+from .utils import DUMB_DIRS
 
 
 def test_storage_controller_download_file(clear_dir):
@@ -39,3 +56,365 @@ def test_storage_controller_download_file(clear_dir):
         )
     )
     assert res.status_code == 404
+
+
+def test_storage_controller_download_file_range(clear_dir):
+    tm = Test.create_test_module(**module_config)
+    storage_service: StorageService = tm.get(StorageService)
+    storage_service.save(ContentFile(b"0123456789abcdefghij", name="range.txt"))
+
+    client = tm.get_test_client()
+    url = tm.create_application().url_path_for(
+        "storage:download", path="files/range.txt"
+    )
+
+    res = client.get(url, headers={"Range": "bytes=2-5"})
+    assert res.status_code == 206
+    assert res.content == b"2345"
+    assert res.headers["content-range"] == "bytes 2-5/20"
+    assert res.headers["content-length"] == "4"
+    assert res.headers["accept-ranges"] == "bytes"
+
+    res = client.get(url, headers={"Range": "bytes=-3"})
+    assert res.status_code == 206
+    assert res.content == b"hij"
+
+    res = client.get(url, headers={"Range": "bytes=15-"})
+    assert res.status_code == 206
+    assert res.content == b"fghij"
+
+    res = client.get(url, headers={"Range": "bytes=50-60"})
+    assert res.status_code == 416
+    assert res.headers["content-range"] == "bytes */20"
+
+    res = client.get(url, headers={"Range": "lines=1-2"})
+    assert res.status_code == 200
+    assert res.content == b"0123456789abcdefghij"
+
+
+@pytest.mark.parametrize("filename", ["résumé.txt", "报告.txt"])
+def test_storage_controller_download_non_ascii_filename(clear_dir, filename):
+    tm = Test.create_test_module(**module_config)
+    storage_service: StorageService = tm.get(StorageService)
+    storage_service.save(ContentFile(b"0123456789", name=filename))
+
+    client = tm.get_test_client()
+    url = tm.create_application().url_path_for(
+        "storage:download", path=f"files/{filename}"
+    )
+    disposition = f"attachment; filename*=utf-8''{quote(filename)}"
+
+    res = client.get(url, headers={"Range": "bytes=0-3"})
+    assert res.status_code == 206
+    assert res.content == b"0123"
+    assert res.headers["content-disposition"] == disposition
+
+    res = client.get(url)
+    assert res.status_code == 200
+    assert res.headers["content-disposition"] == disposition
+
+
+def test_get_content_disposition():
+    assert (
+        get_content_disposition("a b.txt") == "attachment; filename*=utf-8''a%20b.txt"
+    )
+    assert get_content_disposition("a.txt") == 'attachment; filename="a.txt"'
+    assert (
+        get_content_disposition('a".txt', "inline")
+        == "inline; filename*=utf-8''a%22.txt"
+    )
+
+
+def test_storage_controller_download_file_multi_range(clear_dir):
+    tm = Test.create_test_module(**module_config)
+    storage_service: StorageService = tm.get(StorageService)
+    storage_service.save(ContentFile(b"0123456789abcdefghij", name="range.txt"))
+
+    url = tm.create_application().url_path_for(
+        "storage:download", path="files/range.txt"
+    )
+    res = tm.get_test_client().get(url, headers={"Range": "bytes=0-1, 10-12"})
+
+    assert res.status_code == 206
+    content_type, boundary = res.headers["content-type"].split("; boundary=")
+    assert content_type == "multipart/byteranges"
+    assert int(res.headers["content-length"]) == len(res.content)
+
+    parts = res.content.split(f"--{boundary}".encode())
+    assert parts[0] == b""
+    assert parts[-1] == b"--\r\n"
+    assert parts[1].endswith(b"Content-Range: bytes 0-1/20\r\n\r\n01\r\n")
+    assert parts[2].endswith(b"Content-Range: bytes 10-12/20\r\n\r\nabc\r\n")
+
+
+def test_parse_range_header():
+    assert parse_range_header("bytes=0-4,2-8,20-", 100) == [
+        ByteRange(0, 8),
+        ByteRange(20, 99),
+    ]
+    assert parse_range_header("bytes=5-1", 100) is None
+    assert parse_range_header("bytes=abc", 100) is None
+
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header("bytes=100-", 100)
+
+
+def test_storage_controller_x_accel_redirect(clear_dir):
+    tm = Test.create_test_module(
+        modules=[
+            StorageModule.setup(
+                files={
+                    "driver": get_driver(Provider.LOCAL),
+                    "options": {"key": os.path.join(DUMB_DIRS, "fixtures")},
+                },
+                serving={
+                    "strategy": "x-accel-redirect",
+                    "locations": {os.path.join(DUMB_DIRS, "fixtures"): "/protected/"},
+                },
+            )
+        ]
+    )
+    storage_service: StorageService = tm.get(StorageService)
+    storage_service.save(ContentFile(b"File saving worked", name="my file.txt"))
+
+    url = tm.create_application().url_path_for(
+        "storage:download", path="files/my file.txt"
+    )
+    res = tm.get_test_client().get(url)
+
+    assert res.status_code == 200
+    assert res.content == b""
+    assert res.headers["x-accel-redirect"] == "/protected/files/my%20file.txt"
+    assert res.headers["content-type"].startswith("text/plain")
+
+
+def test_storage_controller_x_sendfile(clear_dir):
+    tm = Test.create_test_module(
+        modules=[
+            StorageModule.setup(
+                files={
+                    "driver": get_driver(Provider.LOCAL),
+                    "options": {"key": os.path.join(DUMB_DIRS, "fixtures")},
+                },
+                serving={"strategy": "x-sendfile"},
+            )
+        ]
+    )
+    storage_service: StorageService = tm.get(StorageService)
+    stored_file = storage_service.save(ContentFile(b"File saving", name="get.txt"))
+
+    url = tm.create_application().url_path_for("storage:download", path="files/get.txt")
+    res = tm.get_test_client().get(url)
+
+    assert res.status_code == 200
+    assert res.content == b""
+    assert res.headers["x-sendfile"] == os.path.abspath(stored_file.get_local_path())
+
+
+@pytest.mark.parametrize("strategy", ["x-sendfile", "x-accel-redirect"])
+def test_storage_controller_offload_non_ascii_filename(clear_dir, strategy):
+    tm = Test.create_test_module(
+        modules=[
+            StorageModule.setup(
+                files={
+                    "driver": get_driver(Provider.LOCAL),
+                    "options": {"key": os.path.join(DUMB_DIRS, "fixtures")},
+                },
+                serving={
+                    "strategy": strategy,
+                    "locations": {os.path.join(DUMB_DIRS, "fixtures"): "/protected/"},
+                },
+            )
+        ]
+    )
+    storage_service: StorageService = tm.get(StorageService)
+    storage_service.save(ContentFile(b"File saving", name="résumé.txt"))
+
+    url = tm.create_application().url_path_for(
+        "storage:download", path="files/résumé.txt"
+    )
+    res = tm.get_test_client().get(url)
+
+    assert res.status_code == 200
+    assert res.headers["content-disposition"] == (
+        "attachment; filename*=utf-8''r%C3%A9sum%C3%A9.txt"
+    )
+    if strategy == "x-sendfile":
+        # the path can't be sent in a header, the application sends the file
+        assert "x-sendfile" not in res.headers
+        assert res.content == b"File saving"
+    else:
+        assert (
+            res.headers["x-accel-redirect"] == "/protected/files/r%C3%A9sum%C3%A9.txt"
+        )
+
+
+def test_serving_setup_requires_locations_for_x_accel_redirect():
+    with pytest.raises(ValueError, match="requires `locations`"):
+        StorageSetup(
+            storages={
+                "files": {
+                    "driver": get_driver(Provider.LOCAL),
+                    "options": {"key": "a/path/for/files"},
+                }
+            },
+            serving={"strategy": "x-accel-redirect"},
+        )
+
+
+def test_storage_controller_conditional_get(clear_dir):
+    tm = Test.create_test_module(
+        modules=[
+            StorageModule.setup(
+                files={
+                    "driver": get_driver(Provider.LOCAL),
+                    "options": {"key": os.path.join(DUMB_DIRS, "fixtures")},
+                },
+                serving={"cache_control": "public, max-age=3600"},
+            )
+        ]
+    )
+    storage_service: StorageService = tm.get(StorageService)
+    stored_file = storage_service.save(
+        ContentFile(b"0123456789", name="conditional.txt")
+    )
+
+    client = tm.get_test_client()
+    url = tm.create_application().url_path_for(
+        "storage:download", path="files/conditional.txt"
+    )
+
+    res = client.get(url)
+    assert res.status_code == 200
+    assert res.content == b"0123456789"
+    etag = res.headers["etag"]
+    last_modified = res.headers["last-modified"]
+    assert etag == stored_file.etag == f'"{stored_file.object.hash}"'
+    assert res.headers["cache-control"] == "public, max-age=3600"
+
+    res = client.get(url, headers={"If-None-Match": f'"other", W/{etag}'})
+    assert res.status_code == 304
+    assert res.content == b""
+    assert res.headers["etag"] == etag
+    assert res.headers["cache-control"] == "public, max-age=3600"
+
+    res = client.get(url, headers={"If-None-Match": '"other"'})
+    assert res.status_code == 200
+
+    res = client.get(url, headers={"If-Modified-Since": last_modified})
+    assert res.status_code == 304
+
+    res = client.get(
+        url, headers={"If-Modified-Since": "Thu, 01 Jan 1970 00:00:00 GMT"}
+    )
+    assert res.status_code == 200
+
+    # `If-None-Match` takes precedence over `If-Modified-Since`
+    res = client.get(
+        url, headers={"If-None-Match": '"other"', "If-Modified-Since": last_modified}
+    )
+    assert res.status_code == 200
+
+
+def test_storage_controller_if_range(clear_dir):
+    tm = Test.create_test_module(**module_config)
+    storage_service: StorageService = tm.get(StorageService)
+    storage_service.save(ContentFile(b"0123456789", name="if-range.txt"))
+
+    client = tm.get_test_client()
+    url = tm.create_application().url_path_for(
+        "storage:download", path="files/if-range.txt"
+    )
+    res = client.get(url)
+    etag, last_modified = res.headers["etag"], res.headers["last-modified"]
+
+    for if_range in (etag, last_modified):
+        res = client.get(url, headers={"Range": "bytes=2-3", "If-Range": if_range})
+        assert res.status_code == 206
+        assert res.content == b"23"
+
+    for if_range in ('"other"', f"W/{etag}", "Thu, 01 Jan 1970 00:00:00 GMT"):
+        res = client.get(url, headers={"Range": "bytes=2-3", "If-Range": if_range})
+        assert res.status_code == 200
+        assert res.content == b"0123456789"
+
+
+def _get_upload_module(**upload):
+    return Test.create_test_module(
+        modules=[
+            StorageModule.setup(
+                files={
+                    "driver": get_driver(Provider.LOCAL),
+                    "options": {"key": os.path.join(DUMB_DIRS, "fixtures")},
+                },
+                upload=upload,
+            )
+        ]
+    )
+
+
+def test_storage_controller_upload_raw_body(clear_dir):
+    tm = _get_upload_module(enabled=True)
+    client = tm.get_test_client()
+    url = tm.create_application().url_path_for("storage:upload", storage="files")
+
+    res = client.post(
+        f"{url}?filename=../../raw.txt",
+        content=iter([b"raw ", b"body ", b"upload"]),
+        headers={"Content-Type": "text/plain"},
+    )
+    assert res.status_code == 200
+    assert res.json() == {
+        "path": "files/raw.txt",
+        "filename": "raw.txt",
+        "content_type": "text/plain",
+        "size": 15,
+    }
+
+    stored_file = tm.get(StorageService).get("files/raw.txt")
+    assert stored_file.read() == b"raw body upload"
+
+    url = tm.create_application().url_path_for("storage:upload", storage="unknown")
+    assert client.post(url, content=b"data").status_code == 404
+
+
+def test_storage_controller_upload_multipart(clear_dir):
+    tm = _get_upload_module(enabled=True)
+    client = tm.get_test_client()
+    url = tm.create_application().url_path_for("storage:upload", storage="files")
+
+    res = client.post(
+        url,
+        data={"title": "a title"},
+        files={"file": ("multipart.txt", b"multipart content", "text/plain")},
+    )
+    assert res.status_code == 200
+    assert res.json()["path"] == "files/multipart.txt"
+    assert res.json()["content_type"] == "text/plain"
+
+    stored_file = tm.get(StorageService).get("files/multipart.txt")
+    assert stored_file.read() == b"multipart content"
+
+    res = client.post(url, data={"title": "a title"}, files={"empty": ("", b"")})
+    assert res.status_code == 400
+
+
+def test_storage_controller_upload_limits(clear_dir):
+    tm = _get_upload_module()
+    client = tm.get_test_client()
+    url = tm.create_application().url_path_for("storage:upload", storage="files")
+    # disabled by default
+    assert client.post(url, content=b"data").status_code == 404
+
+    tm = _get_upload_module(enabled=True, max_size=10)
+    client = tm.get_test_client()
+
+    res = client.post(f"{url}?filename=large.txt", content=b"x" * 11)
+    assert res.status_code == 413
+
+    # without Content-Length, the limit applies while streaming
+    res = client.post(f"{url}?filename=large.txt", content=iter([b"x" * 6] * 2))
+    assert res.status_code == 413
+
+    res = client.post(f"{url}?filename=small.txt", content=b"x" * 10)
+    assert res.status_code == 200
@@ -0,0 +1,121 @@
+import os.path
+
+from ellar.common.datastructures import ContentFile
+from ellar.testing import Test
+
+from ellar_storage import Provider, StorageModule, StorageService, get_driver
+from ellar_storage.disk_cache import DiskCache
+from ellar_storage.stored_file import CachedStoredFile
+
+from .utils import DUMB_DIRS
+
+CACHE_DIR = os.path.join(DUMB_DIRS, "fixtures", "cache")
+
+
+def _fill(cache, name, content, etag="v1"):
+    return b"".join(
+        cache.fill("files", name, etag, len(content), iter([content[:2], content[2:]]))
+    )
+
+
+def test_disk_cache_fill_and_evict(clear_dir):
+    cache = DiskCache(CACHE_DIR, max_bytes=10)
+
+    assert _fill(cache, "a.txt", b"aaaa") == b"aaaa"
+    assert _fill(cache, "b.txt", b"bbbb") == b"bbbb"
+    assert cache.total_bytes == 8
+
+    path = cache.get_path("files", "a.txt", "v1")
+    with open(path, "rb") as cached_file:
+        assert cached_file.read() == b"aaaa"
+    assert cache.get_path("files", "a.txt", "v2") is None
+
+    # `b.txt` is the least recently used entry
+    _fill(cache, "c.txt", b"cccc")
+    assert cache.get_path("files", "b.txt", "v1") is None
+    assert cache.total_bytes == 8
+
+    # too large to be cached
+    assert _fill(cache, "d.txt", b"d" * 11) == b"d" * 11
+    assert cache.get_path("files", "d.txt", "v1") is None
+
+    assert len(DiskCache(CACHE_DIR, max_bytes=10)) == 2
+
+    cache.invalidate("files", "a.txt")
+    assert cache.get_path("files", "a.txt", "v1") is None
+    assert len(os.listdir(CACHE_DIR)) == 1
+
+
+def test_storage_service_disk_cache(clear_dir):
+    tm = Test.create_test_module(
+        modules=[
+            StorageModule.setup(
+                files={
+                    "driver": get_driver(Provider.LOCAL),
+                    "options": {"key": os.path.join(DUMB_DIRS, "fixtures")},
+                    "disk_cache": {"directory": CACHE_DIR, "max_bytes": 1024},
+                },
+            )
+        ]
+    )
+    storage_service: StorageService = tm.get(StorageService)
+    storage_service.save(ContentFile(b"File saving worked", name="get.txt"))
+
+    stored_file = storage_service.get("get.txt")
+    assert isinstance(stored_file, CachedStoredFile)
+    assert stored_file.get_local_path() is None
+    assert b"".join(stored_file.as_stream()) == b"File saving worked"
+    assert stored_file.get_local_path().startswith(CACHE_DIR)
+
+    # rewrite the stored file without changing its version,
+    # reads keep being served from the cached copy
+    file_path = os.path.join(DUMB_DIRS, "fixtures", "files", "get.txt")
+    stat = os.stat(file_path)
+    with open(file_path, "wb") as stored:
+        stored.write(b"File changed behind")
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    stored_file = storage_service.get("get.txt")
+    assert b"".join(stored_file.as_stream()) == b"File saving worked"
+    assert b"".join(stored_file.range_as_stream(5, 11)) == b"saving"
+
+    url = tm.create_application().url_path_for("storage:download", path="files/get.txt")
+    res = tm.get_test_client().get(url)
+    assert res.status_code == 200
+    assert res.content == b"File saving worked"
+
+    assert storage_service.delete("get.txt")
+    assert os.listdir(CACHE_DIR) == []
+
+
+def test_storage_controller_cached_copy_evicted(clear_dir, monkeypatch):
+    tm = Test.create_test_module(
+        modules=[
+            StorageModule.setup(
+                files={
+                    "driver": get_driver(Provider.LOCAL),
+                    "options": {"key": os.path.join(DUMB_DIRS, "fixtures")},
+                    "disk_cache": {"directory": CACHE_DIR, "max_bytes": 1024},
+                },
+            )
+        ]
+    )
+    storage_service: StorageService = tm.get(StorageService)
+    storage_service.save(ContentFile(b"File saving worked", name="get.txt"))
+    b"".join(storage_service.get("get.txt").as_stream())
+
+    get_local_path = CachedStoredFile.get_local_path
+
+    def get_evicted_path(self):
+        # evicted by another worker once the path is returned
+        local_path = get_local_path(self)
+        if local_path is not None and os.path.exists(local_path):
+            os.unlink(local_path)
+        return local_path
+
+    monkeypatch.setattr(CachedStoredFile, "get_local_path", get_evicted_path)
+
+    url = tm.create_application().url_path_for("storage:download", path="files/get.txt")
+    res = tm.get_test_client().get(url)
+    assert res.status_code == 200
+    assert res.content == b"File saving worked"
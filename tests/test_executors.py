@@ -0,0 +1,97 @@
+import asyncio
+import os.path
+import threading
+
+import pytest
+from ellar.common.datastructures import ContentFile
+from ellar.testing import Test
+
+from ellar_storage import Provider, StorageModule, StorageService, get_driver
+from ellar_storage.exceptions import StorageExecutorFullError
+from ellar_storage.executors import StorageExecutor
+
+from .utils import DUMB_DIRS
+
+
+@pytest.mark.asyncio
+async def test_storage_executor_rejects_on_overflow():
+    executor = StorageExecutor("files", max_workers=1, overflow="reject")
+    release = threading.Event()
+
+    task = asyncio.create_task(executor.run(release.wait))
+    await asyncio.sleep(0.05)
+    assert executor.stats()["active"] == 1
+
+    with pytest.raises(StorageExecutorFullError):
+        await executor.run(lambda: None)
+    assert executor.stats()["rejected"] == 1
+
+    release.set()
+    assert await task is True
+    assert await executor.run(lambda: "done") == "done"
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_storage_executor_waits_on_overflow():
+    executor = StorageExecutor("files", max_workers=1, queue_size=1)
+    release = threading.Event()
+
+    running = asyncio.create_task(executor.run(release.wait))
+    queued = asyncio.create_task(executor.run(lambda: "queued"))
+    waiting = asyncio.create_task(executor.run(lambda: "waiting"))
+    await asyncio.sleep(0.05)
+
+    stats = executor.stats()
+    assert stats["active"] == 1
+    assert stats["queued"] == 1
+    assert stats["waiting"] == 1
+
+    release.set()
+    assert await asyncio.gather(running, queued, waiting) == [
+        True,
+        "queued",
+        "waiting",
+    ]
+    assert executor.stats()["queued"] == 0
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_storage_service_uses_storage_executor(clear_dir):
+    tm = Test.create_test_module(
+        modules=[
+            StorageModule.setup(
+                files={
+                    "driver": get_driver(Provider.LOCAL),
+                    "options": {"key": os.path.join(DUMB_DIRS, "fixtures")},
+                    "executor": {"max_workers": 2, "queue_size": 4},
+                },
+                images={
+                    "driver": get_driver(Provider.LOCAL),
+                    "options": {"key": os.path.join(DUMB_DIRS, "fixtures")},
+                },
+            )
+        ]
+    )
+    storage_service: StorageService = tm.get(StorageService)
+
+    assert storage_service.get_executor("images") is None
+    executor = storage_service.get_executor("files")
+    assert isinstance(executor, StorageExecutor)
+
+    await storage_service.save_async(ContentFile(b"File saving worked", name="a.txt"))
+    from_files = await storage_service.get_async("files/a.txt")
+    assert from_files.read() == b"File saving worked"
+
+    assert storage_service.get_executor_stats() == {
+        "files": {
+            "max_workers": 2,
+            "queue_size": 4,
+            "overflow": "wait",
+            "active": 0,
+            "queued": 0,
+            "waiting": 0,
+            "rejected": 0,
+        }
+    }
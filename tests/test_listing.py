@@ -0,0 +1,256 @@
+import os.path
+from xml.etree import ElementTree
+
+import pytest
+from ellar.common.datastructures import ContentFile
+from libcloud.storage.base import Container, Object
+
+from ellar_storage import Provider, ShardedLocalStorageDriver, get_driver
+from ellar_storage.listing import FileEntry, iter_file_pages
+
+from .utils import get_storage_service
+
+NAMES = ["a.txt", "b.txt", "c.csv", "d.txt", "e.txt"]
+
+
+def _save_files(storage_service, names=NAMES):
+    for name in names:
+        storage_service.save(ContentFile(b"File saving worked", name=name))
+
+
+@pytest.mark.parametrize(
+    "driver, files",
+    [
+        (None, {}),
+        (None, {"metadata_store": "catalog"}),
+        (ShardedLocalStorageDriver, {}),
+        (ShardedLocalStorageDriver, {"metadata_store": "catalog"}),
+    ],
+)
+def test_iter_files(clear_dir, driver, files):
+    storage_service = get_storage_service(driver, **files)
+    _save_files(storage_service)
+
+    entries = list(storage_service.iter_files(page_size=2))
+    assert sorted(entry.name for entry in entries) == NAMES
+    assert entries[0].storage == "files"
+    assert entries[0].size == 18
+    assert entries[0].last_modified is not None
+    assert storage_service.get(entries[0].path).read() == b"File saving worked"
+
+    # pages resume after the last file of the previous page
+    names = []
+    token = None
+    while True:
+        page = storage_service.list_files(page_size=2, continuation_token=token)
+        assert len(page.files) <= 2
+        names += [entry.name for entry in page.files]
+        token = page.continuation_token
+        if token is None:
+            break
+    assert names == [entry.name for entry in entries]
+
+
+def test_iter_files_prefix_and_internal_files(clear_dir):
+    storage_service = get_storage_service(content_addressed={})
+    storage_service.save(ContentFile(b"File saving worked", name="a.txt"))
+    storage_service.save(ContentFile(b"File saving worked", name="b.txt"))
+    stored_file = storage_service.save(ContentFile(b"other", name="c.txt"))
+
+    # reference counts and lock files are skipped
+    entries = list(storage_service.iter_files())
+    assert len(entries) == 2
+    assert all(entry.name != "refs" for entry in entries)
+    assert [
+        entry.name for entry in storage_service.iter_files(prefix=stored_file.name)
+    ] == [stored_file.name]
+    assert storage_service.list_files(prefix="missing").files == []
+
+
+def test_iter_files_catalog(clear_dir, monkeypatch):
+    storage_service = get_storage_service(metadata_store="catalog")
+    _save_files(storage_service)
+    os.remove(storage_service.get("files/b.txt").get_cdn_url())
+
+    # pages are queried from the catalog, files removed from the disk are skipped
+    monkeypatch.setattr("ellar_storage.listing._walk_sorted", pytest.fail, raising=True)
+    page = storage_service.list_files(page_size=2)
+    assert [entry.name for entry in page.files] == ["a.txt", "c.csv"]
+    page = storage_service.list_files(
+        page_size=2, continuation_token=page.continuation_token
+    )
+    assert [entry.name for entry in page.files] == ["d.txt", "e.txt"]
+    assert [entry.name for entry in storage_service.iter_files(prefix="c")] == ["c.csv"]
+
+
+@pytest.mark.asyncio
+async def test_iter_files_catalog_async_saves(clear_dir, monkeypatch):
+    storage_service = get_storage_service(metadata_store="catalog")
+    await storage_service.save_content_async("a.txt", content=iter([b"a"]))
+    await storage_service.save_content_async(
+        "b.txt", content=iter([b"b"]), metadata={"filename": "b.txt"}
+    )
+    await storage_service.save_async(ContentFile(b"c", name="c.txt"))
+
+    # saves without metadata are catalogued as well
+    monkeypatch.setattr("ellar_storage.listing._walk_sorted", pytest.fail, raising=True)
+    assert [entry.name for entry in storage_service.iter_files()] == [
+        "a.txt",
+        "b.txt",
+        "c.txt",
+    ]
+
+
+def test_iter_files_catalog_files_saved_before(clear_dir, monkeypatch):
+    _save_files(get_storage_service(), ["a.txt", "b.txt"])
+    storage_service = get_storage_service(metadata_store="catalog")
+    storage_service.save(ContentFile(b"File saving worked", name="c.csv"))
+    catalog = storage_service.get_metadata_store("files")
+    assert not catalog.is_complete("files")
+
+    # the directory is walked until the earlier files are imported
+    assert [entry.name for entry in storage_service.iter_files()] == [
+        "a.txt",
+        "b.txt",
+        "c.csv",
+    ]
+    assert catalog.import_sidecars(storage_service.get_container()) == 2
+    assert catalog.is_complete("files")
+    monkeypatch.setattr("ellar_storage.listing._walk_sorted", pytest.fail, raising=True)
+    assert [entry.name for entry in storage_service.iter_files()] == [
+        "a.txt",
+        "b.txt",
+        "c.csv",
+    ]
+
+
+def test_list_files_invalid_token(clear_dir):
+    storage_service = get_storage_service()
+    with pytest.raises(ValueError, match="Invalid continuation token"):
+        storage_service.list_files(continuation_token="%%%")
+    with pytest.raises(ValueError, match="page_size"):
+        storage_service.list_files(page_size=0)
+
+
+@pytest.mark.asyncio
+async def test_iter_files_async(clear_dir):
+    storage_service = get_storage_service()
+    _save_files(storage_service)
+
+    names = [
+        entry.name async for entry in storage_service.iter_files_async(page_size=2)
+    ]
+    assert names == NAMES
+
+    page = await storage_service.list_files_async(page_size=3)
+    assert [entry.name for entry in page.files] == NAMES[:3]
+    page = await storage_service.list_files_async(
+        page_size=3, continuation_token=page.continuation_token
+    )
+    assert [entry.name for entry in page.files] == NAMES[3:]
+    assert page.continuation_token is None
+
+
+class _RemoteDriver:
+    name = "Remote"
+
+    def __init__(self, names):
+        self.names = names
+
+    def iterate_container_objects(self, container, prefix=None, ex_prefix=None):
+        for name in self.names:
+            if prefix and not name.startswith(prefix):
+                continue
+            yield Object(name, 3, None, {}, {}, container, self)
+
+
+def test_iter_file_pages_remote():
+    driver = _RemoteDriver(["a.txt", "a.txt.checksums.json", "b.txt", "c.txt"])
+    container = Container("bucket", {}, driver)
+
+    pages = list(
+        iter_file_pages(
+            container,
+            "files",
+            page_size=2,
+            is_ignored=lambda name: name.endswith(".checksums.json"),
+        )
+    )
+    assert [[entry.name for entry in page.files] for page in pages] == [
+        ["a.txt", "b.txt"],
+        ["c.txt"],
+    ]
+    assert pages[0].files[0] == FileEntry("files", "a.txt", 3, None)
+
+    page = next(
+        iter_file_pages(
+            container, "files", continuation_token=pages[0].continuation_token
+        )
+    )
+    assert [entry.name for entry in page.files] == ["c.txt"]
+
+
+def _list_bucket_result(keys, truncated):
+    namespace = "http://s3.amazonaws.com/doc/2006-03-01/"
+    root = ElementTree.Element(f"{{{namespace}}}ListBucketResult")
+    ElementTree.SubElement(root, f"{{{namespace}}}IsTruncated").text = (
+        "true" if truncated else "false"
+    )
+    for key in keys:
+        contents = ElementTree.SubElement(root, f"{{{namespace}}}Contents")
+        for tag, text in (
+            ("Key", key),
+            ("Size", "3"),
+            ("ETag", '"etag"'),
+            ("LastModified", "2024-01-02T03:04:05.000Z"),
+        ):
+            ElementTree.SubElement(contents, f"{{{namespace}}}{tag}").text = text
+    return root
+
+
+class _Response:
+    def __init__(self, obj):
+        self.status = 200
+        self.object = obj
+
+
+class _S3Connection:
+    """In-memory stand-in of the S3 ListObjects API"""
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.requests = []
+
+    def request(self, path, params):
+        self.requests.append(dict(params))
+        keys = [key for key in self.keys if key > params.get("marker", "")]
+        max_keys = int(params["max-keys"])
+        return _Response(
+            _list_bucket_result(keys[:max_keys], truncated=len(keys) > max_keys)
+        )
+
+
+def test_iter_file_pages_s3():
+    driver = get_driver(Provider.S3)("key", "secret")
+    driver.connection = _S3Connection(["a.txt", "b.txt", "c.txt"])
+    container = Container("bucket", {}, driver)
+
+    pages = list(iter_file_pages(container, "files", page_size=2))
+    assert [[entry.name for entry in page.files] for page in pages] == [
+        ["a.txt", "b.txt"],
+        ["c.txt"],
+    ]
+    assert pages[0].files[0].last_modified.year == 2024
+
+    driver.connection.requests.clear()
+    page = next(
+        iter_file_pages(
+            container,
+            "files",
+            page_size=2,
+            continuation_token=pages[0].continuation_token,
+        )
+    )
+    assert [entry.name for entry in page.files] == ["c.txt"]
+    # the listing resumes from the marker instead of listing the bucket again
+    assert driver.connection.requests == [{"max-keys": "2", "marker": "b.txt"}]
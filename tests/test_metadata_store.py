@@ -0,0 +1,132 @@
+import os.path
+
+import pytest
+from ellar.common.datastructures import ContentFile
+
+from ellar_storage import StorageService, StorageSetup
+from ellar_storage.metadata_store import (
+    CATALOG_FILE_NAME,
+    MetadataStore,
+    SQLiteMetadataStore,
+)
+
+from .utils import FILES_DIR, FIXTURES_DIR, get_storage, get_storage_service
+
+
+def _get_catalog_service():
+    return StorageService(
+        StorageSetup(
+            storages={
+                "files": get_storage(metadata_store="catalog"),
+                "images": get_storage(metadata_store="catalog"),
+            }
+        )
+    )
+
+
+def test_catalog_metadata_store(clear_dir):
+    storage_service = _get_catalog_service()
+    catalog = storage_service.get_metadata_store()
+    assert isinstance(catalog, SQLiteMetadataStore)
+    # storages with the same key directory share the catalog
+    assert storage_service.get_metadata_store("images") is catalog
+    assert catalog.path == os.path.abspath(
+        os.path.join(FIXTURES_DIR, CATALOG_FILE_NAME)
+    )
+
+    storage_service.save(ContentFile(b"File saving worked", name="get.txt"))
+    storage_service.save_content(
+        "data.csv",
+        content=iter([b"a,b\n", b"1,2\n"]),
+        metadata={"content_type": "text/csv", "filename": "data.csv"},
+    )
+    storage_service.save(ContentFile(b"image", name="get.png"), upload_storage="images")
+
+    assert sorted(os.listdir(FILES_DIR)) == ["data.csv", "get.txt"]
+    assert storage_service.get("files/data.csv").filename == "data.csv"
+    assert storage_service.get("files/get.txt").content_type == "text/plain"
+
+    assert [entry.name for entry in catalog.query("files")] == ["data.csv", "get.txt"]
+    assert [entry.name for entry in catalog.query("files", prefix="get")] == ["get.txt"]
+    assert catalog.query("files", content_type="text/csv") == [
+        (
+            "data.csv",
+            8,
+            "text/csv",
+            {"content_type": "text/csv", "filename": "data.csv"},
+        )
+    ]
+    assert [entry.name for entry in catalog.query("files", min_size=10)] == ["get.txt"]
+    assert [entry.name for entry in catalog.query("files", max_size=10)] == ["data.csv"]
+    assert [entry.name for entry in catalog.query("files", after="data.csv")] == [
+        "get.txt"
+    ]
+    assert catalog.usage("files") == {"count": 2, "size": 26}
+    assert catalog.usage("images") == {"count": 1, "size": 5}
+
+    assert storage_service.delete("files/get.txt")
+    storage_service.delete_many(["files/data.csv"])
+    assert catalog.usage("files") == {"count": 0, "size": 0}
+    assert os.listdir(FILES_DIR) == []
+
+
+def test_catalog_reads_sidecar_metadata(clear_dir):
+    sidecar_service = get_storage_service()
+    sidecar_service.save(ContentFile(b"File saving worked", name="get.txt"))
+    sidecar_service.save(ContentFile(b"File saving worked", name="old.txt"))
+    assert os.path.isfile(os.path.join(FILES_DIR, "get.txt.metadata.json"))
+
+    storage_service = _get_catalog_service()
+    catalog = storage_service.get_metadata_store()
+    # files saved before the catalog was used
+    assert storage_service.get("files/get.txt").filename == "get.txt"
+    assert storage_service.delete("files/old.txt")
+    assert sorted(os.listdir(FILES_DIR)) == ["get.txt", "get.txt.metadata.json"]
+
+    assert catalog.import_sidecars(storage_service.get_container()) == 1
+    assert os.listdir(FILES_DIR) == ["get.txt"]
+    assert [entry.name for entry in catalog.query("files")] == ["get.txt"]
+    assert storage_service.get("files/get.txt").filename == "get.txt"
+
+
+@pytest.mark.asyncio
+async def test_sidecar_overwritten_without_metadata(clear_dir):
+    storage_service = get_storage_service()
+    storage_service.save(ContentFile(b"File saving worked", name="get.txt"))
+    storage_service.save(ContentFile(b"File saving worked", name="async.txt"))
+
+    # the metadata of the former file isn't kept
+    storage_service.save_content("get.txt", content=iter([b"new"]))
+    await storage_service.save_content_async("async.txt", content=iter([b"new"]))
+    assert sorted(os.listdir(FILES_DIR)) == ["async.txt", "get.txt"]
+    assert storage_service.get("files/get.txt").filename == "unnamed"
+
+
+def test_custom_metadata_store(clear_dir):
+    class _MemoryMetadataStore(MetadataStore):
+        def __init__(self, container):
+            self.container = container
+            self.entries = {}
+
+        def get(self, obj):
+            return self.entries.get(obj.name, {})
+
+        def set(self, obj, metadata):
+            self.entries[obj.name] = metadata
+
+        def delete(self, obj):
+            self.entries.pop(obj.name, None)
+
+    storage_service = get_storage_service(
+        images=True, metadata_store=_MemoryMetadataStore
+    )
+    stored_file = storage_service.save(
+        ContentFile(b"File saving worked", name="get.txt")
+    )
+    metadata_store = storage_service.get_metadata_store()
+    assert metadata_store.container is storage_service.get_container()
+    assert metadata_store.entries["get.txt"]["filename"] == "get.txt"
+    assert storage_service.get("files/get.txt").filename == "get.txt"
+
+    stored_file.delete()
+    assert metadata_store.entries == {}
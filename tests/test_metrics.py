@@ -0,0 +1,269 @@
+import pytest
+from ellar.common.datastructures import ContentFile
+from ellar.testing import Test
+from libcloud.storage.types import ObjectDoesNotExistError
+
+from ellar_storage import StorageModule, StorageService
+from ellar_storage.metrics import (
+    MetricsCollector,
+    PrometheusCollector,
+    track_operation,
+)
+
+from .utils import get_storage, get_storage_service
+
+
+def test_metrics_disabled(clear_dir):
+    storage_service = get_storage_service()
+    assert storage_service.metrics is None
+    # a shared no-op context manager
+    assert track_operation(None, "files", "get") is track_operation(
+        None, "files", "get"
+    )
+
+
+def test_prometheus_collector():
+    collector = PrometheusCollector(buckets=[0.1, 1.0])
+    collector.observe("files", "get", 0.05)
+    collector.observe("files", "get", 0.5)
+    collector.observe("files", "get", 5)
+    collector.add_in_flight("files", "get", 1)
+    collector.add_error("files", "get", "ObjectDoesNotExistError")
+    collector.add_bytes('fi"les', "in", 10)
+
+    lines = collector.render().splitlines()
+    assert (
+        'ellar_storage_operation_duration_seconds_bucket{storage="files",operation="get",le="0.1"} 1'
+        in lines
+    )
+    assert (
+        'ellar_storage_operation_duration_seconds_bucket{storage="files",operation="get",le="1.0"} 2'
+        in lines
+    )
+    assert (
+        'ellar_storage_operation_duration_seconds_bucket{storage="files",operation="get",le="+Inf"} 3'
+        in lines
+    )
+    assert (
+        'ellar_storage_operation_duration_seconds_sum{storage="files",operation="get"} 5.55'
+        in lines
+    )
+    assert (
+        'ellar_storage_operation_duration_seconds_count{storage="files",operation="get"} 3'
+        in lines
+    )
+    assert (
+        'ellar_storage_operations_in_flight{storage="files",operation="get"} 1' in lines
+    )
+    assert (
+        'ellar_storage_operation_errors_total{storage="files",operation="get",error="ObjectDoesNotExistError"} 1'
+        in lines
+    )
+    assert 'ellar_storage_bytes_total{storage="fi\\"les",direction="in"} 10' in lines
+
+
+def test_service_metrics(clear_dir):
+    storage_service = get_storage_service(setup={"metrics": {}})
+    collector = storage_service.metrics
+    assert isinstance(collector, PrometheusCollector)
+
+    storage_service.save(ContentFile(b"File saving worked", name="get.txt"))
+    assert storage_service.get("files/get.txt").filename == "get.txt"
+    with pytest.raises(ObjectDoesNotExistError):
+        storage_service.get("files/missing.txt")
+    storage_service.delete("files/get.txt")
+
+    content = collector.render()
+    for operation in ("save", "upload", "metadata_set", "get", "delete"):
+        assert (
+            f'ellar_storage_operation_duration_seconds_count{{storage="files",operation="{operation}"}}'
+            in content
+        )
+    assert 'operation="get",error="ObjectDoesNotExistError"} 1' in content
+    assert 'ellar_storage_bytes_total{storage="files",direction="in"} 18' in content
+    assert (
+        'ellar_storage_operations_in_flight{storage="files",operation="get"} 0'
+        in content
+    )
+
+
+@pytest.mark.asyncio
+async def test_service_metrics_async(clear_dir):
+    storage_service = get_storage_service(
+        executor={"max_workers": 1}, setup={"metrics": {}}
+    )
+    collector = storage_service.metrics
+
+    await storage_service.save_async(ContentFile(b"File saving worked", name="a.txt"))
+    await storage_service.get_async("files/a.txt")
+    await storage_service.delete_async("files/a.txt")
+
+    content = collector.render()
+    for operation in ("save_async", "get_async", "delete_async", "queue_wait"):
+        assert f'operation="{operation}"' in content
+
+
+@pytest.mark.asyncio
+async def test_service_metrics_async_without_backend(clear_dir, monkeypatch):
+    storage_service = get_storage_service(setup={"metrics": {}})
+    collector = storage_service.metrics
+
+    async def _get_async_backend(self, name=None):
+        return None
+
+    monkeypatch.setattr(StorageService, "_get_async_backend", _get_async_backend)
+    await storage_service.save_content_async("a.txt", content=iter([b"a"]))
+    await storage_service.get_async("files/a.txt")
+    await storage_service.delete_async("files/a.txt")
+
+    # operations run in a worker thread are tracked once
+    content = collector.render()
+    for operation in ("save_async", "get_async", "delete_async"):
+        assert (
+            f'ellar_storage_operation_duration_seconds_count{{storage="files",operation="{operation}"}} 1'
+            in content
+        )
+    for operation in ("save", "get", "delete"):
+        assert f'operation="{operation}"' not in content
+
+
+def test_custom_collector(clear_dir):
+    class _Collector(MetricsCollector):
+        def __init__(self):
+            self.events = []
+
+        def observe(self, storage, operation, seconds):
+            self.events.append(("observe", storage, operation))
+
+        def add_in_flight(self, storage, operation, delta):
+            self.events.append(("in_flight", operation, delta))
+
+        def add_error(self, storage, operation, error):
+            self.events.append(("error", operation, error))
+
+        def add_bytes(self, storage, direction, count):
+            self.events.append(("bytes", direction, count))
+
+    storage_service = get_storage_service(setup={"metrics": {"collector": _Collector}})
+    storage_service.save_content(
+        "data.csv", content=iter([b"a,b"]), metadata={"content_type": "text/csv"}
+    )
+    events = storage_service.metrics.events
+    assert events[0] == ("in_flight", "save", 1)
+    assert ("bytes", "in", 3) in events
+    assert ("observe", "files", "save") in events
+    assert storage_service.metrics.render() is None
+
+
+def test_storage_controller_metrics(clear_dir):
+    tm = Test.create_test_module(
+        modules=[StorageModule.setup(files=get_storage(), metrics={"endpoint": True})]
+    )
+    storage_service: StorageService = tm.get(StorageService)
+    storage_service.save(ContentFile(b"File saving worked", name="get.txt"))
+
+    client = tm.get_test_client()
+    app = tm.create_application()
+    res = client.get(app.url_path_for("storage:download", path="files/get.txt"))
+    assert res.content == b"File saving worked"
+    res = client.get(
+        app.url_path_for("storage:download", path="files/get.txt"),
+        headers={"Range": "items=0-1"},
+    )
+    assert res.content == b"File saving worked"
+    res = client.get(app.url_path_for("storage:download", path="files/missing.txt"))
+    assert res.status_code == 404
+
+    res = client.get(app.url_path_for("storage:metrics"))
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert (
+        'ellar_storage_operation_duration_seconds_count{storage="files",operation="download"} 3'
+        in res.text
+    )
+    assert 'operation="download",error="NotFound"} 1' in res.text
+    assert 'ellar_storage_bytes_total{storage="files",direction="out"} 36' in res.text
+
+
+def test_storage_controller_metrics_measure_body(clear_dir, monkeypatch):
+    class _Collector(MetricsCollector):
+        def __init__(self):
+            self.events = []
+
+        def observe(self, storage, operation, seconds):
+            self.events.append(("observe", operation))
+
+        def add_in_flight(self, storage, operation, delta):
+            self.events.append(("in_flight", operation, delta))
+
+        def add_error(self, storage, operation, error):
+            self.events.append(("error", operation, error))
+
+        def add_bytes(self, storage, direction, count):
+            pass
+
+    def _stream_content(res, serving):
+        for chunk in res.as_stream():
+            collector.events.append(("chunk",))
+            yield chunk
+        raise OSError("connection lost")
+
+    monkeypatch.setattr("ellar_storage.controller._stream_content", _stream_content)
+    tm = Test.create_test_module(
+        modules=[
+            StorageModule.setup(files=get_storage(), metrics={"collector": _Collector})
+        ]
+    )
+    storage_service: StorageService = tm.get(StorageService)
+    collector = storage_service.metrics
+    storage_service.save(ContentFile(b"File saving worked", name="get.txt"))
+    collector.events.clear()
+
+    client = tm.get_test_client(raise_server_exceptions=False)
+    client.get(
+        tm.create_application().url_path_for("storage:download", path="files/get.txt"),
+        headers={"Range": "items=0-1"},
+    )
+    # the download ends once the body is sent, failing while streaming
+    download_events = [
+        event
+        for event in collector.events
+        if "download" in event or event == ("chunk",)
+    ]
+    assert download_events == [
+        ("in_flight", "download", 1),
+        ("chunk",),
+        ("observe", "download"),
+        ("in_flight", "download", -1),
+        ("error", "download", "OSError"),
+    ]
+
+
+def test_storage_controller_metrics_unknown_storage(clear_dir):
+    tm = Test.create_test_module(
+        modules=[StorageModule.setup(files=get_storage(), metrics={"endpoint": True})]
+    )
+    client = tm.get_test_client(raise_server_exceptions=False)
+    app = tm.create_application()
+    for storage in ("random", "other"):
+        client.get(app.url_path_for("storage:download", path=f"{storage}/x.txt"))
+
+    res = client.get(app.url_path_for("storage:metrics"))
+    # labels are bounded by the configured storages
+    assert 'storage="random"' not in res.text
+    assert 'storage="other"' not in res.text
+
+    storage_service: StorageService = tm.get(StorageService)
+    with pytest.raises(RuntimeError):
+        storage_service.get("random/x.txt")
+    assert 'storage="random"' not in storage_service.metrics.render()
+
+
+def test_storage_controller_metrics_endpoint_disabled(clear_dir):
+    tm = Test.create_test_module(
+        modules=[StorageModule.setup(files=get_storage(), metrics={})]
+    )
+    res = tm.get_test_client().get(
+        tm.create_application().url_path_for("storage:metrics")
+    )
+    assert res.status_code == 404
@@ -115,3 +115,48 @@ def test_disable_storage_controller(reflect_context):
         tm.create_application().url_path_for(
             "storage:download", path="files/anyfile.ex"
         )
+
+
+def test_module_setup_lazy_initialization(clear_dir):
+    tm = Test.create_test_module(
+        modules=[
+            StorageModule.setup(
+                files={
+                    "driver": get_driver(Provider.LOCAL),
+                    "options": {"key": os.path.join(DUMB_DIRS, "fixtures")},
+                },
+                images={
+                    "driver": get_driver(Provider.LOCAL),
+                    "options": {"key": os.path.join(DUMB_DIRS, "fixtures")},
+                },
+                initialization="lazy",
+            )
+        ]
+    )
+    storage_service: StorageService = tm.get(StorageService)
+    assert storage_service.startup_timings == {}
+
+    assert storage_service.get_container("images").name == "images"
+    assert list(storage_service.startup_timings) == ["images"]
+    assert os.path.isdir(os.path.join(DUMB_DIRS, "fixtures", "images"))
+
+
+def test_module_setup_parallel_initialization(clear_dir):
+    tm = Test.create_test_module(
+        modules=[
+            StorageModule.setup(
+                files={
+                    "driver": get_driver(Provider.LOCAL),
+                    "options": {"key": os.path.join(DUMB_DIRS, "fixtures")},
+                },
+                images={
+                    "driver": get_driver(Provider.LOCAL),
+                    "options": {"key": os.path.join(DUMB_DIRS, "fixtures")},
+                },
+                initialization="parallel",
+            )
+        ]
+    )
+    storage_service: StorageService = tm.get(StorageService)
+    assert set(storage_service.startup_timings) == {"files", "images"}
+    assert all(timing >= 0 for timing in storage_service.startup_timings.values())
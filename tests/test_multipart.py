@@ -0,0 +1,255 @@
+import os.path
+import threading
+import time
+
+import pytest
+from libcloud.storage.base import Container, Object
+
+from ellar_storage import Provider, StorageService, StorageSetup, get_driver
+from ellar_storage.exceptions import LibcloudError
+from ellar_storage.multipart import ParallelMultipartUploader, _chain
+
+from .utils import DUMB_DIRS
+
+
+class _Response:
+    def __init__(self, status, etag=""):
+        self.status = status
+        self.headers = {"etag": f'"{etag}"'}
+
+
+class _S3Server:
+    """In-memory stand-in of the S3 multipart upload API"""
+
+    def __init__(self, fail_part=None):
+        self.uploads = {}
+        self.objects = {}
+        self.aborted = []
+        self.fail_part = fail_part
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.part_threads = set()
+        self._lock = threading.Lock()
+
+    def upload_part(self, upload_id, part_number, data):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.part_threads.add(threading.get_ident())
+        time.sleep(0.02)
+        with self._lock:
+            self.in_flight -= 1
+        if part_number == self.fail_part:
+            return _Response(500)
+        self.uploads[upload_id][part_number] = data
+        return _Response(200, etag=f"etag-{part_number}")
+
+
+class _Connection:
+    def __init__(self, server):
+        self.server = server
+
+    def request(self, path, method, data, headers, params):
+        assert method == "PUT"
+        assert headers["Content-Length"] == str(len(data))
+        return self.server.upload_part(params["uploadId"], params["partNumber"], data)
+
+
+class _S3Driver:
+    name = "Fake S3"
+    http_vendor_prefix = "x-amz"
+    supports_s3_multipart_upload = True
+
+    def __init__(self, server):
+        self.server = server
+        self.connection = _Connection(server)
+        self.initiated_headers = None
+
+    def _get_object_path(self, container, object_name):
+        return f"/{container.name}/{object_name}"
+
+    def _to_storage_class_headers(self, storage_class):
+        return {"x-amz-storage-class": "STANDARD"}
+
+    def _determine_content_type(self, content_type, object_name):
+        return content_type or "application/octet-stream"
+
+    def _initiate_multipart(self, container, object_name, headers=None):
+        self.initiated_headers = headers
+        upload_id = f"upload-{len(self.server.uploads)}"
+        self.server.uploads[upload_id] = {}
+        return upload_id
+
+    def _commit_multipart(self, container, object_name, upload_id, chunks):
+        parts = self.server.uploads.pop(upload_id)
+        assert [number for number, _ in chunks] == sorted(parts)
+        assert all(etag == f"etag-{number}" for number, etag in chunks)
+        self.server.objects[object_name] = b"".join(parts[n] for n, _ in chunks)
+        return "final-etag"
+
+    def _abort_multipart(self, container, object_name, upload_id):
+        self.server.aborted.append(upload_id)
+        self.server.uploads.pop(upload_id)
+
+    def upload_object_via_stream(self, iterator, container, object_name, **kwargs):
+        self.server.objects[object_name] = b"".join(iterator)
+        return Object(
+            object_name,
+            len(self.server.objects[object_name]),
+            "",
+            {},
+            {},
+            container,
+            self,
+        )
+
+
+def _get_uploader(server, **kwargs):
+    driver = _S3Driver(server)
+    uploader = ParallelMultipartUploader(
+        lambda: _S3Driver(server), threshold=8, part_size=4, **kwargs
+    )
+    return uploader, Container("bucket", {}, driver)
+
+
+def test_parallel_multipart_upload():
+    server = _S3Server()
+    uploader, container = _get_uploader(server, max_concurrency=3)
+    content = b"".join(bytes([65 + index]) * 4 for index in range(10)) + b"z"
+
+    obj = uploader.upload(
+        container,
+        "large.bin",
+        iter([content[:7], content[7:30], content[30:]]),
+        extra={"content_type": "video/mp4", "meta_data": {"filename": "a.mp4"}},
+    )
+
+    assert server.objects["large.bin"] == content
+    assert (obj.name, obj.size, obj.hash) == ("large.bin", 41, "final-etag")
+    assert server.max_in_flight == 3
+    assert len(server.part_threads) == 3
+    assert container.driver.initiated_headers == {
+        "x-amz-storage-class": "STANDARD",
+        "Content-Type": "video/mp4",
+        "x-amz-meta-filename": "a.mp4",
+    }
+    uploader.shutdown()
+
+
+def test_parallel_multipart_upload_below_threshold():
+    server = _S3Server()
+    uploader, container = _get_uploader(server)
+
+    obj = uploader.upload(container, "small.bin", iter([b"small"]))
+
+    assert server.objects["small.bin"] == b"small"
+    assert obj.size == 5
+    assert server.uploads == {}
+
+
+def test_parallel_multipart_upload_buffers_up_to_threshold():
+    server = _S3Server()
+    driver = _S3Driver(server)
+    uploader = ParallelMultipartUploader(
+        lambda: _S3Driver(server), threshold=12, part_size=4, max_concurrency=2
+    )
+    container = Container("bucket", {}, driver)
+    initiated = []
+
+    def _content():
+        for index in range(6):
+            initiated.append(driver.initiated_headers is not None)
+            yield bytes([65 + index]) * 4
+
+    uploader.upload(container, "stream.bin", _content())
+
+    # the upload starts once `threshold` bytes are read,
+    # read_in_chunks reads a chunk ahead of the part it yields
+    assert initiated == [False, False, False, False, True, True]
+    assert server.objects["stream.bin"] == b"AAAABBBBCCCCDDDDEEEEFFFF"
+    uploader.shutdown()
+
+
+def test_chain_releases_head_parts():
+    head = [b"a", b"b"]
+    parts = _chain(head, iter([b"c"]))
+    assert next(parts) == b"a"
+    assert head == [b"b"]
+    assert list(parts) == [b"b", b"c"]
+    assert head == []
+
+
+def test_parallel_multipart_upload_aborts_on_failure():
+    server = _S3Server(fail_part=3)
+    uploader, container = _get_uploader(server, max_concurrency=2)
+
+    with pytest.raises(LibcloudError):
+        uploader.upload(container, "failed.bin", iter([b"x" * 40]))
+
+    assert server.aborted == ["upload-0"]
+    assert "failed.bin" not in server.objects
+
+
+def test_multipart_setup_requires_s3_driver():
+    with pytest.raises(ValueError, match="doesn't support multipart uploads"):
+        StorageSetup(
+            storages={
+                "files": {
+                    "driver": get_driver(Provider.LOCAL),
+                    "options": {"key": os.path.join(DUMB_DIRS, "fixtures")},
+                    "multipart": {},
+                }
+            }
+        )
+
+    with pytest.raises(ValueError):
+        StorageSetup(
+            storages={
+                "files": {
+                    "driver": get_driver(Provider.S3),
+                    "options": {"key": "key", "secret": "secret"},
+                    "multipart": {"part_size": 1024},
+                }
+            }
+        )
+
+
+def test_parallel_multipart_upload_against_moto_server():
+    pytest.importorskip("boto3")
+    moto_server = pytest.importorskip("moto.server")
+
+    server = moto_server.ThreadedMotoServer(port=0)
+    server.start()
+    try:
+        host, port = server.get_host_and_port()
+        storage_service = StorageService(
+            StorageSetup(
+                storages={
+                    "videos": {
+                        "driver": get_driver(Provider.S3),
+                        "options": {
+                            "key": "testing",
+                            "secret": "testing",
+                            "host": host,
+                            "port": port,
+                            "secure": False,
+                        },
+                        "multipart": {
+                            "threshold": 5 * 1024 * 1024,
+                            "part_size": 5 * 1024 * 1024,
+                            "max_concurrency": 3,
+                        },
+                    }
+                }
+            )
+        )
+        content = os.urandom(5 * 1024 * 1024) * 3 + b"tail"
+
+        stored_file = storage_service.save_content(
+            "video.bin", content=iter([content]), metadata={"filename": "video.bin"}
+        )
+        assert stored_file.size == len(content)
+
+        assert storage_service.get("videos/video.bin").read() == content
+    finally:
+        server.stop()
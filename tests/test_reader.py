@@ -0,0 +1,345 @@
+import asyncio
+import io
+import mmap
+import os.path
+import threading
+import zipfile
+
+import pytest
+from ellar.common.datastructures import ContentFile
+from ellar.testing import Test
+from libcloud.storage.base import Container, Object
+
+from ellar_storage import Provider, StorageModule, StorageService, get_driver
+from ellar_storage.backends import aiter_prefetched
+from ellar_storage.executors import StorageExecutor
+from ellar_storage.reader import BlockReader, StreamReader
+from ellar_storage.stored_file import StoredFile
+
+from .utils import DUMB_DIRS, get_storage_service
+
+CONTENT = bytes(range(256)) * 40
+
+
+class _Fetcher:
+    def __init__(self, content):
+        self.content = content
+        self.ranges = []
+
+    def __call__(self, start, end):
+        self.ranges.append((start, end))
+        return self.content[start:end]
+
+
+def test_block_reader_random_access():
+    fetch = _Fetcher(CONTENT)
+    reader = BlockReader(len(CONTENT), fetch, block_size=1000, readahead=4)
+
+    assert reader.read(9500, 100) == CONTENT[9500:9600]
+    assert reader.read(2010, 20) == CONTENT[2010:2030]
+    # served from the buffered block
+    assert reader.read(2500, 10) == CONTENT[2500:2510]
+    assert reader.read(len(CONTENT), 100) == b""
+    # only the touched blocks are fetched
+    assert fetch.ranges == [(9000, 10000), (2000, 3000)]
+
+
+def test_block_reader_readahead():
+    fetch = _Fetcher(CONTENT)
+    reader = BlockReader(len(CONTENT), fetch, block_size=1000, readahead=2)
+
+    position = 0
+    while position < len(CONTENT):
+        chunk = reader.read(position, 300)
+        assert chunk == CONTENT[position : position + 300]
+        position += len(chunk)
+
+    assert fetch.ranges == [
+        (0, 1000),
+        (1000, 3000),
+        (3000, 6000),
+        (6000, 9000),
+        (9000, 10240),
+    ]
+
+    # reads larger than a block are fetched at once
+    fetch.ranges.clear()
+    assert reader.read(100, 2500) == CONTENT[100:2600]
+    assert fetch.ranges == [(0, 3000)]
+
+
+def test_block_reader_truncated_file():
+    reader = BlockReader(100, _Fetcher(b"0123456789"), block_size=8)
+    assert reader.read(0) == b"0123456789"
+
+
+def test_stream_reader():
+    opened = []
+
+    def _open_stream():
+        opened.append(True)
+        return iter([CONTENT[:1000], CONTENT[1000:5000], CONTENT[5000:]])
+
+    reader = StreamReader(_open_stream)
+    assert reader.read(10, 20) == CONTENT[10:30]
+    # forward reads continue the stream
+    assert reader.read(4990, 20) == CONTENT[4990:5010]
+    assert len(opened) == 1
+    # backward reads open a new stream
+    assert reader.read(0, 10) == CONTENT[:10]
+    assert len(opened) == 2
+
+    assert reader.size == len(CONTENT)
+    assert reader.read(100) == CONTENT[100:]
+    assert reader.read(len(CONTENT)) == b""
+
+
+def test_stored_file_seek(clear_dir):
+    storage_service = get_storage_service(
+        read_buffer={"buffer_size": 1024, "readahead": 2}
+    )
+    storage_service.save(ContentFile(CONTENT, name="data.bin"))
+
+    stored_file = storage_service.get("files/data.bin")
+    assert stored_file.seekable() is True
+    # consecutive reads advance
+    assert stored_file.read(10) == CONTENT[:10]
+    assert stored_file.read(10) == CONTENT[10:20]
+    assert stored_file.tell() == 20
+
+    assert stored_file.seek(-100, io.SEEK_END) == len(CONTENT) - 100
+    assert stored_file.read() == CONTENT[-100:]
+    assert stored_file.read() == b""
+    assert stored_file.seek(-50, io.SEEK_CUR) == len(CONTENT) - 50
+
+    stored_file.seek(5000)
+    buffer = bytearray(30)
+    assert stored_file.readinto(buffer) == 30
+    assert bytes(buffer) == CONTENT[5000:5030]
+
+    with pytest.raises(ValueError, match="negative seek position"):
+        stored_file.seek(-1)
+    with pytest.raises(ValueError, match="invalid whence"):
+        stored_file.seek(0, 3)
+
+    stored_file.close()
+    assert stored_file.closed
+
+
+def test_stored_file_zipfile(clear_dir):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr("a.txt", b"first member")
+        zip_file.writestr("b.bin", CONTENT)
+
+    storage_service = get_storage_service()
+    storage_service.save(ContentFile(archive.getvalue(), name="archive.zip"))
+
+    with zipfile.ZipFile(storage_service.get("files/archive.zip")) as zip_file:
+        assert zip_file.namelist() == ["a.txt", "b.bin"]
+        assert zip_file.read("b.bin") == CONTENT
+        assert zip_file.read("a.txt") == b"first member"
+
+
+def test_stored_file_seek_compressed(clear_dir):
+    storage_service = get_storage_service(compression={"content_types": ["*"]})
+    storage_service.save(ContentFile(CONTENT, name="data.txt"))
+
+    stored_file = storage_service.get("files/data.txt")
+    assert stored_file.content_encoding == "gzip"
+    assert stored_file.seek(0, io.SEEK_END) == len(CONTENT)
+    stored_file.seek(2000)
+    assert stored_file.read(10) == CONTENT[2000:2010]
+    stored_file.seek(10)
+    assert stored_file.read(10) == CONTENT[10:20]
+
+
+class _RemoteDriver:
+    name = "Remote"
+
+    def __init__(self, content):
+        self.content = content
+        self.ranges = []
+
+    def download_object_range_as_stream(
+        self, obj, start_bytes, end_bytes=None, chunk_size=None
+    ):
+        self.ranges.append((start_bytes, end_bytes))
+        yield self.content[start_bytes:end_bytes]
+
+
+def test_stored_file_remote_ranges():
+    driver = _RemoteDriver(CONTENT)
+    container = Container("bucket", {}, driver)
+    obj = Object("data.bin", len(CONTENT), None, {}, {}, container, driver)
+    stored_file = StoredFile(obj, buffer_size=4096, readahead=0)
+
+    stored_file.seek(5000)
+    assert stored_file.read(100) == CONTENT[5000:5100]
+    stored_file.seek(10)
+    assert stored_file.read(100) == CONTENT[10:110]
+    assert driver.ranges == [(4096, 8192), (0, 4096)]
+
+
+def test_stored_file_as_memoryview(clear_dir):
+    storage_service = get_storage_service()
+    stored_file = storage_service.save(ContentFile(CONTENT, name="data.bin"))
+
+    with stored_file.as_memoryview() as view:
+        assert view.readonly
+        assert isinstance(view.obj, mmap.mmap)
+        assert view[1000:1010] == CONTENT[1000:1010]
+        assert bytes(view) == CONTENT
+
+    empty = storage_service.save(ContentFile(b"", name="empty.bin"))
+    assert empty.as_memoryview().nbytes == 0
+
+
+def test_stored_file_as_memoryview_spooled(clear_dir):
+    storage_service = get_storage_service(compression={"content_types": ["*"]})
+    stored_file = storage_service.save(ContentFile(CONTENT, name="data.txt"))
+
+    # the stored bytes are compressed, the content is decompressed in memory
+    view = stored_file.as_memoryview()
+    assert view.readonly
+    assert not isinstance(view.obj, mmap.mmap)
+    assert view == CONTENT
+
+    # large content is spooled to a temporary file
+    with stored_file.as_memoryview(max_memory=1024) as view:
+        assert isinstance(view.obj, mmap.mmap)
+        assert view == CONTENT
+
+
+@pytest.mark.asyncio
+async def test_aiter_prefetched():
+    read = []
+
+    def _open_stream():
+        for index in range(10):
+            read.append(index)
+            yield bytes([index])
+
+    chunks = aiter_prefetched(_open_stream, max_prefetch=2)
+    assert await chunks.__anext__() == b"\x00"
+    await asyncio.sleep(0.05)
+    # the reader waits for the consumer
+    assert len(read) <= 4
+    assert [chunk async for chunk in chunks] == [bytes([i]) for i in range(1, 10)]
+    assert len(read) == 10
+
+
+@pytest.mark.asyncio
+async def test_aiter_prefetched_errors_and_close():
+    closed = []
+
+    def _failing_stream():
+        yield b"a"
+        raise ValueError("read failed")
+
+    with pytest.raises(ValueError, match="read failed"):
+        _ = [chunk async for chunk in aiter_prefetched(_failing_stream)]
+
+    def _endless_stream():
+        try:
+            while True:
+                yield b"a"
+        finally:
+            closed.append(True)
+
+    chunks = aiter_prefetched(_endless_stream, max_prefetch=1)
+    assert await chunks.__anext__() == b"a"
+    await chunks.aclose()
+    for _ in range(50):
+        if closed:
+            break
+        await asyncio.sleep(0.01)
+    # the reader stops once the consumer is gone
+    assert closed == [True]
+
+
+@pytest.mark.asyncio
+async def test_aiter_prefetched_slow_consumer_releases_worker(clear_dir):
+    storage_service = get_storage_service(executor={"max_workers": 1})
+    storage_service.save(ContentFile(CONTENT, name="data.bin"))
+    storage_service.save(ContentFile(b"other", name="other.bin"))
+    executor = storage_service.get_executor("files")
+
+    stored_file = await storage_service.get_async("files/data.bin")
+    chunks = stored_file.aiter_stream(chunk_size=1024, max_prefetch=2)
+    assert await chunks.__anext__() == CONTENT[:1024]
+    await asyncio.sleep(0.05)
+
+    # the stalled download doesn't hold the only worker of the storage
+    assert executor.stats()["active"] == 0
+    other = await asyncio.wait_for(
+        storage_service.get_async("files/other.bin"), timeout=1
+    )
+    assert other.read() == b"other"
+
+    rest = [chunk async for chunk in chunks]
+    assert CONTENT[:1024] + b"".join(rest) == CONTENT
+
+
+@pytest.mark.asyncio
+async def test_aiter_prefetched_retries_rejected_reads():
+    executor = StorageExecutor("files", max_workers=1, overflow="reject")
+    release = threading.Event()
+
+    chunks = aiter_prefetched(
+        lambda: iter([b"a", b"b", b"c"]), executor.run, max_prefetch=1
+    )
+    assert await chunks.__anext__() == b"a"
+    # `b` is read ahead, then the worker is taken
+    await asyncio.sleep(0.05)
+    busy = asyncio.create_task(executor.run(release.wait))
+    await asyncio.sleep(0.01)
+    assert await chunks.__anext__() == b"b"
+
+    # reading `c` is rejected while the worker is busy, and retried
+    consumer = asyncio.create_task(chunks.__anext__())
+    await asyncio.sleep(0.05)
+    assert not consumer.done()
+    assert executor.stats()["rejected"] >= 1
+
+    release.set()
+    await busy
+    assert await consumer == b"c"
+    assert [chunk async for chunk in chunks] == []
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_stored_file_aiter_stream(clear_dir):
+    storage_service = get_storage_service(compression={"content_types": ["*"]})
+    stored_file = storage_service.save(ContentFile(CONTENT, name="data.txt"))
+
+    chunks = [chunk async for chunk in stored_file.aiter_stream(chunk_size=1000)]
+    assert b"".join(chunks) == CONTENT
+    raw = [chunk async for chunk in stored_file.aiter_stream(raw=True)]
+    assert b"".join(raw) == b"".join(stored_file.as_raw_stream())
+
+
+@pytest.mark.parametrize("prefetch_chunks", [0, 2])
+def test_storage_controller_streamed_download(clear_dir, prefetch_chunks):
+    tm = Test.create_test_module(
+        modules=[
+            StorageModule.setup(
+                files={
+                    "driver": get_driver(Provider.LOCAL),
+                    "options": {"key": os.path.join(DUMB_DIRS, "fixtures")},
+                },
+                serving={"prefetch_chunks": prefetch_chunks},
+            )
+        ]
+    )
+    storage_service: StorageService = tm.get(StorageService)
+    storage_service.save(ContentFile(CONTENT, name="data.bin"))
+
+    url = tm.create_application().url_path_for(
+        "storage:download", path="files/data.bin"
+    )
+    # an ignored range is answered with the streamed content
+    res = tm.get_test_client().get(url, headers={"Range": "items=0-1"})
+    assert res.status_code == 200
+    assert res.content == CONTENT
@@ -0,0 +1,204 @@
+import base64
+import os.path
+import time
+
+import pytest
+from ellar.testing import Test
+
+from ellar_storage import Provider, StorageModule, StorageService, get_driver
+from ellar_storage.exceptions import (
+    UploadIncompleteError,
+    UploadOffsetMismatchError,
+    UploadSessionNotFoundError,
+    UploadTooLargeError,
+)
+from ellar_storage.resumable import ResumableUploadStore
+
+from .utils import DUMB_DIRS
+
+SESSIONS_DIR = os.path.join(DUMB_DIRS, "fixtures", "sessions")
+
+
+def test_resumable_upload_store(clear_dir):
+    store = ResumableUploadStore(SESSIONS_DIR)
+    session = store.create("files", filename="a.txt", length=6)
+    assert session.offset == 0
+    assert not session.is_complete
+
+    assert store.append(session.id, 0, [b"ab", b"c"]).offset == 3
+    # another worker sees the persisted offset
+    assert ResumableUploadStore(SESSIONS_DIR).get(session.id).offset == 3
+
+    with pytest.raises(UploadOffsetMismatchError) as ex:
+        store.append(session.id, 0, [b"abc"])
+    assert ex.value.offset == 3
+
+    with pytest.raises(UploadIncompleteError):
+        store.complete(session.id, lambda *args: None)
+
+    with pytest.raises(UploadTooLargeError):
+        store.append(session.id, 3, [b"de", b"fgh"])
+    assert store.get(session.id).offset == 5
+
+    store.append(session.id, 5, [b"f"])
+
+    def _save(saved_session, path):
+        with open(path, "rb") as data_file:
+            return saved_session.filename, data_file.read()
+
+    assert store.complete(session.id, _save) == ("a.txt", b"abcdef")
+    with pytest.raises(UploadSessionNotFoundError):
+        store.get(session.id)
+    assert os.listdir(SESSIONS_DIR) == []
+
+
+def test_resumable_upload_store_max_size_and_delete(clear_dir):
+    store = ResumableUploadStore(SESSIONS_DIR)
+    session = store.create("files", max_size=4)
+    assert session.is_complete
+
+    with pytest.raises(UploadTooLargeError):
+        store.append(session.id, 0, [b"abcde"])
+
+    store.delete(session.id)
+    with pytest.raises(UploadSessionNotFoundError):
+        store.delete(session.id)
+    with pytest.raises(UploadSessionNotFoundError):
+        store.get("../../etc")
+
+
+def test_resumable_upload_store_expiry(clear_dir):
+    store = ResumableUploadStore(SESSIONS_DIR, ttl=60)
+    expired = store.create("files")
+    active = store.create("files")
+
+    past = time.time() - 120
+    os.utime(os.path.join(SESSIONS_DIR, expired.id), (past, past))
+    store.remove_expired()
+
+    with pytest.raises(UploadSessionNotFoundError):
+        store.get(expired.id)
+    assert store.get(active.id).id == active.id
+
+
+def _encode(value: str) -> str:
+    return base64.b64encode(value.encode()).decode()
+
+
+def _get_module(**upload):
+    return Test.create_test_module(
+        modules=[
+            StorageModule.setup(
+                files={
+                    "driver": get_driver(Provider.LOCAL),
+                    "options": {"key": os.path.join(DUMB_DIRS, "fixtures")},
+                },
+                images={
+                    "driver": get_driver(Provider.LOCAL),
+                    "options": {"key": os.path.join(DUMB_DIRS, "fixtures")},
+                },
+                upload={"enabled": True, "sessions_directory": SESSIONS_DIR, **upload},
+            )
+        ]
+    )
+
+
+def _patch(client, location, offset, content):
+    return client.patch(
+        location,
+        content=content,
+        headers={
+            "Content-Type": "application/offset+octet-stream",
+            "Upload-Offset": str(offset),
+        },
+    )
+
+
+def test_storage_controller_resumable_upload(clear_dir):
+    tm = _get_module()
+    client = tm.get_test_client()
+    url = tm.create_application().url_path_for("storage:resumable", storage="files")
+
+    res = client.post(
+        url,
+        headers={
+            "Upload-Length": "12",
+            "Upload-Metadata": f"filename {_encode('video.mp4')},"
+            f"content_type {_encode('video/mp4')}",
+        },
+    )
+    assert res.status_code == 201
+    assert res.headers["upload-offset"] == "0"
+    location = res.headers["location"]
+
+    res = _patch(client, location, 0, b"012345")
+    assert res.status_code == 204
+    assert res.headers["upload-offset"] == "6"
+
+    # interrupted, the client asks where to resume from
+    res = client.head(location)
+    assert res.status_code == 200
+    assert res.headers["upload-offset"] == "6"
+    assert res.headers["upload-length"] == "12"
+
+    res = client.post(location)
+    assert res.status_code == 409
+
+    res = _patch(client, location, 3, b"345678")
+    assert res.status_code == 409
+    assert res.headers["upload-offset"] == "6"
+
+    res = client.patch(location, content=b"6789ab", headers={"Upload-Offset": "6"})
+    assert res.status_code == 415
+
+    assert _patch(client, location, 6, b"6789ab").status_code == 204
+
+    res = client.post(location)
+    assert res.status_code == 200
+    assert res.json() == {
+        "path": "files/video.mp4",
+        "filename": "video.mp4",
+        "content_type": "video/mp4",
+        "size": 12,
+    }
+    assert client.head(location).status_code == 404
+
+    stored_file = tm.get(StorageService).get("files/video.mp4")
+    assert stored_file.read() == b"0123456789ab"
+
+
+def test_storage_controller_resumable_upload_limits(clear_dir):
+    tm = _get_module(max_size=4)
+    client = tm.get_test_client()
+    url = tm.create_application().url_path_for("storage:resumable", storage="files")
+
+    assert client.post(url, headers={"Upload-Length": "5"}).status_code == 413
+    assert (
+        client.post(url, headers={"Upload-Metadata": "filename !"}).status_code == 400
+    )
+
+    location = client.post(url).headers["location"]
+    assert _patch(client, location, 0, b"abcde").status_code == 413
+
+    assert client.delete(location).status_code == 204
+    assert client.head(location).status_code == 404
+
+    # sessions can't be used through another storage
+    location = client.post(url).headers["location"]
+    assert client.head(location.replace("/files/", "/images/")).status_code == 404
+
+
+def test_storage_controller_resumable_upload_disabled(clear_dir):
+    tm = Test.create_test_module(
+        modules=[
+            StorageModule.setup(
+                files={
+                    "driver": get_driver(Provider.LOCAL),
+                    "options": {"key": os.path.join(DUMB_DIRS, "fixtures")},
+                },
+                upload={"enabled": True},
+            )
+        ]
+    )
+    url = tm.create_application().url_path_for("storage:resumable", storage="files")
+    assert tm.get_test_client().post(url).status_code == 404
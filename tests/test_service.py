@@ -14,6 +14,8 @@ from ellar_storage import (
     StoredFile,
     get_driver,
 )
+from ellar_storage.drivers import configure_connection_pool
+from ellar_storage.exceptions import ObjectDoesNotExistError
 
 from .utils import DUMB_DIRS, TEST_FIXTURES_DIRS
 
@@ -136,7 +138,7 @@ def test_storage_stored_file(clear_dir):
     assert stored_file.content_type == "text/plain"
 
     assert stored_file.readable() is True
-    assert stored_file.seekable() is False
+    assert stored_file.seekable() is True
     assert stored_file.writable() is False
 
     assert os.path.exists(stored_file.get_cdn_url())
@@ -149,3 +151,89 @@ def test_storage_stored_file(clear_dir):
 
     files = os.listdir(os.path.join(DUMB_DIRS, "fixtures", "files"))
     assert files == []
+
+
+def test_storage_stored_file_loads_metadata_lazily(clear_dir):
+    tm = Test.create_test_module(**module_config)
+
+    storage_service: StorageService = tm.get(StorageService)
+    storage_service.save(ContentFile(b"File saving worked", name="get.txt"))
+
+    stored_file = storage_service.get("get.txt")
+    assert stored_file.name == "get.txt"
+    assert stored_file.size == 18
+    assert stored_file.read() == b"File saving worked"
+
+    metadata_path = os.path.join(
+        DUMB_DIRS, "fixtures", "files", "get.txt.metadata.json"
+    )
+    with open(metadata_path, "w") as metadata_file:
+        metadata_file.write('{"filename": "lazy.txt", "content_type": "text/csv"}')
+
+    # metadata file is read on first access only
+    assert stored_file.filename == "lazy.txt"
+    assert stored_file.content_type == "text/csv"
+    assert stored_file.object.meta_data["filename"] == "lazy.txt"
+
+    os.remove(metadata_path)
+    assert stored_file.filename == "lazy.txt"
+
+
+def test_storage_batch_operations(clear_dir):
+    tm = Test.create_test_module(**module_config)
+    storage_service: StorageService = tm.get(StorageService)
+
+    saved = storage_service.save_many(
+        [
+            ContentFile(b"File saving worked", name="a.txt"),
+            {"name": "b.txt", "content": iter([b"b"]), "metadata": {}},
+            {"name": "c.txt"},
+        ],
+        max_concurrency=2,
+    )
+    assert [result.key for result in saved] == ["a.txt", "b.txt", "c.txt"]
+    assert [result.ok for result in saved] == [True, True, False]
+    assert saved[0].value.filename == "a.txt"
+    assert isinstance(saved[2].error, ValueError)
+
+    fetched = storage_service.get_many(["files/a.txt", "b.txt", "missing.txt"])
+    assert [result.ok for result in fetched] == [True, True, False]
+    assert fetched[0].value.read() == b"File saving worked"
+    assert isinstance(fetched[2].error, ObjectDoesNotExistError)
+
+    deleted = storage_service.delete_many(["a.txt", "files/b.txt", "missing.txt"])
+    assert [result.value for result in deleted] == [True, True, None]
+    assert os.listdir(os.path.join(DUMB_DIRS, "fixtures", "files")) == []
+
+
+def test_storage_shares_driver_with_same_options(clear_dir):
+    tm = Test.create_test_module(**module_config)
+    storage_service: StorageService = tm.get(StorageService)
+
+    files_driver = storage_service.get_container("files").driver
+    assert files_driver is storage_service.get_container("images").driver
+
+
+def test_configure_connection_pool():
+    driver = get_driver(Provider.S3)("api key", "api secret key")
+    assert configure_connection_pool(driver, pool_size=32, keep_alive=False)
+
+    session = driver.connection.connection.session
+    adapter = session.get_adapter("https://s3.amazonaws.com")
+    assert adapter._pool_maxsize == 32
+    assert session.headers["Connection"] == "close"
+
+
+def test_storage_stored_file_attributes_in_slots(clear_dir):
+    tm = Test.create_test_module(**module_config)
+
+    storage_service: StorageService = tm.get(StorageService)
+    storage_service.save(ContentFile(b"File saving worked", name="get.txt"))
+
+    stored_file = storage_service.get("get.txt")
+    assert stored_file.filename == "get.txt"
+    assert stored_file.read() == b"File saving worked"
+    assert stored_file.__dict__ == {}
+    # io.IOBase keeps its closed flag in the instance __dict__
+    stored_file.close()
+    assert list(stored_file.__dict__) == ["__IOBase_closed"]
@@ -11,6 +11,14 @@ from ellar_storage import (
     StoredFile,
     get_driver,
 )
+from ellar_storage.backends import (
+    _ASYNC_BACKENDS,
+    AsyncStorageBackend,
+    LocalAsyncStorageBackend,
+    get_async_backend,
+    register_async_backend,
+)
+from ellar_storage.exceptions import UploadTooLargeError
 
 from .utils import DUMB_DIRS, TEST_FIXTURES_DIRS
 
@@ -99,3 +107,106 @@ async def test_storage_save_content_operation_async(clear_dir):
 
     files = os.listdir(os.path.join(DUMB_DIRS, "fixtures", "files"))
     assert set(files) == {"copied-test.txt", "get.txt.metadata.json", "get.txt"}
+
+
+@pytest.mark.asyncio
+async def test_storage_save_content_async_uses_async_backend(clear_dir):
+    tm = Test.create_test_module(**module_config)
+    storage_service: StorageService = tm.get(StorageService)
+
+    assert isinstance(
+        storage_service.get_async_backend("images"), LocalAsyncStorageBackend
+    )
+
+    async def content():
+        for chunk in (b"File ", b"saving ", b"worked"):
+            yield chunk
+
+    stored_file = await storage_service.save_content_async(
+        name="stream.txt",
+        content=content(),
+        upload_storage="images",
+        metadata={"content_type": "text/plain", "filename": "stream.txt"},
+    )
+    assert stored_file.size == 18
+    assert stored_file.filename == "stream.txt"
+
+    backend = storage_service.get_async_backend("images")
+    chunks = [chunk async for chunk in backend.iter_object(stored_file.object)]
+    assert b"".join(chunks) == b"File saving worked"
+
+    files = os.listdir(os.path.join(DUMB_DIRS, "fixtures", "images"))
+    assert set(files) == {"stream.txt", "stream.txt.metadata.json"}
+
+    assert await storage_service.delete_async("images/stream.txt")
+    assert os.listdir(os.path.join(DUMB_DIRS, "fixtures", "images")) == []
+
+
+@pytest.mark.asyncio
+async def test_storage_batch_operations_async(clear_dir):
+    tm = Test.create_test_module(**module_config)
+    storage_service: StorageService = tm.get(StorageService)
+
+    saved = await storage_service.save_many_async(
+        [
+            ContentFile(b"File saving worked", name="a.txt"),
+            {"name": "b.txt", "content": iter([b"b"])},
+        ],
+        upload_storage="images",
+    )
+    assert all(result.ok for result in saved)
+
+    fetched = await storage_service.get_many_async(["images/a.txt", "images/c.txt"])
+    assert fetched[0].value.read() == b"File saving worked"
+    assert fetched[1].error is not None
+
+    deleted = await storage_service.delete_many_async(["images/a.txt", "images/b.txt"])
+    assert [result.value for result in deleted] == [True, True]
+    assert os.listdir(os.path.join(DUMB_DIRS, "fixtures", "images")) == []
+
+
+@pytest.mark.asyncio
+async def test_storage_save_stream_async(clear_dir):
+    tm = Test.create_test_module(**module_config)
+    storage_service: StorageService = tm.get(StorageService)
+
+    async def _stream():
+        for chunk in (b"streamed ", b"straight ", b"to storage"):
+            yield chunk
+
+    stored_file = await storage_service.save_stream_async(
+        _stream(), filename="stream.txt", content_type="text/plain"
+    )
+    assert stored_file.name == "stream.txt"
+    assert stored_file.filename == "stream.txt"
+    assert stored_file.content_type == "text/plain"
+
+    stored_file = await storage_service.get_async("files/stream.txt")
+    assert stored_file.read() == b"streamed straight to storage"
+    files_dir = os.path.dirname(stored_file.get_local_path())
+
+    with pytest.raises(UploadTooLargeError):
+        await storage_service.save_stream_async(
+            _stream(), filename="too-large.txt", max_size=10
+        )
+    assert sorted(os.listdir(files_dir)) == ["stream.txt", "stream.txt.metadata.json"]
+
+
+def test_registered_async_backend_receives_metadata_store(monkeypatch):
+    class _Backend(AsyncStorageBackend):
+        upload_object = get_object = delete_object = iter_object = None
+
+    monkeypatch.setitem(_ASYNC_BACKENDS, "Fake", _Backend)
+    register_async_backend("Fake", _Backend)
+
+    class _Driver:
+        name = "Fake"
+
+    class _Container:
+        driver = _Driver()
+
+    # one constructor signature, whether the storage has a metadata store or not
+    assert get_async_backend(_Container()).metadata_store is None
+    metadata_store = object()
+    backend = get_async_backend(_Container(), metadata_store=metadata_store)
+    assert backend.metadata_store is metadata_store
@@ -0,0 +1,142 @@
+import os.path
+
+import pytest
+from ellar.common.datastructures import ContentFile
+from ellar.testing import Test
+
+from ellar_storage import (
+    Provider,
+    ShardedLocalStorageDriver,
+    StorageModule,
+    StorageService,
+    StorageSetup,
+    get_driver,
+)
+from ellar_storage.exceptions import ObjectDoesNotExistError
+from ellar_storage.sharding import get_object_name, get_shard_name, reshard_container
+
+from .utils import DUMB_DIRS, FILES_DIR
+
+
+def _storages(driver=ShardedLocalStorageDriver):
+    return {
+        "files": {
+            "driver": driver,
+            "options": {"key": os.path.join(DUMB_DIRS, "fixtures")},
+            # metadata files are sharded with their object
+            "metadata_store": "sidecar",
+        }
+    }
+
+
+def test_get_shard_name():
+    shard_name = get_shard_name("report.pdf")
+    assert shard_name.endswith("/report.pdf")
+    assert len(shard_name.split("/")) == 3
+    assert get_object_name(shard_name) == "report.pdf"
+    # metadata files are stored next to their object
+    assert get_shard_name("report.pdf.metadata.json") == f"{shard_name}.metadata.json"
+    assert get_shard_name("report.pdf", depth=1).count("/") == 1
+
+    assert get_object_name("report.pdf") is None
+    assert get_object_name("ab/cd/report.pdf") is None
+
+
+def test_sharded_storage_save_get_delete(clear_dir):
+    storage_service = StorageService(StorageSetup(storages=_storages()))
+
+    stored_file = storage_service.save(
+        ContentFile(b"File saving worked", name="report.pdf")
+    )
+    assert stored_file.name == "report.pdf"
+    shard_path = os.path.join(FILES_DIR, get_shard_name("report.pdf"))
+    assert stored_file.get_local_path() == shard_path
+    assert os.path.isfile(f"{shard_path}.metadata.json")
+    assert not os.path.exists(os.path.join(FILES_DIR, "report.pdf"))
+
+    stored_file = storage_service.get("files/report.pdf")
+    assert stored_file.read() == b"File saving worked"
+    assert stored_file.filename == "report.pdf"
+    assert [obj.name for obj in storage_service.get_container().iterate_objects()] == [
+        "report.pdf",
+        "report.pdf.metadata.json",
+    ]
+
+    storage_service.delete("files/report.pdf")
+    with pytest.raises(ObjectDoesNotExistError):
+        storage_service.get("files/report.pdf")
+    # emptied shard directories are removed
+    assert os.listdir(FILES_DIR) == []
+
+
+@pytest.mark.asyncio
+async def test_sharded_storage_save_async(clear_dir):
+    storage_service = StorageService(StorageSetup(storages=_storages()))
+
+    stored_file = await storage_service.save_async(
+        ContentFile(b"File saving worked", name="report.pdf")
+    )
+    assert stored_file.get_local_path() == os.path.join(
+        FILES_DIR, get_shard_name("report.pdf")
+    )
+    stored_file = await storage_service.get_async("files/report.pdf")
+    assert stored_file.filename == "report.pdf"
+
+
+def test_sharded_storage_controller_download(clear_dir):
+    tm = Test.create_test_module(
+        modules=[StorageModule.setup(files=_storages()["files"])]
+    )
+    tm.get(StorageService).save(ContentFile(b"File saving worked", name="get.txt"))
+
+    url = tm.create_application().url_path_for("storage:download", path="files/get.txt")
+    assert url == "/storage/download/files/get.txt"
+    res = tm.get_test_client().get(url)
+
+    assert res.status_code == 200
+    assert res.text == "File saving worked"
+
+
+def test_reshard_container(clear_dir):
+    flat_service = StorageService(
+        StorageSetup(storages=_storages(get_driver(Provider.LOCAL)))
+    )
+    flat_service.save(ContentFile(b"first", name="first.txt"))
+    flat_service.save_content(
+        "second.txt", content=iter([b"second"]), metadata={"filename": "second.txt"}
+    )
+    flat_service.save(ContentFile(b"stale", name="third.txt"))
+
+    storage_service = StorageService(StorageSetup(storages=_storages()))
+    # flat objects are found before they are moved
+    assert storage_service.get("files/first.txt").read() == b"first"
+    # writing an object replaces its flat copy
+    storage_service.save(ContentFile(b"third", name="third.txt"))
+    assert not os.path.exists(os.path.join(FILES_DIR, "third.txt"))
+
+    container = storage_service.get_container()
+    assert reshard_container(container) == 4
+    assert reshard_container(container) == 0
+
+    assert sorted(os.listdir(FILES_DIR)) == sorted(
+        {
+            get_shard_name(name).split("/")[0]
+            for name in ("first.txt", "second.txt", "third.txt")
+        }
+    )
+    first = storage_service.get("files/first.txt")
+    assert first.get_local_path() == os.path.join(
+        FILES_DIR, get_shard_name("first.txt")
+    )
+    assert first.read() == b"first"
+    assert first.filename == "first.txt"
+    assert storage_service.get("files/second.txt").read() == b"second"
+    assert storage_service.get("files/third.txt").read() == b"third"
+
+
+def test_reshard_container_requires_sharded_driver(clear_dir):
+    storage_service = StorageService(
+        StorageSetup(storages=_storages(get_driver(Provider.LOCAL)))
+    )
+    with pytest.raises(TypeError):
+        reshard_container(storage_service.get_container())
@@ -0,0 +1,82 @@
+import pytest
+
+from ellar_storage.exceptions import MultipartError, UploadTooLargeError
+from ellar_storage.uploads import (
+    MultipartFileStream,
+    get_multipart_boundary,
+    limit_stream,
+)
+
+BOUNDARY = b"----boundary1234"
+
+BODY = (
+    b"------boundary1234\r\n"
+    b'Content-Disposition: form-data; name="title"\r\n\r\n'
+    b"a title\r\n"
+    b"------boundary1234\r\n"
+    b'Content-Disposition: form-data; name="file"; filename="a.txt"; '
+    b"filename*=UTF-8''na%C3%AFve.txt\r\n"
+    b"Content-Type: text/plain\r\n\r\n"
+    b"line one\r\nline two --not the boundary\r\n"
+    b"------boundary1234--\r\n"
+)
+
+
+async def _chunked(data: bytes, size: int):
+    for index in range(0, len(data), size):
+        yield data[index : index + size]
+
+
+async def _read(stream) -> bytes:
+    return b"".join([chunk async for chunk in stream])
+
+
+def test_get_multipart_boundary():
+    assert (
+        get_multipart_boundary('multipart/form-data; boundary="----boundary1234"')
+        == BOUNDARY
+    )
+    assert get_multipart_boundary("application/octet-stream") is None
+    assert get_multipart_boundary("multipart/form-data") is None
+    assert get_multipart_boundary(None) is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 4096])
+async def test_multipart_file_stream(chunk_size):
+    file_stream = MultipartFileStream(_chunked(BODY, chunk_size), BOUNDARY)
+
+    assert await file_stream.find_file()
+    assert file_stream.filename == "naïve.txt"
+    assert file_stream.field_name == "file"
+    assert file_stream.content_type == "text/plain"
+    assert await _read(file_stream) == b"line one\r\nline two --not the boundary"
+
+    assert not await file_stream.find_file()
+
+
+@pytest.mark.asyncio
+async def test_multipart_file_stream_without_file():
+    body = (
+        b"------boundary1234\r\n"
+        b'Content-Disposition: form-data; name="title"\r\n\r\n'
+        b"a title\r\n"
+        b"------boundary1234--"
+    )
+    file_stream = MultipartFileStream(_chunked(body, 5), BOUNDARY)
+    assert not await file_stream.find_file()
+
+
+@pytest.mark.asyncio
+async def test_multipart_file_stream_truncated():
+    file_stream = MultipartFileStream(_chunked(BODY[:-40], 16), BOUNDARY)
+    assert await file_stream.find_file()
+    with pytest.raises(MultipartError):
+        await _read(file_stream)
+
+
+@pytest.mark.asyncio
+async def test_limit_stream():
+    assert await _read(limit_stream(_chunked(b"0123456789", 3), 10)) == b"0123456789"
+    with pytest.raises(UploadTooLargeError):
+        await _read(limit_stream(_chunked(b"0123456789", 3), 9))
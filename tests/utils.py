@@ -1,10 +1,16 @@
 import os.path
 import shutil
+import typing as t
 
 from ellar.utils.importer import get_main_directory_by_stack
 
+from ellar_storage import Provider, StorageService, StorageSetup, get_driver
+
 DUMB_DIRS = get_main_directory_by_stack("__main__/dumbs/", stack_level=1)
 TEST_FIXTURES_DIRS = get_main_directory_by_stack("__main__/fixtures/", stack_level=1)
+# key directory of the test storages, removed by the `clear_dir` fixture
+FIXTURES_DIR = os.path.join(DUMB_DIRS, "fixtures")
+FILES_DIR = os.path.join(FIXTURES_DIR, "files")
 
 
 def clear(directory):
@@ -12,3 +18,22 @@ def clear(directory):
         shutil.rmtree(os.path.join(DUMB_DIRS, directory))
     except OSError:
         pass
+
+
+def get_storage(driver=None, **files) -> t.Dict[str, t.Any]:
+    return {
+        "driver": driver or get_driver(Provider.LOCAL),
+        "options": {"key": FIXTURES_DIR},
+        **files,
+    }
+
+
+def get_storage_service(driver=None, images=False, setup=None, **files):
+    """
+    Service with a `files` storage configured with `files`, and an `images` storage
+    if `images` is set, `setup` are the other `StorageSetup` options.
+    """
+    storages = {"files": get_storage(driver, **files)}
+    if images:
+        storages["images"] = get_storage()
+    return StorageService(StorageSetup(storages=storages, **(setup or {})))